@@ -35,6 +35,9 @@ import tema
 # Banco de Dados
 from db import PostgresSingleton
 
+# Exportações (rota do servidor)
+from modules.exportacao.exportacao_service import registra_rota_exportacao
+
 # Profiler
 from werkzeug.middleware.profiler import ProfilerMiddleware
 
@@ -111,6 +114,9 @@ app = Dash(
 # Server
 server = app.server
 
+# Rota das exportações (arquivos enviados em streaming, ver modules/exportacao)
+registra_rota_exportacao(server)
+
 
 # Menu / Navbar
 def criarMenu(dirVertical=True):
@@ -0,0 +1,145 @@
+// Normalização e labels dos filtros das páginas no navegador (espelho de corrige_selecao, em modules/filtro_utils.py)
+//
+// Os callbacks de dados dependem de um único dcc.Store com o estado (já normalizado) dos filtros. Quando o usuário
+// combina "TODAS"/"TODOS" com outros itens, o valor do dropdown é corrigido aqui e o store só é atualizado se o estado
+// normalizado mudar, então uma ação do usuário gera uma única rodada de consultas.
+var filtros = window.filtros = window.filtros || {};
+
+filtros.corrigeSelecao = function (lista, termoAll) {
+    // Caso 1: Nenhuma opcao é selecionada, reseta para "TODAS"
+    if (!lista || lista.length === 0) {
+        return [termoAll];
+    }
+
+    // Caso 2: Se "TODAS" foi selecionado após outras opções, reseta para "TODAS"
+    if (lista.length > 1 && lista.slice(1).includes(termoAll)) {
+        return [termoAll];
+    }
+
+    // Caso 3: Se alguma opção foi selecionada após "TODAS", remove "TODAS"
+    if (lista.includes(termoAll) && lista.length > 1) {
+        return lista.filter((valor) => valor !== termoAll);
+    }
+
+    // Por fim, se não caiu em nenhum caso, retorna o valor original
+    return lista;
+};
+
+// Atualiza o valor do dropdown somente se a correção mudar algo
+filtros.corrigeDropdown = function (lista, termoAll) {
+    const corrigida = filtros.corrigeSelecao(lista, termoAll);
+    if (JSON.stringify(corrigida) === JSON.stringify(lista)) {
+        return window.dash_clientside.no_update;
+    }
+    return corrigida;
+};
+
+// Monta o estado dos filtros (termosAll: campo -> termo que representa todos) e evita atualizar o store sem mudanças.
+// Enquanto algum dos camposObrigatorios estiver vazio (ex: km/L sendo editado), mantém o último estado.
+filtros.atualizaEstado = function (valores, termosAll, estadoAtual, camposObrigatorios) {
+    const vazio = (campo) => valores[campo] === null || valores[campo] === undefined || valores[campo] === "";
+    if ((camposObrigatorios || []).some(vazio)) {
+        return window.dash_clientside.no_update;
+    }
+
+    const estado = Object.assign({}, valores);
+    Object.keys(termosAll || {}).forEach((campo) => {
+        estado[campo] = filtros.corrigeSelecao(estado[campo], termosAll[campo]);
+    });
+
+    if (estadoAtual && JSON.stringify(estado) === JSON.stringify(estadoAtual)) {
+        return window.dash_clientside.no_update;
+    }
+    return estado;
+};
+
+// Labels (badges) dos filtros, montados no navegador
+filtros.badge = function (texto, variant, props) {
+    return {
+        namespace: "dash_mantine_components",
+        type: "Badge",
+        props: Object.assign({children: texto, variant: variant}, props),
+    };
+};
+
+// Data (YYYY-MM-DD...) no formato DD/MM/AAAA
+filtros.formataData = function (data) {
+    const [ano, mes, dia] = String(data).slice(0, 10).split("-");
+    return `${dia}/${mes}/${ano}`;
+};
+
+filtros.labelsPeriodo = function (datas) {
+    if (!datas || datas[0] === null || datas[0] === undefined || datas[1] === null || datas[1] === undefined) {
+        return [];
+    }
+    return [filtros.badge(`${filtros.formataData(datas[0])} a ${filtros.formataData(datas[1])}`, "outline")];
+};
+
+// Lista de seleção múltipla: termo para todos ou um badge por item
+filtros.labelsSelecao = function (lista, termoAll, textoTodos) {
+    if (!lista || lista.length === 0 || lista.includes(termoAll)) {
+        return [filtros.badge(textoTodos, "outline")];
+    }
+    return lista.map((item) => filtros.badge(item, "dot"));
+};
+
+// Retorna o mesmo grupo de labels para cada componente de saída (callbacks com ALL)
+filtros.saidasLabels = function (labels) {
+    const antes = [filtros.badge("Filtro", "outline", {color: "gray"})];
+    const saidas = window.dash_clientside.callback_context.outputs_list;
+    return saidas.map(() => [
+        {namespace: "dash_mantine_components", type: "Group", props: {children: antes.concat(labels)}},
+    ]);
+};
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    filtros: {
+        corrige_selecao_todas: function (lista) {
+            return filtros.corrigeDropdown(lista, "TODAS");
+        },
+        corrige_selecao_todos: function (lista) {
+            return filtros.corrigeDropdown(lista, "TODOS");
+        },
+        labels_visao_geral: function (estado) {
+            if (!estado) {
+                return window.dash_clientside.no_update;
+            }
+            return filtros.saidasLabels(
+                filtros.labelsPeriodo(estado.datas).concat(
+                    filtros.labelsSelecao(estado.lista_modelos, "TODOS", "Todos os modelos"),
+                    filtros.labelsSelecao(estado.lista_linha, "TODAS", "Todas as linhas"),
+                    [filtros.badge(`${estado.km_l_min} ≤ km/L ≤ ${estado.km_l_max} `, "outline")]
+                )
+            );
+        },
+        labels_visao_linha: function (estado) {
+            if (!estado) {
+                return window.dash_clientside.no_update;
+            }
+            const labelsLinha = estado.linha !== null && estado.linha !== undefined
+                ? [filtros.badge(`Linha ${estado.linha}`, "dot")]
+                : [];
+            return filtros.saidasLabels(
+                filtros.labelsPeriodo(estado.datas).concat(
+                    filtros.labelsSelecao(estado.lista_modelos, "TODOS", "Todos os modelos"),
+                    labelsLinha,
+                    (estado.lista_sentido || []).map((opcao) => filtros.badge(`Sentido ${opcao}`, "dot")),
+                    (estado.lista_dias_semana || []).map((opcao) => filtros.badge(`Dias ${opcao}`, "dot")),
+                    [filtros.badge(`${estado.limite_km_l_menor} ≤ km/L ≤ ${estado.limite_km_l_maior} `, "dot")]
+                )
+            );
+        },
+        labels_veiculo: function (estado) {
+            if (!estado) {
+                return window.dash_clientside.no_update;
+            }
+            return filtros.saidasLabels(
+                filtros.labelsPeriodo(estado.datas).concat(
+                    [filtros.badge(String(estado.id_veiculo), "outline"), filtros.badge(String(estado.vec_model), "outline")],
+                    filtros.labelsSelecao(estado.lista_linhas, "TODAS", "Todas as linhas"),
+                    [filtros.badge(`${estado.km_l_min} ≤ km/L ≤ ${estado.km_l_max} `, "outline")]
+                )
+            );
+        },
+    },
+});
@@ -0,0 +1,36 @@
+// Funções usadas pelas camadas GeoJSON dos mapas (dash-leaflet)
+// Cada posição GPS / evento é um ponto do GeoJSON, desenhado como um CircleMarker no canvas do mapa
+// O hideout da camada informa a cor do ícone e o título do popup
+var mapaCamadas = window.mapaCamadas = window.mapaCamadas || {};
+
+mapaCamadas.pontoParaCamada = function (feature, latlng, context) {
+    const { cor } = context.hideout || {};
+
+    return L.circleMarker(latlng, {
+        radius: 10,
+        color: "black",
+        fillColor: cor,
+        fillOpacity: 0.75,
+    });
+};
+
+// Evita que os textos (ex: nome do motorista) sejam interpretados como HTML
+mapaCamadas.escapaHtml = function (texto) {
+    const div = document.createElement("div");
+    div.textContent = texto === undefined || texto === null ? "" : String(texto);
+    return div.innerHTML;
+};
+
+mapaCamadas.popupPorPonto = function (feature, layer, context) {
+    const { titulo } = context.hideout || {};
+    const props = feature.properties || {};
+
+    // Itens do popup
+    let itens = "";
+    if (props.motorista !== undefined) {
+        itens += `<li>Motorista: ${mapaCamadas.escapaHtml(props.motorista)}</li>`;
+    }
+    itens += `<li>Hora: ${mapaCamadas.escapaHtml(props.hora)}</li>`;
+
+    layer.bindPopup(`<div><h6>${mapaCamadas.escapaHtml(titulo)}</h6><ul>${itens}</ul></div>`);
+};
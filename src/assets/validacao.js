@@ -0,0 +1,40 @@
+// Validação dos campos de e-mail e WhatsApp das regras no navegador
+// (espelho de verifica_erro_email e verifica_erro_wpp, em pages/regras_criar.py e pages/regras_editar.py)
+var validacao = window.validacao = window.validacao || {};
+
+validacao.erroEmail = function (email) {
+    // Se estive vazio, não considere erro
+    if (!email) {
+        return false;
+    }
+    return !/^[\p{L}\p{N}_.-]+@[\p{L}\p{N}_.-]+\.[\p{L}\p{N}_]{2,}$/u.test(email.trim());
+};
+
+validacao.erroWpp = function (telefone) {
+    // Se estive vazio, não considere erro
+    if (!telefone) {
+        return false;
+    }
+
+    const telefoneLimpo = telefone.replaceAll(" ", "");
+    const padroesValidos = [
+        /^\(\d{2}\)\d{5}-\d{4}$/, // (62)99999-9999
+        /^\(\d{2}\)\d{4}-\d{4}$/, // (62)9999-9999
+        /^\d{2}\d{5}-\d{4}$/, // 6299999-9999
+        /^\d{2}\d{4}-\d{4}$/, // 629999-9999
+        /^\d{10}$/, // 6299999999 (fixo)
+        /^\d{11}$/, // 62999999999 (celular)
+    ];
+    return !padroesValidos.some((padrao) => padrao.test(telefoneLimpo));
+};
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    validacao: {
+        verifica_erro_email: function (email) {
+            return validacao.erroEmail(email);
+        },
+        verifica_erro_wpp: function (telefone) {
+            return validacao.erroWpp(telefone);
+        },
+    },
+});
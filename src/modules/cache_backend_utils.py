@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Backends compartilhados do cache de resultados
+#
+# O gunicorn executa vários workers (processos), cada um com o seu cache em memória. Os backends abaixo permitem que um
+# resultado calculado por um worker seja reutilizado pelos demais (e sobreviva à reciclagem dos workers):
+#   - sqlite: arquivo local (CACHE_SQLITE_PATH), compartilhado pelos workers da mesma máquina;
+#   - redis: servidor Redis (ou compatível), configurado em CACHE_REDIS_URL.
+#
+# Os DataFrames são armazenados em Parquet (formato binário e colunar).
+
+# Imports básicos
+import io
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+import pandas as pd
+
+# Backend compartilhado: memoria (somente o cache local), sqlite ou redis
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memoria").lower()
+CACHE_SQLITE_PATH = os.getenv(
+    "CACHE_SQLITE_PATH", os.path.join(tempfile.gettempdir(), "ra_dash_combustivel_cache.sqlite")
+)
+CACHE_SQLITE_MAX_MB = float(os.getenv("CACHE_SQLITE_MAX_MB", 1024))
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+
+def df_para_bytes(df):
+    """Serializa o DataFrame em Parquet"""
+    buffer = io.BytesIO()
+    df.to_parquet(buffer, engine="pyarrow", index=True)
+    return buffer.getvalue()
+
+
+def bytes_para_df(dados):
+    """Lê o DataFrame serializado em Parquet"""
+    return pd.read_parquet(io.BytesIO(dados), engine="pyarrow")
+
+
+class BackendSQLite:
+    """Cache compartilhado em arquivo SQLite (uma conexão por thread)"""
+
+    def __init__(self, caminho, memoria_max_bytes):
+        self.caminho = caminho
+        self.memoria_max_bytes = memoria_max_bytes
+        self.__local = threading.local()
+
+        with self.__conexao() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS cache_resultados (
+                    chave TEXT PRIMARY KEY,
+                    expira_em REAL NOT NULL,
+                    acessado_em REAL NOT NULL,
+                    tamanho INTEGER NOT NULL,
+                    valor BLOB NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_resultados_acessado_idx ON cache_resultados (acessado_em)")
+
+    def __conexao(self):
+        conn = getattr(self.__local, "conn", None)
+        if conn is None:
+            diretorio = os.path.dirname(self.caminho)
+            if diretorio:
+                os.makedirs(diretorio, exist_ok=True)
+
+            conn = sqlite3.connect(self.caminho, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.__local.conn = conn
+
+        return conn
+
+    def obter(self, chave):
+        conn = self.__conexao()
+        agora = time.time()
+        linha = conn.execute(
+            "SELECT valor FROM cache_resultados WHERE chave = ? AND expira_em > ?", (chave, agora)
+        ).fetchone()
+
+        if linha is None:
+            return None
+
+        with conn:
+            conn.execute("UPDATE cache_resultados SET acessado_em = ? WHERE chave = ?", (agora, chave))
+
+        return linha[0]
+
+    def salvar(self, chave, dados, ttl):
+        conn = self.__conexao()
+        agora = time.time()
+
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_resultados (chave, expira_em, acessado_em, tamanho, valor) VALUES (?, ?, ?, ?, ?)",
+                (chave, agora + ttl, agora, len(dados), sqlite3.Binary(dados)),
+            )
+
+            # Remove os itens expirados e, se necessário, os usados há mais tempo até caber no orçamento
+            conn.execute("DELETE FROM cache_resultados WHERE expira_em <= ?", (agora,))
+            tamanho_total = conn.execute("SELECT COALESCE(SUM(tamanho), 0) FROM cache_resultados").fetchone()[0]
+            if tamanho_total > self.memoria_max_bytes:
+                conn.execute(
+                    """
+                    DELETE FROM cache_resultados
+                    WHERE chave IN (
+                        SELECT chave
+                        FROM (
+                            SELECT chave, SUM(tamanho) OVER (ORDER BY acessado_em DESC) AS acumulado
+                            FROM cache_resultados
+                        )
+                        WHERE acumulado > ?
+                    )
+                    """,
+                    (self.memoria_max_bytes,),
+                )
+
+    def limpar(self):
+        conn = self.__conexao()
+        with conn:
+            conn.execute("DELETE FROM cache_resultados")
+
+
+class BackendRedis:
+    """Cache compartilhado em um servidor Redis (ou compatível); a expiração é feita pelo próprio Redis"""
+
+    def __init__(self, url):
+        # Dependência opcional
+        import redis
+
+        self.cliente = redis.Redis.from_url(url)
+        self.prefixo = "ra_dash_combustivel:cache:"
+
+    def obter(self, chave):
+        return self.cliente.get(self.prefixo + chave)
+
+    def salvar(self, chave, dados, ttl):
+        self.cliente.setex(self.prefixo + chave, int(max(ttl, 1)), dados)
+
+    def limpar(self):
+        for chave in self.cliente.scan_iter(self.prefixo + "*"):
+            self.cliente.delete(chave)
+
+
+def cria_backend_compartilhado():
+    """Cria o backend compartilhado configurado em CACHE_BACKEND (ou None para usar somente a memória local)"""
+    try:
+        if CACHE_BACKEND == "sqlite":
+            return BackendSQLite(CACHE_SQLITE_PATH, int(CACHE_SQLITE_MAX_MB * 1024**2))
+
+        if CACHE_BACKEND == "redis":
+            return BackendRedis(CACHE_REDIS_URL)
+    except Exception as e:
+        print(f"Erro ao criar o backend de cache {CACHE_BACKEND}, usando somente a memória local: {e}")
+
+    return None
@@ -0,0 +1,361 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Cache (TTL + LRU) dos resultados dos serviços
+#
+# Os métodos dos serviços decorados com @cache_resultado(ttl=...) guardam o resultado em memória, indexado pelo nome do
+# método e pelos argumentos normalizados (ex: ["001", "TODAS"] e ["TODAS"] geram a mesma chave). O cache:
+#   - respeita um orçamento de memória (CACHE_MEMORIA_MAX_MB), removendo os itens menos usados (LRU);
+#   - expira cada item conforme o TTL do método;
+#   - é invalidado quando os dados mudam (MAX(dia) de rmtc_viagens_analise_mix avança);
+#   - executa uma única consulta quando várias requisições pedem o mesmo resultado ao mesmo tempo;
+#   - opcionalmente compartilha os DataFrames entre os workers do gunicorn (CACHE_BACKEND, ver cache_backend_utils).
+
+# Imports básicos
+import functools
+import hashlib
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+# Imports BD
+from sqlalchemy.sql import text
+
+# Imports auxiliares
+from modules.filtro_utils import FiltroCombustivel
+from modules.cache_backend_utils import cria_backend_compartilhado, df_para_bytes, bytes_para_df
+
+# Configurações do cache
+CACHE_HABILITADO = os.getenv("CACHE_HABILITADO", "True").lower() in ("true", "1")
+CACHE_MEMORIA_MAX_MB = float(os.getenv("CACHE_MEMORIA_MAX_MB", 256))
+CACHE_TTL_PADRAO_SEGUNDOS = int(os.getenv("CACHE_TTL_PADRAO_SEGUNDOS", 600))
+
+# Intervalo (em segundos) para verificar se os dados mudaram (watermark)
+CACHE_WATERMARK_TTL_SEGUNDOS = int(os.getenv("CACHE_WATERMARK_TTL_SEGUNDOS", 60))
+
+# Termos usados nos filtros para representar todos os itens
+TERMOS_TODOS = ("TODAS", "TODOS")
+
+# Datas no formato YYYY-MM-DD (com ou sem horário)
+DATA_REGEX = re.compile(r"^\d{4}-\d{2}-\d{2}([T ].*)?$")
+
+
+def normaliza_argumento(valor):
+    """Normaliza um argumento para compor a chave do cache"""
+    if isinstance(valor, FiltroCombustivel):
+        return ("filtro", valor.chave())
+
+    if isinstance(valor, bool) or valor is None:
+        return valor
+
+    if isinstance(valor, (int, float)):
+        return float(valor)
+
+    if isinstance(valor, str):
+        if DATA_REGEX.match(valor):
+            return pd.to_datetime(valor).isoformat()
+        return valor
+
+    if hasattr(valor, "isoformat"):
+        return pd.to_datetime(valor).isoformat()
+
+    if isinstance(valor, (list, tuple, set)):
+        itens = [normaliza_argumento(item) for item in valor]
+
+        # Listas de seleção múltipla: a ordem não importa e o termo para todos engloba os demais
+        if itens and all(isinstance(item, str) and not DATA_REGEX.match(item) for item in itens):
+            for termo in TERMOS_TODOS:
+                if termo in itens:
+                    return (termo,)
+            return tuple(sorted(set(itens)))
+
+        return tuple(itens)
+
+    if isinstance(valor, dict):
+        return tuple(sorted((chave, normaliza_argumento(item)) for chave, item in valor.items()))
+
+    return repr(valor)
+
+
+def estima_tamanho(valor, _vistos=None):
+    """Estima o tamanho em bytes de um resultado (DataFrames, coleções e objetos simples)"""
+    if _vistos is None:
+        _vistos = set()
+
+    if id(valor) in _vistos:
+        return 0
+    _vistos.add(id(valor))
+
+    if isinstance(valor, pd.DataFrame):
+        return int(valor.memory_usage(deep=True).sum())
+
+    if isinstance(valor, pd.Series):
+        return int(valor.memory_usage(deep=True))
+
+    if isinstance(valor, (list, tuple, set)):
+        return sys.getsizeof(valor) + sum(estima_tamanho(item, _vistos) for item in valor)
+
+    if isinstance(valor, dict):
+        return sys.getsizeof(valor) + sum(
+            estima_tamanho(chave, _vistos) + estima_tamanho(item, _vistos) for chave, item in valor.items()
+        )
+
+    if hasattr(valor, "__dict__"):
+        return sys.getsizeof(valor) + estima_tamanho(vars(valor), _vistos)
+
+    return sys.getsizeof(valor)
+
+
+def copia_resultado(valor):
+    """Os callbacks alteram os DataFrames retornados (ex: adicionam colunas), por isso retornamos cópias"""
+    if isinstance(valor, (pd.DataFrame, pd.Series)):
+        return valor.copy()
+
+    return valor
+
+
+class EntradaCache:
+    __slots__ = ("valor", "expira_em", "watermark", "tamanho")
+
+    def __init__(self, valor, expira_em, watermark, tamanho):
+        self.valor = valor
+        self.expira_em = expira_em
+        self.watermark = watermark
+        self.tamanho = tamanho
+
+
+class CacheResultados:
+    """Cache em memória com TTL por item, LRU limitado por memória e invalidação por watermark"""
+
+    def __init__(self, memoria_max_bytes, backend_compartilhado=None):
+        self.memoria_max_bytes = memoria_max_bytes
+        self.memoria_usada_bytes = 0
+
+        # Backend compartilhado entre os workers (opcional)
+        self.backend_compartilhado = backend_compartilhado
+
+        self.__entradas = OrderedDict()
+        self.__em_andamento = {}
+        self.__lock = threading.Lock()
+
+        # Contadores (por método)
+        self.__hits = {}
+        self.__hits_compartilhado = {}
+        self.__misses = {}
+
+        # Watermark dos dados
+        self.__watermark = None
+        self.__watermark_verificado_em = None
+        self.__lock_watermark = threading.Lock()
+
+    def get_watermark(self, dbEngine):
+        """Função para obter o último dia das viagens (verificado a cada CACHE_WATERMARK_TTL_SEGUNDOS)"""
+        with self.__lock_watermark:
+            agora = time.monotonic()
+            if (
+                self.__watermark_verificado_em is not None
+                and agora - self.__watermark_verificado_em < CACHE_WATERMARK_TTL_SEGUNDOS
+            ):
+                return self.__watermark
+
+            try:
+                with dbEngine.connect() as conn:
+                    watermark = conn.execute(text('SELECT MAX("dia") FROM rmtc_viagens_analise_mix')).scalar()
+                watermark = None if watermark is None else str(watermark)
+            except Exception as e:
+                print(f"Erro ao obter o watermark do cache: {e}")
+                watermark = self.__watermark
+
+            # Dados novos: descarta todos os resultados antigos
+            if self.__watermark is not None and watermark != self.__watermark:
+                self.limpar()
+
+            self.__watermark = watermark
+            self.__watermark_verificado_em = agora
+            return watermark
+
+    def __remove(self, chave):
+        entrada = self.__entradas.pop(chave, None)
+        if entrada is not None:
+            self.memoria_usada_bytes -= entrada.tamanho
+
+    def obter(self, nome, chave, calcula, ttl, watermark):
+        """Retorna o resultado da chave; se não existir (ou expirou), executa calcula() uma única vez"""
+        while True:
+            with self.__lock:
+                entrada = self.__entradas.get(chave)
+                if entrada is not None:
+                    if entrada.expira_em > time.monotonic() and entrada.watermark == watermark:
+                        self.__entradas.move_to_end(chave)
+                        self.__hits[nome] = self.__hits.get(nome, 0) + 1
+                        return entrada.valor
+
+                    self.__remove(chave)
+
+                evento = self.__em_andamento.get(chave)
+                if evento is None:
+                    # Esta thread fica responsável por calcular o resultado
+                    evento = threading.Event()
+                    self.__em_andamento[chave] = evento
+                    self.__misses[nome] = self.__misses.get(nome, 0) + 1
+                    break
+
+            # Outra thread já está calculando o mesmo resultado
+            evento.wait()
+
+        try:
+            # Antes de calcular, verifica se outro worker já calculou o resultado
+            chave_compartilhada = self.__chave_compartilhada(chave, watermark)
+            valor = self.__obter_compartilhado(chave_compartilhada)
+            if valor is not None:
+                with self.__lock:
+                    self.__misses[nome] -= 1
+                    self.__hits_compartilhado[nome] = self.__hits_compartilhado.get(nome, 0) + 1
+            else:
+                valor = calcula()
+                self.__salvar_compartilhado(chave_compartilhada, valor, ttl)
+
+            tamanho = estima_tamanho(valor)
+
+            with self.__lock:
+                # Resultados maiores que o orçamento não são guardados
+                if tamanho <= self.memoria_max_bytes:
+                    self.__remove(chave)
+                    self.__entradas[chave] = EntradaCache(valor, time.monotonic() + ttl, watermark, tamanho)
+                    self.memoria_usada_bytes += tamanho
+
+                    # Remove os itens usados há mais tempo até caber no orçamento
+                    while self.memoria_usada_bytes > self.memoria_max_bytes:
+                        chave_antiga = next(iter(self.__entradas))
+                        self.__remove(chave_antiga)
+
+            return valor
+        finally:
+            with self.__lock:
+                self.__em_andamento.pop(chave, None)
+            evento.set()
+
+    def consultar(self, nome, chave, watermark):
+        """Retorna o resultado da chave se já estiver calculado (local ou compartilhado), sem calcular; senão None"""
+        with self.__lock:
+            entrada = self.__entradas.get(chave)
+            if entrada is not None and entrada.expira_em > time.monotonic() and entrada.watermark == watermark:
+                self.__entradas.move_to_end(chave)
+                self.__hits[nome] = self.__hits.get(nome, 0) + 1
+                return entrada.valor
+
+        valor = self.__obter_compartilhado(self.__chave_compartilhada(chave, watermark))
+        if valor is not None:
+            with self.__lock:
+                self.__hits_compartilhado[nome] = self.__hits_compartilhado.get(nome, 0) + 1
+
+        return valor
+
+    def __chave_compartilhada(self, chave, watermark):
+        # O watermark faz parte da chave: quando os dados mudam, os resultados antigos deixam de ser encontrados
+        if self.backend_compartilhado is None:
+            return None
+
+        return hashlib.sha256(repr((chave, watermark)).encode("utf-8")).hexdigest()
+
+    def __obter_compartilhado(self, chave_compartilhada):
+        if chave_compartilhada is None:
+            return None
+
+        try:
+            dados = self.backend_compartilhado.obter(chave_compartilhada)
+            return None if dados is None else bytes_para_df(dados)
+        except Exception as e:
+            print(f"Erro ao ler o cache compartilhado: {e}")
+            return None
+
+    def __salvar_compartilhado(self, chave_compartilhada, valor, ttl):
+        # Somente DataFrames são compartilhados (os demais resultados ficam no cache local)
+        if chave_compartilhada is None or not isinstance(valor, pd.DataFrame):
+            return
+
+        try:
+            self.backend_compartilhado.salvar(chave_compartilhada, df_para_bytes(valor), ttl)
+        except Exception as e:
+            print(f"Erro ao salvar no cache compartilhado: {e}")
+
+    def limpar(self):
+        """Remove todos os itens do cache local"""
+        with self.__lock:
+            self.__entradas.clear()
+            self.memoria_usada_bytes = 0
+
+    def estatisticas(self):
+        """Retorna os contadores de hit/miss por método e o uso de memória"""
+        with self.__lock:
+            nomes = sorted(set(self.__hits) | set(self.__hits_compartilhado) | set(self.__misses))
+            return {
+                "itens": len(self.__entradas),
+                "memoria_usada_mb": round(self.memoria_usada_bytes / 1024**2, 2),
+                "memoria_max_mb": round(self.memoria_max_bytes / 1024**2, 2),
+                "backend_compartilhado": type(self.backend_compartilhado).__name__ if self.backend_compartilhado else None,
+                "metodos": {
+                    nome: {
+                        "hits": self.__hits.get(nome, 0),
+                        "hits_compartilhado": self.__hits_compartilhado.get(nome, 0),
+                        "misses": self.__misses.get(nome, 0),
+                    }
+                    for nome in nomes
+                },
+            }
+
+
+# Instância única (compartilhada por todos os serviços do processo)
+cache_resultados = CacheResultados(int(CACHE_MEMORIA_MAX_MB * 1024**2), cria_backend_compartilhado())
+
+
+def cache_resultado(ttl=CACHE_TTL_PADRAO_SEGUNDOS):
+    """
+    Decorador para os métodos dos serviços.
+    O serviço deve possuir o atributo dbEngine (ou pgEngine), usado para verificar o watermark dos dados.
+    """
+
+    def decorador(metodo):
+        @functools.wraps(metodo)
+        def wrapper(self, *args, **kwargs):
+            if not CACHE_HABILITADO:
+                return metodo(self, *args, **kwargs)
+
+            nome, chave, watermark = chave_cache(self, metodo, args, kwargs)
+
+            valor = cache_resultados.obter(nome, chave, lambda: metodo(self, *args, **kwargs), ttl, watermark)
+            return copia_resultado(valor)
+
+        return wrapper
+
+    return decorador
+
+
+def chave_cache(servico, metodo, args, kwargs):
+    """Retorna o nome, a chave e o watermark do cache para a chamada de um método do serviço"""
+    nome = f"{type(servico).__name__}.{metodo.__name__}"
+    chave = (nome, tuple(normaliza_argumento(arg) for arg in args), normaliza_argumento(kwargs))
+
+    dbEngine = getattr(servico, "dbEngine", None) or getattr(servico, "pgEngine", None)
+    watermark = cache_resultados.get_watermark(dbEngine) if dbEngine is not None else None
+
+    return nome, chave, watermark
+
+
+def resultado_em_cache(metodo, *args, copia=True, **kwargs):
+    """
+    Retorna o resultado já calculado de um método decorado com @cache_resultado (ex: a tabela visível na página), sem
+    executá-lo. Retorna None se o resultado não estiver no cache.
+    Com copia=False, retorna o próprio objeto do cache (somente leitura: quem chama copia só o que for alterar).
+    """
+    if not CACHE_HABILITADO:
+        return None
+
+    nome, chave, watermark = chave_cache(metodo.__self__, metodo.__func__.__wrapped__, args, kwargs)
+    valor = cache_resultados.consultar(nome, chave, watermark)
+    return copia_resultado(valor) if copia else valor
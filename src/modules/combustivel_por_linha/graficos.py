@@ -36,11 +36,11 @@ def gerar_grafico_consumo_combustivel_por_linha(df):
         i_cor_hex = tema.PALETA_CORES_DISCRETA[i % len(tema.PALETA_CORES_DISCRETA)]
         i_cor_rgba = "rgba" + str(mcolors.to_rgba(i_cor_hex, alpha=0.2))
 
-        # Gera o gráfico de área para o intervalo (buffer) do modelo 
+        # Gera o gráfico de área para o intervalo (buffer) do modelo, entre os percentis 10 e 90 (robusto a outliers)
         fig.add_trace(
             go.Scatter(
                 x=df_linha_modelo["time_slot_dt"].tolist() + df_linha_modelo["time_slot_dt"].tolist()[::-1],
-                y=df_linha_modelo["max"].tolist() + df_linha_modelo["min"].tolist()[::-1],
+                y=df_linha_modelo["p90"].tolist() + df_linha_modelo["p10"].tolist()[::-1],
                 connectgaps=False,
                 fill="toself",
                 fillcolor=i_cor_rgba,
@@ -73,11 +73,16 @@ def gerar_grafico_consumo_combustivel_por_linha(df):
                         "mean",
                         "min",
                         "max",
+                        "p10",
+                        "p50",
+                        "p90",
                     ]
                 ],
                 hovertemplate=(
                     "<b>Horário:</b> %{customdata[0]}<br>"
                     + "<b>km/L Médio:</b> %{customdata[1]:.2f}<br>"
+                    + "<b>km/L Mediana (p50):</b> %{customdata[5]:.2f} km/L<br>"
+                    + "<b>Intervalo (p10 - p90):</b> %{customdata[4]:.2f} - %{customdata[6]:.2f} km/L<br>"
                     + "<b>km/L Mínimo:</b> %{customdata[2]:.2f} km/L<br>"
                     + "<b>km/L Máximo:</b> %{customdata[3]:.2f} km/L<br><extra></extra>"
                 ),
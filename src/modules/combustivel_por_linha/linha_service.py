@@ -11,12 +11,21 @@ import numpy as np
 import holidays
 
 # Imports auxiliares
-from modules.sql_utils import subquery_modelos_combustivel, subquery_sentido_combustivel, subquery_lista_dia_marcado
+from modules.sql_utils import le_sql, le_sql_lotes
+from modules.leitura_bulk_utils import le_sql_bulk, periodo_usa_copy
+from modules.filtro_utils import FiltroCombustivel
+from modules.cache_utils import cache_resultado
+from modules.rollup.sketch_linha_service import SketchLinhaService
+from modules.viagens_memoria_service import ViagensMemoriaService
+from modules.duckdb_service import get_engine_analitico, usa_duckdb
 
 
 class LinhaService:
     def __init__(self, pgEngine):
         self.pgEngine = pgEngine
+        # As consultas sobre as viagens usam get_engine_analitico (Postgres ou DuckDB, ver duckdb_service.py)
+        self.sketch_service = SketchLinhaService(pgEngine)
+        self.viagens_memoria = ViagensMemoriaService.get_instance(pgEngine)
 
     def normaliza_modelos(self, df):
         # Faz um DE / PARA para os seguintes elementos
@@ -37,43 +46,79 @@ class LinhaService:
 
         return df
     
+    @cache_resultado()
     def get_indicadores_linha(self, datas, lista_modelos, linha, lista_sentido, lista_dia_semana, limite_km_l_menor, limite_km_l_maior):
         """
         Função para obter os indicadores da linha
         """
-        # Extraí a data inicial e final
-        data_inicio_str, data_fim_str = datas[0], datas[1]
+        # Filtro canônico (gera as cláusulas e os parâmetros da query)
+        filtro = FiltroCombustivel(
+            datas,
+            lista_modelos,
+            [linha],
+            limite_km_l_menor,
+            limite_km_l_maior,
+            lista_sentido=lista_sentido,
+            lista_dia_semana=lista_dia_semana,
+        )
+        # Tenta responder pelas viagens em memória e pelos sketches diários (HyperLogLog dos veículos); se não for
+        # possível, consulta as viagens
+        df = self.viagens_memoria.agrega(filtro, [], usa_num_min_viagens=False)
+        if df is not None:
+            df = df[
+                [
+                    "total_viagens",
+                    "total_num_modelos",
+                    "total_num_veiculos",
+                    "velocidade_media_kmh",
+                    "media_km_por_litro",
+                    "litros_excedentes_baixa_perfomance",
+                ]
+            ].rename(
+                columns={
+                    "total_viagens": "total_num_viagens",
+                    "media_km_por_litro": "media_consumo_viagem",
+                    "litros_excedentes_baixa_perfomance": "total_litros_excedentes",
+                }
+            )
+            # Sem viagens de baixa performance, a soma é nula (como no SUM ... FILTER); aqui o SQL retorna 0
+            df["total_litros_excedentes"] = df["total_litros_excedentes"].fillna(0)
+        # (com o DuckDB cobrindo o período, os sketches no Postgres não são usados: a consulta exata sobre o snapshot já
+        # é rápida)
+        if df is None and not usa_duckdb(self.pgEngine, filtro.data_fim):
+            df = self.sketch_service.get_indicadores(filtro)
+        if df is None:
+            df = self.__get_indicadores_linha_viagens(filtro)
+
+        # Arredonda os valores
+        df["velocidade_media_kmh"] = df["velocidade_media_kmh"].round(2)
+        df["media_consumo_viagem"] = df["media_consumo_viagem"].round(2)
+        df["total_litros_excedentes"] = df["total_litros_excedentes"].round(2)
+
+        return df
 
-        # Subqueries
-        subquery_dia_marcado = subquery_lista_dia_marcado(lista_dia_semana)
-        subquery_modelos = subquery_modelos_combustivel(lista_modelos)
-        subquery_sentido = subquery_sentido_combustivel(lista_sentido)
+    def __get_indicadores_linha_viagens(self, filtro):
+        """Indicadores da linha consultando as viagens"""
+        subquery_filtro_str, params = filtro.sql(usa_num_min_viagens=False, usa_datas_cast=False)
 
         query = f"""
             WITH rmtc_viagens_analise_mix_padronizado AS (
                 SELECT 
                     CASE
-                        WHEN vec_model ILIKE 'MB OF 1721%%' THEN 'MB OF 1721 MPOLO TORINO U'
-                        WHEN vec_model ILIKE 'IVECO/MASCA%%' THEN 'IVECO/MASCA GRAN VIA'
-                        WHEN vec_model ILIKE 'VW 17230 APACHE VIP%%' THEN 'VW 17230 APACHE VIP-SC'
-                        WHEN vec_model ILIKE 'O500%%' THEN 'O500'
-                        WHEN vec_model ILIKE 'ELETRA INDUSCAR MILLENNIUM%%' THEN 'ELETRA INDUSCAR MILLENNIUM'
-                        WHEN vec_model ILIKE 'Induscar%%' THEN 'INDUSCAR'
-                        WHEN vec_model ILIKE 'VW 22.260 CAIO INDUSCAR%%' THEN 'VW 22.260 CAIO INDUSCAR'
+                        WHEN vec_model ILIKE 'MB OF 1721%' THEN 'MB OF 1721 MPOLO TORINO U'
+                        WHEN vec_model ILIKE 'IVECO/MASCA%' THEN 'IVECO/MASCA GRAN VIA'
+                        WHEN vec_model ILIKE 'VW 17230 APACHE VIP%' THEN 'VW 17230 APACHE VIP-SC'
+                        WHEN vec_model ILIKE 'O500%' THEN 'O500'
+                        WHEN vec_model ILIKE 'ELETRA INDUSCAR MILLENNIUM%' THEN 'ELETRA INDUSCAR MILLENNIUM'
+                        WHEN vec_model ILIKE 'Induscar%' THEN 'INDUSCAR'
+                        WHEN vec_model ILIKE 'VW 22.260 CAIO INDUSCAR%' THEN 'VW 22.260 CAIO INDUSCAR'
                         ELSE vec_model
                     END AS vec_model_padronizado,
                     r.*
                 FROM rmtc_viagens_analise_mix r
                 WHERE 
-                    "encontrou_numero_linha" = '{linha}'
-                    AND "encontrou_linha" = TRUE
-                    AND "dia" >= '{data_inicio_str}'
-                    AND "dia" <= '{data_fim_str}'
-                    AND "km_por_litro" >= {limite_km_l_menor}
-                    AND "km_por_litro" <= {limite_km_l_maior}
-                    {subquery_dia_marcado}
-                    {subquery_sentido}
-                    {subquery_modelos}
+                    "encontrou_linha" = TRUE
+                    {subquery_filtro_str}
             )
             SELECT
                 COUNT(*) as total_num_viagens,
@@ -90,52 +135,88 @@ class LinhaService:
             FROM
                 rmtc_viagens_analise_mix_padronizado r
         """
-        df = pd.read_sql(query, self.pgEngine)
-
-        # Arredonda os valores
-        df["velocidade_media_kmh"] = df["velocidade_media_kmh"].round(2)
-        df["media_consumo_viagem"] = df["media_consumo_viagem"].round(2)
-        df["total_litros_excedentes"] = df["total_litros_excedentes"].round(2)
-
-        return df
+        return le_sql(query, get_engine_analitico(self.pgEngine, filtro.data_fim), params)
     
+    @cache_resultado()
     def get_consumo_por_time_slot_linha(self, datas, lista_modelos, linha, lista_sentido, lista_dia_semana, limite_km_l_menor, limite_km_l_maior):
         """
         Função para obter os dados do combustível por linha por horário (que será usado para gerar o gráfico)
         """
-        # Extraí a data inicial e final
-        data_inicio_str, data_fim_str = datas[0], datas[1]
+        # Filtro canônico (gera as cláusulas e os parâmetros da query)
+        filtro = FiltroCombustivel(
+            datas,
+            lista_modelos,
+            [linha],
+            limite_km_l_menor,
+            limite_km_l_maior,
+            lista_sentido=lista_sentido,
+            lista_dia_semana=lista_dia_semana,
+        )
+        # Tenta responder pelas viagens em memória e pelos sketches diários (t-digest); se não for possível, consulta
+        # as viagens
+        df = self.__get_consumo_por_time_slot_linha_memoria(filtro)
+        if df is None and not usa_duckdb(self.pgEngine, filtro.data_fim):
+            df = self.sketch_service.get_consumo_por_time_slot(filtro)
+        if df is None:
+            df = self.__get_consumo_por_time_slot_linha_viagens(filtro)
+
+        # Normaliza os modelos
+        df = self.normaliza_modelos(df)
+
+        # Converte para DT
+        df["time_slot_dt"] = pd.to_datetime(df["time_slot"].astype(str), format="%H:%M")
+
+        # Arredonda os valores
+        for coluna in ["mean", "std", "min", "max", "p10", "p50", "p90"]:
+            df[coluna] = df[coluna].round(2)
+
+        return df
+
+    def __get_consumo_por_time_slot_linha_memoria(self, filtro):
+        """Consumo por faixa horária e modelo calculado sobre as viagens em memória (ou None)"""
+        df = self.viagens_memoria.seleciona(
+            filtro, ["time_slot", "vec_model", "km_por_litro"], usa_num_min_viagens=False
+        )
+        if df is None:
+            return None
+
+        df = df[df["vec_model"].notna() & df["km_por_litro"].notna()]
+        grupos = df.groupby(["time_slot", "vec_model"], observed=True, sort=True)["km_por_litro"]
+
+        df_agg = grupos.agg(["mean", "min", "max"])
+        df_agg["std"] = grupos.std(ddof=0)
+        df_agg["p10"] = grupos.quantile(0.1)
+        df_agg["p50"] = grupos.quantile(0.5)
+        df_agg["p90"] = grupos.quantile(0.9)
 
-        # Subqueries
-        subquery_dia_marcado = subquery_lista_dia_marcado(lista_dia_semana)
-        subquery_modelos = subquery_modelos_combustivel(lista_modelos)
-        subquery_sentido = subquery_sentido_combustivel(lista_sentido)
+        df_agg = df_agg.reset_index()
+        df_agg["time_slot"] = df_agg["time_slot"].astype(str)
+        df_agg["vec_model"] = df_agg["vec_model"].astype(str)
+
+        return df_agg
+
+    def __get_consumo_por_time_slot_linha_viagens(self, filtro):
+        """Função para obter o consumo por faixa horária e modelo consultando as viagens"""
+        subquery_filtro_str, params = filtro.sql(usa_num_min_viagens=False, usa_datas_cast=False)
 
         query = f"""
             WITH rmtc_viagens_analise_mix_padronizado AS (
                 SELECT 
                     CASE
-                        WHEN vec_model ILIKE 'MB OF 1721%%' THEN 'MB OF 1721 MPOLO TORINO U'
-                        WHEN vec_model ILIKE 'IVECO/MASCA%%' THEN 'IVECO/MASCA GRAN VIA'
-                        WHEN vec_model ILIKE 'VW 17230 APACHE VIP%%' THEN 'VW 17230 APACHE VIP-SC'
-                        WHEN vec_model ILIKE 'O500%%' THEN 'O500'
-                        WHEN vec_model ILIKE 'ELETRA INDUSCAR MILLENNIUM%%' THEN 'ELETRA INDUSCAR MILLENNIUM'
-                        WHEN vec_model ILIKE 'Induscar%%' THEN 'INDUSCAR'
-                        WHEN vec_model ILIKE 'VW 22.260 CAIO INDUSCAR%%' THEN 'VW 22.260 CAIO INDUSCAR'
+                        WHEN vec_model ILIKE 'MB OF 1721%' THEN 'MB OF 1721 MPOLO TORINO U'
+                        WHEN vec_model ILIKE 'IVECO/MASCA%' THEN 'IVECO/MASCA GRAN VIA'
+                        WHEN vec_model ILIKE 'VW 17230 APACHE VIP%' THEN 'VW 17230 APACHE VIP-SC'
+                        WHEN vec_model ILIKE 'O500%' THEN 'O500'
+                        WHEN vec_model ILIKE 'ELETRA INDUSCAR MILLENNIUM%' THEN 'ELETRA INDUSCAR MILLENNIUM'
+                        WHEN vec_model ILIKE 'Induscar%' THEN 'INDUSCAR'
+                        WHEN vec_model ILIKE 'VW 22.260 CAIO INDUSCAR%' THEN 'VW 22.260 CAIO INDUSCAR'
                         ELSE vec_model
                     END AS vec_model_padronizado,
                     r.*
                 FROM rmtc_viagens_analise_mix r
                 WHERE 
-                    "encontrou_numero_linha" = '{linha}'
-                    AND "encontrou_linha" = TRUE
-                    AND "dia" >= '{data_inicio_str}'
-                    AND "dia" <= '{data_fim_str}'
-                    AND "km_por_litro" >= {limite_km_l_menor}
-                    AND "km_por_litro" <= {limite_km_l_maior}
-                    {subquery_dia_marcado}
-                    {subquery_sentido}
-                    {subquery_modelos}
+                    "encontrou_linha" = TRUE
+                    {subquery_filtro_str}
             )
             SELECT
                 r."time_slot",
@@ -143,7 +224,10 @@ class LinhaService:
                 AVG("km_por_litro") AS "mean",
                 MIN("km_por_litro") AS "min",
                 MAX("km_por_litro") AS "max",
-                STDDEV_POP("km_por_litro") AS "std"
+                STDDEV_POP("km_por_litro") AS "std",
+                PERCENTILE_CONT(0.1) WITHIN GROUP (ORDER BY "km_por_litro") AS "p10",
+                PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY "km_por_litro") AS "p50",
+                PERCENTILE_CONT(0.9) WITHIN GROUP (ORDER BY "km_por_litro") AS "p90"
             FROM
                 rmtc_viagens_analise_mix_padronizado r
             GROUP BY r."time_slot", r."vec_model"
@@ -152,38 +236,27 @@ class LinhaService:
 			    AND r."vec_model" IS NOT NULL
             ORDER BY r."time_slot"
         """
-        df = pd.read_sql(query, self.pgEngine)
-
-        # Normaliza os modelos
-        df = self.normaliza_modelos(df)
-
-        # Converte para DT
-        df["time_slot_dt"] = pd.to_datetime(df["time_slot"].astype(str), format="%H:%M")
-
-        # Arredonda os valores
-        df["mean"] = df["mean"].round(2)
-        df["std"] = df["std"].round(2)
-        df["min"] = df["min"].round(2)
-        df["max"] = df["max"].round(2)
+        df = le_sql(query, get_engine_analitico(self.pgEngine, filtro.data_fim), params)
 
         return df
         
 
 
-    def get_viagens_realizada_na_linha(
+    def __query_viagens_realizada_na_linha(
         self, datas, lista_modelos, linha, lista_sentido, lista_dia_semana, limite_km_l_menor, limite_km_l_maior
     ):
-        """
-        Função para obter os dados do combustível por linha (que será usado para gerar o gráfico)
-        """
-
-        # Extraí a data inicial e final
-        data_inicio_str, data_fim_str = datas[0], datas[1]
-
-        # Subqueries
-        subquery_dia_marcado = subquery_lista_dia_marcado(lista_dia_semana)
-        subquery_modelos = subquery_modelos_combustivel(lista_modelos)
-        subquery_sentido = subquery_sentido_combustivel(lista_sentido)
+        """Query, parâmetros e engine (Postgres ou DuckDB) das viagens realizadas na linha"""
+        # Filtro canônico (gera as cláusulas e os parâmetros da query)
+        filtro = FiltroCombustivel(
+            datas,
+            lista_modelos,
+            [linha],
+            limite_km_l_menor,
+            limite_km_l_maior,
+            lista_sentido=lista_sentido,
+            lista_dia_semana=lista_dia_semana,
+        )
+        subquery_filtro_str, params = filtro.sql(usa_num_min_viagens=False, usa_datas_cast=False)
 
         query = f"""
         SELECT
@@ -197,18 +270,12 @@ class LinhaService:
             motoristas_api m 
             ON r."DriverId" = m."DriverId"
         WHERE
-            "encontrou_numero_linha" = '{linha}'
-            AND "encontrou_linha"
-            AND "dia" >= '{data_inicio_str}'
-            AND "dia" <= '{data_fim_str}'
-            AND "km_por_litro" >= {limite_km_l_menor}
-            AND "km_por_litro" <= {limite_km_l_maior}
-            {subquery_dia_marcado}
-            {subquery_modelos}
-            {subquery_sentido}
+            "encontrou_linha"
+            {subquery_filtro_str}
         """
-        df = pd.read_sql(query, self.pgEngine)
+        return query, params, filtro
 
+    def __prepara_viagens_realizada_na_linha(self, df):
         # Normaliza os modelos
         df = self.normaliza_modelos(df)
 
@@ -235,3 +302,40 @@ class LinhaService:
         df["nome_motorista"] = df["nome_motorista"].fillna("Não informado")
         return df
 
+    @cache_resultado()
+    def get_viagens_realizada_na_linha(
+        self, datas, lista_modelos, linha, lista_sentido, lista_dia_semana, limite_km_l_menor, limite_km_l_maior
+    ):
+        """
+        Função para obter os dados do combustível por linha (que será usado para gerar o gráfico)
+        """
+        query, params, filtro = self.__query_viagens_realizada_na_linha(
+            datas, lista_modelos, linha, lista_sentido, lista_dia_semana, limite_km_l_menor, limite_km_l_maior
+        )
+        dbEngine = get_engine_analitico(self.pgEngine, filtro.data_fim)
+
+        # Muitas linhas (todas as viagens do período): leitura via COPY quando o período pedido é longo
+        df = le_sql_bulk(query, dbEngine, params, usa_copy=periodo_usa_copy(filtro.data_inicio, filtro.data_fim))
+
+        return self.__prepara_viagens_realizada_na_linha(df)
+
+    def itera_viagens_realizada_na_linha(
+        self,
+        datas,
+        lista_modelos,
+        linha,
+        lista_sentido,
+        lista_dia_semana,
+        limite_km_l_menor,
+        limite_km_l_maior,
+        tamanho_lote=10000,
+    ):
+        """Mesmas viagens de get_viagens_realizada_na_linha, lidas em lotes (usado nas exportações)"""
+        query, params, filtro = self.__query_viagens_realizada_na_linha(
+            datas, lista_modelos, linha, lista_sentido, lista_dia_semana, limite_km_l_menor, limite_km_l_maior
+        )
+        dbEngine = get_engine_analitico(self.pgEngine, filtro.data_fim)
+
+        for df in le_sql_lotes(query, dbEngine, params, tamanho_lote):
+            yield self.__prepara_viagens_realizada_na_linha(df)
+
@@ -14,6 +14,24 @@ import plotly.graph_objects as go
 # Imports do tema
 import tema
 
+# Imports auxiliares
+from modules.serie_utils import amostra_janela, segmentos_consecutivos
+
+# Timeline: acima deste total de viagens, os pontos são desenhados com WebGL (Scattergl)
+TIMELINE_LIMITE_WEBGL = 1000
+
+# Timeline: máximo de pontos por série na janela visível e fora dela (LTTB)
+TIMELINE_MAX_PONTOS_JANELA = 3000
+TIMELINE_MAX_PONTOS_FORA_JANELA = 300
+
+# Timeline: coluna usada em cada tipo de anotação (faixas com as sequências de viagens com o mesmo valor)
+ANOTACOES_TIMELINE = {
+    "anotacoes_motoristas": "nome_motorista",
+    "anotacoes_linhas": "encontrou_numero_linha",
+    "anotacoes_modelos": "vec_model",
+    "anotacoes_status": "analise_status_90_dias",
+}
+
 
 # Rotinas para gerar os Gráficos
 def gerar_grafico_pizza_sinteze_veiculo(df, labels, values, metadata_browser):
@@ -89,14 +107,43 @@ def gerar_grafico_timeline_consumo_veiculo(
         "ERRO TELEMETRIA (>= 2.0 STD)": tema.COR_COMB_ERRO,
     }
 
+    # Janela visível da timeline (por padrão, do início do mês da última viagem até ela)
+    range_selecionado = range_selecionado or {}
+    x_max = df["timestamp_br_inicio"].max() + pd.Timedelta(hours=2)
+    x_start = x_max - pd.DateOffset(day=1)
+    if "xaxis.range" in range_selecionado:
+        x_start = pd.to_datetime(range_selecionado["xaxis.range"][0])
+        x_max = pd.to_datetime(range_selecionado["xaxis.range"][1])
+    elif "xaxis.range[0]" in range_selecionado:
+        x_start = pd.to_datetime(range_selecionado["xaxis.range[0]"])
+        x_max = pd.to_datetime(range_selecionado["xaxis.range[1]"])
+
+    # Históricos longos: WebGL e redução dos pontos (resolução total somente na janela visível)
+    # O callback é executado novamente a cada zoom/arraste (relayoutData), atualizando a janela
+    usa_webgl = len(df) > TIMELINE_LIMITE_WEBGL
+    ScatterTimeline = go.Scattergl if usa_webgl else go.Scatter
+
+    def amostra(df_serie, coluna_y):
+        return amostra_janela(
+            df_serie,
+            "timestamp_br_inicio",
+            coluna_y,
+            x_start,
+            x_max,
+            TIMELINE_MAX_PONTOS_JANELA,
+            TIMELINE_MAX_PONTOS_FORA_JANELA,
+        )
+
     # Inicia o gráfico
     fig = go.Figure()
 
     # Adiciona a linha horizontal do valor esperado
+    # Mantida em SVG (Scatter), pois o rangeslider não desenha as séries WebGL
+    df_mediana = amostra(df, "analise_valor_mediana_90_dias") if usa_webgl else df
     fig.add_trace(
         go.Scatter(
-            x=df["timestamp_br_inicio"],
-            y=df["analise_valor_mediana_90_dias"],
+            x=df_mediana["timestamp_br_inicio"],
+            y=df_mediana["analise_valor_mediana_90_dias"],
             mode="lines",
             name="Valor Esperado (Mediana)",
             line=dict(color="gray", width=2, dash="dash"),
@@ -106,9 +153,11 @@ def gerar_grafico_timeline_consumo_veiculo(
     # Adiciona os dados por categoria de status
     for status, color in status_colors.items():
         df_filtrado = df[df["analise_status_90_dias"] == status]
+        if usa_webgl:
+            df_filtrado = amostra(df_filtrado, "km_por_litro")
 
         fig.add_trace(
-            go.Scatter(
+            ScatterTimeline(
                 x=df_filtrado["timestamp_br_inicio"],
                 y=df_filtrado["km_por_litro"],
                 mode="markers",
@@ -196,15 +245,19 @@ def gerar_grafico_timeline_consumo_veiculo(
     menor_km_por_litro = df["km_por_litro"].min()
     maior_km_por_litro = df["km_por_litro"].max()
     lista_dados_anotado = []
-    if anotacao_no_grafico == "anotacoes_motoristas":
-        lista_dados_anotado = __get_lista_motoristas_timeline(df)
-    elif anotacao_no_grafico == "anotacoes_linhas":
-        lista_dados_anotado = __get_lista_linhas_timeline(df)
+    df_ordenado = df.sort_values(by="timestamp_br_inicio")
+    if anotacao_no_grafico in ANOTACOES_TIMELINE:
+        lista_dados_anotado = segmentos_consecutivos(df_ordenado[ANOTACOES_TIMELINE[anotacao_no_grafico]])
 
     if len(lista_dados_anotado) > 0:
         for i, dados_anotado in enumerate(lista_dados_anotado):
             start_idx, end_idx, label_dado = dados_anotado
-            df_motorista = df.iloc[start_idx:end_idx]
+            df_motorista = df_ordenado.iloc[start_idx:end_idx]
+
+            # Para os motoristas, mostra somente o primeiro nome
+            label_dado = str(label_dado)
+            if anotacao_no_grafico == "anotacoes_motoristas":
+                label_dado = label_dado.split()[0]
 
             i_cor_hex = tema.PALETA_CORES_DISCRETA[i % len(tema.PALETA_CORES_DISCRETA)]
             i_cor_rgb = "rgb" + str(mcolors.to_rgb(i_cor_hex))
@@ -233,7 +286,7 @@ def gerar_grafico_timeline_consumo_veiculo(
             fig.add_annotation(
                 x=x0,
                 y=y1,
-                text=f"{label_dado.split()[0]}",
+                text=label_dado,
                 showarrow=False,
                 font=dict(size=10, color=i_cor_rgb),
                 xanchor="left",
@@ -241,22 +294,8 @@ def gerar_grafico_timeline_consumo_veiculo(
                 bgcolor="rgba(255,255,255,0.7)",
             )
 
-    # Seta os limites da timeline
-    x_max = df["timestamp_br_inicio"].max() + pd.Timedelta(hours=2)
-    x_start = x_max - pd.DateOffset(day=1)
-
-    # Se não houver ponto selecionado, seta o range inicial para o último dia
-    if "xaxis.range" not in range_selecionado and "xaxis.range[0]" not in range_selecionado:
-        fig.update_xaxes(range=[x_start, x_max])
-    else:
-        if "xaxis.range" in range_selecionado:
-            x_start = pd.to_datetime(range_selecionado["xaxis.range"][0])
-            x_max = pd.to_datetime(range_selecionado["xaxis.range"][1])
-        elif "xaxis.range[0]" in range_selecionado:
-            x_start = pd.to_datetime(range_selecionado["xaxis.range[0]"])
-            x_max = pd.to_datetime(range_selecionado["xaxis.range[1]"])
-
-        fig.update_xaxes(range=[x_start, x_max])
+    # Seta os limites da timeline (janela calculada no início)
+    fig.update_xaxes(range=[x_start, x_max])
 
     # Aumenta a altura para melhorar a visualização, tira algumas margens
     fig.update_layout(
@@ -281,60 +320,6 @@ def gerar_grafico_timeline_consumo_veiculo(
     return fig
 
 
-def __get_lista_motoristas_timeline(df):
-    df_sorted = df.sort_values(by="timestamp_br_inicio")
-    start_idx = 0
-    end_idx = 0
-    motorista_inicial = df_sorted.iloc[0]["nome_motorista"]
-
-    lista_motoristas = []
-    for k, v in df_sorted.iterrows():
-        nome_motorista_atual = v["nome_motorista"]
-        # Se for o último item, adiciona o último grupo
-        if k == len(df_sorted) - 1:
-            end_idx = k + 1
-            lista_motoristas.append((start_idx, end_idx, motorista_inicial))
-
-        # Verifica se o motorista é igual ao anterior, se for, pula para o próximo
-        if nome_motorista_atual == motorista_inicial:
-            continue
-        else:
-            # Trocou o motorista, então vamos marcar a troca
-            end_idx = k
-            lista_motoristas.append((start_idx, end_idx, motorista_inicial))
-            motorista_inicial = nome_motorista_atual
-            start_idx = k
-
-    return lista_motoristas
-
-
-def __get_lista_linhas_timeline(df):
-    df_sorted = df.sort_values(by="timestamp_br_inicio")
-    start_idx = 0
-    end_idx = 0
-    linha_inicial = df_sorted.iloc[0]["encontrou_numero_linha"]
-
-    lista_linhas = []
-    for k, v in df_sorted.iterrows():
-        linha_atual = v["encontrou_numero_linha"]
-        # Se for o último item, adiciona o último grupo
-        if k == len(df_sorted) - 1:
-            end_idx = k + 1
-            lista_linhas.append((start_idx, end_idx, linha_inicial))
-
-        # Verifica se a linha é igual a anterior, se for, pula para o próximo
-        if linha_atual == linha_inicial:
-            continue
-        else:
-            # Trocou a linha, então vamos marcar a troca
-            end_idx = k
-            lista_linhas.append((start_idx, end_idx, linha_inicial))
-            linha_inicial = linha_atual
-            start_idx = k
-
-    return lista_linhas
-
-
 def gerar_grafico_histograma_viagens(df, viagem_atual_consumo, metadata_browser):
     # Gera o box plot
     fig = px.box(
@@ -376,3 +361,39 @@ def gerar_grafico_histograma_viagens(df, viagem_atual_consumo, metadata_browser)
     )
 
     return fig
+
+
+def gerar_grafico_box_distribuicao_referencia(estatisticas, viagem_vec_model, viagem_atual_consumo, metadata_browser):
+    """Gera o box plot a partir dos quantis da distribuição de referência (sem os pontos de cada viagem)"""
+    fig = go.Figure()
+
+    if estatisticas is not None:
+        fig.add_trace(
+            go.Box(
+                x=[viagem_vec_model],
+                q1=[estatisticas["q1"]],
+                median=[estatisticas["mediana"]],
+                q3=[estatisticas["q3"]],
+                lowerfence=[estatisticas["limite_inferior"]],
+                upperfence=[estatisticas["limite_superior"]],
+                mean=[estatisticas["media"]],
+                name=viagem_vec_model,
+                marker_color=tema.PALETA_CORES_DISCRETA[0],
+            )
+        )
+
+        total_viagens_str = f"{estatisticas['total_viagens']:,}".replace(",", ".")
+        fig.update_layout(
+            title=dict(text=f"Viagens semelhantes (90 dias): {total_viagens_str}", x=0.5, xanchor="center"),
+        )
+
+    fig.add_hline(
+        y=viagem_atual_consumo,
+        line=dict(color="red", width=3, dash="dot"),
+        annotation_text=f"Viagem selecionada ({viagem_atual_consumo:.2f} km/L)",
+        annotation_position="top right",
+    )
+
+    fig.update_layout(xaxis_title="Modelo do Veículo", yaxis_title="km/L", showlegend=False)
+
+    return fig
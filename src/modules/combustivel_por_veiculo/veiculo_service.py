@@ -4,31 +4,45 @@
 # Classe que centraliza os serviços para mostrar na página de consumo por veículo
 
 # Imports básicos
-import os
+import re
 import pandas as pd
 
 # Imports auxiliares
-from modules.sql_utils import subquery_linha_combustivel, subquery_dia_semana
+from modules.sql_utils import le_sql, subquery_dia_semana
+from modules.leitura_bulk_utils import le_sql_bulk, periodo_usa_copy
+from modules.filtro_utils import FiltroCombustivel, NUM_MIN_VIAGENS_PARA_CLASSIFICAR
+from modules.cache_utils import cache_resultado
+from modules.shape_linha_service import RegistroShapesLinha
+from modules.viagens_memoria_service import ViagensMemoriaService
+from modules.duckdb_service import get_engine_analitico
 
-# Constante indica o número mínimo de viagens que devem existir para poder classificar o consumo de uma viagem
-# Por exemplo, NUM_MIN_VIAGENS_PARA_CLASSIFICAR = 5 indica que somente as viagens cuja configuração possuam outras 5
-# viagens iguais (mesma linha, sentido, dia, etc) será incluída na análise
-NUM_MIN_VIAGENS_PARA_CLASSIFICAR = os.getenv("NUM_MIN_VIAGENS_PARA_CLASSIFICAR", 5)
+# Os eventos da Mix ficam em tabelas com o nome do evento (ex: public.excesso_velocidade)
+NOME_TABELA_EVENTO_REGEX = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
 
 
 class VeiculoService:
     def __init__(self, dbEngine):
         self.dbEngine = dbEngine
+        # As consultas sobre as viagens usam get_engine_analitico (Postgres ou DuckDB, ver duckdb_service.py); os eventos,
+        # o GPS e os shapes continuam no Postgres
+        self.registro_shapes = RegistroShapesLinha.get_instance(dbEngine)
+        self.viagens_memoria = ViagensMemoriaService.get_instance(dbEngine)
 
+    @cache_resultado()
     def get_sinteze_status_viagens(self, datas, vec_num_id, lista_linhas, km_l_min, km_l_max):
         """Função para obter a classificação das viagens analisadas"""
 
-        # Extraí a data inicial e final
-        data_inicio_str = datas[0]
-        data_fim_str = datas[1]
+        # Filtro canônico (gera as cláusulas e os parâmetros da query)
+        filtro = FiltroCombustivel(
+            datas, lista_linhas=lista_linhas, km_l_min=km_l_min, km_l_max=km_l_max, vec_num_id=vec_num_id
+        )
 
-        # Subqueries
-        subquery_linha_combustivel_str = subquery_linha_combustivel(lista_linhas, termo_all="TODAS")
+        # Tenta responder pelas viagens em memória
+        df = self.viagens_memoria.agrega(filtro, ["analise_status_90_dias"])
+        if df is not None:
+            return df[["analise_status_90_dias", "total_viagens"]]
+
+        subquery_filtro_str, params = filtro.sql()
 
         query = f"""
         SELECT  
@@ -38,28 +52,29 @@ class VeiculoService:
             rmtc_viagens_analise_mix
         WHERE
 	        encontrou_linha = true
-	        AND CAST("dia" AS date) BETWEEN DATE '{data_inicio_str}' AND DATE '{data_fim_str}'
-	        AND analise_num_amostras_90_dias >= {NUM_MIN_VIAGENS_PARA_CLASSIFICAR}
- 	        AND km_por_litro >= {km_l_min}
-	        AND km_por_litro <= {km_l_max}
-            AND vec_num_id = '{vec_num_id}'
-            {subquery_linha_combustivel_str}
+            {subquery_filtro_str}
         GROUP BY
             analise_status_90_dias 
         """
         # Executa a query
-        df = pd.read_sql(query, self.dbEngine)
+        df = le_sql(query, get_engine_analitico(self.dbEngine, filtro.data_fim), params)
 
         return df
 
+    @cache_resultado()
     def get_indicador_consumo_medio_km_l(self, datas, vec_num_id, lista_linhas, km_l_min, km_l_max):
         """Função para obter o indicador de consumo médio de km/L"""
-        # Extraí a data inicial e final
-        data_inicio_str = datas[0]
-        data_fim_str = datas[1]
+        # Filtro canônico (gera as cláusulas e os parâmetros da query)
+        filtro = FiltroCombustivel(
+            datas, lista_linhas=lista_linhas, km_l_min=km_l_min, km_l_max=km_l_max, vec_num_id=vec_num_id
+        )
 
-        # Subqueries
-        subquery_linha_combustivel_str = subquery_linha_combustivel(lista_linhas, termo_all="TODAS")
+        # Tenta responder pelas viagens em memória
+        df = self.viagens_memoria.agrega(filtro, [])
+        if df is not None:
+            return df[["media_km_por_litro"]].rename(columns={"media_km_por_litro": "media_km_por_l"})
+
+        subquery_filtro_str, params = filtro.sql()
 
         query = f"""
         SELECT  
@@ -68,26 +83,27 @@ class VeiculoService:
             rmtc_viagens_analise_mix
         WHERE
             encontrou_linha = true
-            AND CAST("dia" AS date) BETWEEN DATE '{data_inicio_str}' AND DATE '{data_fim_str}'
-            AND analise_num_amostras_90_dias >= {NUM_MIN_VIAGENS_PARA_CLASSIFICAR}
-            AND km_por_litro >= {km_l_min}
-            AND km_por_litro <= {km_l_max}
-            AND vec_num_id = '{vec_num_id}'
-            {subquery_linha_combustivel_str}
+            {subquery_filtro_str}
         """
         # Executa a query
-        df = pd.read_sql(query, self.dbEngine)
+        df = le_sql(query, get_engine_analitico(self.dbEngine, filtro.data_fim), params)
 
         return df
 
+    @cache_resultado()
     def get_indicador_consumo_litros_excedente(self, datas, vec_num_id, lista_linhas, km_l_min, km_l_max):
         """Função para obter o indicador de consumo excedente em L"""
-        # Extraí a data inicial e final
-        data_inicio_str = datas[0]
-        data_fim_str = datas[1]
+        # Filtro canônico (gera as cláusulas e os parâmetros da query)
+        filtro = FiltroCombustivel(
+            datas, lista_linhas=lista_linhas, km_l_min=km_l_min, km_l_max=km_l_max, vec_num_id=vec_num_id
+        )
 
-        # Subqueries
-        subquery_linha_combustivel_str = subquery_linha_combustivel(lista_linhas, termo_all="TODAS")
+        # Tenta responder pelas viagens em memória
+        df = self.viagens_memoria.agrega(filtro, [])
+        if df is not None:
+            return df[["litros_excedentes"]]
+
+        subquery_filtro_str, params = filtro.sql()
 
         query = f"""
         SELECT  
@@ -96,39 +112,34 @@ class VeiculoService:
             rmtc_viagens_analise_mix
         WHERE
             encontrou_linha = true
-            AND CAST("dia" AS date) BETWEEN DATE '{data_inicio_str}' AND DATE '{data_fim_str}'
-            AND analise_num_amostras_90_dias >= {NUM_MIN_VIAGENS_PARA_CLASSIFICAR}
-            AND km_por_litro >= {km_l_min}
-            AND km_por_litro <= {km_l_max}
-            AND vec_num_id = '{vec_num_id}'
-            {subquery_linha_combustivel_str}
+            {subquery_filtro_str}
         """
         # Executa a query
-        df = pd.read_sql(query, self.dbEngine)
+        df = le_sql(query, get_engine_analitico(self.dbEngine, filtro.data_fim), params)
 
         return df
 
+    @cache_resultado()
     def get_historico_viagens(self, datas, vec_num_id, lista_linhas, km_l_min, km_l_max):
         """Função para obter o histórico das viagens analisadas"""
 
-        # Extraí a data inicial e final
-        data_inicio_str = datas[0]
-        data_fim_str = datas[1]
-
-        # Subqueries
-        subquery_linha_combustivel_str = subquery_linha_combustivel(lista_linhas, termo_all="TODAS")
+        # Filtro canônico (gera as cláusulas e os parâmetros da query)
+        filtro = FiltroCombustivel(
+            datas, lista_linhas=lista_linhas, km_l_min=km_l_min, km_l_max=km_l_max, vec_num_id=vec_num_id
+        )
+        subquery_filtro_str, params = filtro.sql()
 
         query = f"""
         WITH rmtc_viagens_analise_mix_padronizado AS (
             SELECT 
                 CASE
-                    WHEN vec_model ILIKE 'MB OF 1721%%' THEN 'MB OF 1721 MPOLO TORINO U'
-                    WHEN vec_model ILIKE 'IVECO/MASCA%%' THEN 'IVECO/MASCA GRAN VIA'
-                    WHEN vec_model ILIKE 'VW 17230 APACHE VIP%%' THEN 'VW 17230 APACHE VIP-SC'
-                    WHEN vec_model ILIKE 'O500%%' THEN 'O500'
-                    WHEN vec_model ILIKE 'ELETRA INDUSCAR MILLENNIUM%%' THEN 'ELETRA INDUSCAR MILLENNIUM'
-                    WHEN vec_model ILIKE 'Induscar%%' THEN 'INDUSCAR'
-                    WHEN vec_model ILIKE 'VW 22.260 CAIO INDUSCAR%%' THEN 'VW 22.260 CAIO INDUSCAR'
+                    WHEN vec_model ILIKE 'MB OF 1721%' THEN 'MB OF 1721 MPOLO TORINO U'
+                    WHEN vec_model ILIKE 'IVECO/MASCA%' THEN 'IVECO/MASCA GRAN VIA'
+                    WHEN vec_model ILIKE 'VW 17230 APACHE VIP%' THEN 'VW 17230 APACHE VIP-SC'
+                    WHEN vec_model ILIKE 'O500%' THEN 'O500'
+                    WHEN vec_model ILIKE 'ELETRA INDUSCAR MILLENNIUM%' THEN 'ELETRA INDUSCAR MILLENNIUM'
+                    WHEN vec_model ILIKE 'Induscar%' THEN 'INDUSCAR'
+                    WHEN vec_model ILIKE 'VW 22.260 CAIO INDUSCAR%' THEN 'VW 22.260 CAIO INDUSCAR'
                     ELSE vec_model
                 END AS vec_model_padronizado,
                 r.*
@@ -146,17 +157,12 @@ class VeiculoService:
             ON r."DriverId" = m."DriverId"
         WHERE
             encontrou_linha = TRUE
-	        AND CAST("dia" AS date) BETWEEN DATE '{data_inicio_str}' AND DATE '{data_fim_str}'
-	        AND analise_num_amostras_90_dias >= {NUM_MIN_VIAGENS_PARA_CLASSIFICAR}
- 	        AND km_por_litro >= {km_l_min}
-	        AND km_por_litro <= {km_l_max}
-            AND vec_num_id = '{vec_num_id}'
-            {subquery_linha_combustivel_str}
+            {subquery_filtro_str}
         ORDER BY 
             encontrou_timestamp_inicio;
         """
         # Executa a query
-        df = pd.read_sql(query, self.dbEngine)
+        df = le_sql(query, get_engine_analitico(self.dbEngine, filtro.data_fim), params)
 
         # Força string nos asset_id
         df["vec_asset_id"] = df["vec_asset_id"].astype(str)
@@ -181,6 +187,7 @@ class VeiculoService:
 
         return df
 
+    @cache_resultado()
     def get_histograma_viagens_veiculo(
         self,
         km_l_min,
@@ -217,21 +224,34 @@ class VeiculoService:
             ON r."DriverId" = m."DriverId"
         WHERE
             encontrou_linha = TRUE
-	        AND CAST("dia" AS date) BETWEEN DATE '{data_inicio_str}' AND DATE '{data_fim_str}'
-	        AND analise_num_amostras_90_dias >= {NUM_MIN_VIAGENS_PARA_CLASSIFICAR}
- 	        AND km_por_litro >= {km_l_min}
-	        AND km_por_litro <= {km_l_max}
-            AND vec_model = '{viagem_vec_model}'
-            AND time_slot = '{viagem_time_slot}'
-            AND encontrou_numero_sublinha = '{viagem_linha}'
-            AND dia_eh_feriado = {viagem_dia_eh_feriado}
-            AND encontrou_sentido_linha='{viagem_sentido}'
+	        AND CAST("dia" AS date) BETWEEN CAST(:data_inicio AS date) AND CAST(:data_fim AS date)
+	        AND analise_num_amostras_90_dias >= :num_min_viagens
+ 	        AND km_por_litro >= :km_l_min
+	        AND km_por_litro <= :km_l_max
+            AND vec_model = :vec_model
+            AND time_slot = :time_slot
+            AND encontrou_numero_sublinha = :sublinha
+            AND dia_eh_feriado = :dia_eh_feriado
+            AND encontrou_sentido_linha = :sentido
             {subquery_dia_semana_str}
         ORDER BY
             rmtc_timestamp_inicio DESC;
         """
+        params = {
+            "data_inicio": data_inicio_str,
+            "data_fim": data_fim_str,
+            "num_min_viagens": NUM_MIN_VIAGENS_PARA_CLASSIFICAR,
+            "km_l_min": float(km_l_min),
+            "km_l_max": float(km_l_max),
+            "vec_model": viagem_vec_model,
+            "time_slot": viagem_time_slot,
+            "sublinha": viagem_linha,
+            "dia_eh_feriado": bool(viagem_dia_eh_feriado),
+            "sentido": viagem_sentido,
+        }
+
         # Executa a query
-        df = pd.read_sql(query, self.dbEngine)
+        df = le_sql(query, get_engine_analitico(self.dbEngine, data_fim_str), params)
 
         # Força string nos asset_id
         df["vec_asset_id"] = df["vec_asset_id"].astype(str)
@@ -261,14 +281,14 @@ class VeiculoService:
 
         return df
 
+    @cache_resultado()
     def get_tabela_lista_viagens_veiculo(self, datas, vec_num_id, lista_linhas, km_l_min, km_l_max):
         """Função para obter os dados da tabela com as viagens realizadsa por um veiculo"""
-        # Extraí a data inicial e final
-        data_inicio_str = datas[0]
-        data_fim_str = datas[1]
-
-        # Subqueries
-        subquery_linha_combustivel_str = subquery_linha_combustivel(lista_linhas, termo_all="TODAS")
+        # Filtro canônico (gera as cláusulas e os parâmetros da query)
+        filtro = FiltroCombustivel(
+            datas, lista_linhas=lista_linhas, km_l_min=km_l_min, km_l_max=km_l_max, vec_num_id=vec_num_id
+        )
+        subquery_filtro_str, params = filtro.sql()
 
         query = f"""
         SELECT
@@ -283,17 +303,17 @@ class VeiculoService:
             ON r."DriverId" = m."DriverId"
         WHERE
             encontrou_linha = true
-            AND analise_num_amostras_90_dias >= {NUM_MIN_VIAGENS_PARA_CLASSIFICAR}
-            AND CAST("dia" AS date) BETWEEN DATE '{data_inicio_str}' AND DATE '{data_fim_str}'
-            AND km_por_litro >= {km_l_min}
-            AND km_por_litro <= {km_l_max}
-            AND vec_num_id = '{vec_num_id}'
-            {subquery_linha_combustivel_str}
+            {subquery_filtro_str}
         ORDER BY
             rmtc_timestamp_inicio DESC;
         """
-        # Executa a query
-        df = pd.read_sql(query, self.dbEngine)
+        # Executa a query (leitura via COPY quando o período pedido é longo)
+        df = le_sql_bulk(
+            query,
+            get_engine_analitico(self.dbEngine, filtro.data_fim),
+            params,
+            usa_copy=periodo_usa_copy(filtro.data_inicio, filtro.data_fim),
+        )
 
         # Ordena
         df = df.sort_values(by=["dia", "encontrou_timestamp_inicio"], ascending=[False, False])
@@ -327,8 +347,9 @@ class VeiculoService:
 
         return df
 
+    @cache_resultado()
     def get_agg_eventos_ocorreram_viagem(self, data_inicio_str, data_fim_str, vec_asset_id):
-        query = f"""
+        query = """
         SELECT
             tea."Description" AS event_label,
             tea."DescriptionCLEAN" AS event_value,
@@ -340,98 +361,176 @@ class VeiculoService:
             tipos_eventos_api AS tea
             ON tpe.event_type_id = tea."EventTypeId"
         WHERE
-            asset_id = '{vec_asset_id}'
+            asset_id = :vec_asset_id
             AND dia_evento IS NOT NULL
             AND (
                 "dia_evento"::timestamptz AT TIME ZONE 'America/Sao_Paulo'
-            ) BETWEEN '{data_inicio_str}' AND '{data_fim_str}'
+            ) BETWEEN CAST(:data_inicio AS timestamp) AND CAST(:data_fim AS timestamp)
         GROUP BY
             tea."Description", tea."DescriptionCLEAN", tea."EventTypeId"
         ORDER BY
             tea."Description";
         """
-        df = pd.read_sql(query, self.dbEngine)
+        params = {"vec_asset_id": str(vec_asset_id), "data_inicio": data_inicio_str, "data_fim": data_fim_str}
+        df = le_sql(query, self.dbEngine, params)
 
         return df
 
-    def get_eventos_ocorreram_viagem(self, data_inicio_str, data_fim_str, vec_asset_id):
-        query = f"""
-        SELECT
-            *
-        FROM
-            public.trip_possui_evento AS tpe
-        LEFT JOIN
-            tipos_eventos_api AS tea
-            ON tpe.event_type_id = tea."EventTypeId"
-        WHERE
-            asset_id = '{vec_asset_id}'
-            AND dia_evento IS NOT NULL
-            AND (
-                "dia_evento"::timestamptz AT TIME ZONE 'America/Sao_Paulo'
-            ) BETWEEN '{data_inicio_str}' AND '{data_fim_str}'
+    @cache_resultado()
+    def get_dados_viagem(self, data_inicio_str, data_fim_str, vec_asset_id, lista_eventos_com_gps):
         """
-        df = pd.read_sql(query, self.dbEngine)
-
-        return df
-
-    def get_detalhamento_evento_mix_veiculo(self, data_inicio_str, data_fim_str, vec_asset_id, event_name):
-        query = f"""
+        Função para obter, em uma única consulta, os dados do mapa de uma viagem: eventos que ocorreram, posições GPS
+        e a posição de cada evento com GPS (uma linha por item, identificada pela coluna tipo)
+        """
+        params = {
+            "vec_asset_id": str(vec_asset_id),
+            "data_inicio": data_inicio_str,
+            "data_fim": data_fim_str,
+        }
+
+        # Uma parte da query por tabela de evento com GPS
+        # O EXISTS não depende da linha, então o Postgres só lê a tabela se o evento ocorreu na viagem
+        subqueries_eventos = []
+        for i, event_name in enumerate(sorted(set(lista_eventos_com_gps))):
+            # O nome da tabela não pode ser parâmetro, então validamos que é um identificador simples
+            if not NOME_TABELA_EVENTO_REGEX.match(event_name):
+                raise ValueError(f"Nome de evento inválido: {event_name}")
+
+            params[f"evento_{i}"] = event_name
+            subqueries_eventos.append(
+                f"""
+            UNION ALL
             SELECT
-            *
+                'evento_gps' AS tipo,
+                CAST(:evento_{i} AS text) AS evento,
+                NULL::text AS rotulo,
+                NULL::bigint AS total,
+                evt."StartDateTime"::timestamptz AT TIME ZONE 'UTC' AS momento,
+                evt."StartPosition_Latitude"::double precision AS latitude,
+                evt."StartPosition_Longitude"::double precision AS longitude,
+                ma."Name"::text AS motorista
             FROM
                 public.{event_name} evt
-            LEFT JOIN motoristas_api ma 
-                on evt."DriverId" = ma."DriverId" 
+            LEFT JOIN motoristas_api ma
+                ON evt."DriverId" = ma."DriverId"
             WHERE
-                "AssetId" = '{vec_asset_id}'
-                AND
-                "StartDateTime" IS NOT NULL
-                AND "StartDateTime"::text NOT ILIKE 'NaN'
-                AND ("StartDateTime"::timestamptz AT TIME ZONE 'America/Sao_Paulo')
-                    BETWEEN '{data_inicio_str}' AND '{data_fim_str}'
-        """
-        df = pd.read_sql(query, self.dbEngine)
+                EXISTS (SELECT 1 FROM eventos_viagem ev WHERE ev.event_value = CAST(:evento_{i} AS text))
+                AND evt."AssetId" = :vec_asset_id
+                AND evt."StartDateTime" IS NOT NULL
+                AND evt."StartDateTime"::text NOT ILIKE 'NaN'
+                AND (evt."StartDateTime"::timestamptz AT TIME ZONE 'America/Sao_Paulo')
+                    BETWEEN CAST(:data_inicio AS timestamp) AND CAST(:data_fim AS timestamp)
+            """
+            )
 
-        # Seta nome não conhecido para os motoristas que não tiverem dado
-        df["Name"] = df["Name"].fillna("Não informado")
-        return df
-
-    def get_posicao_gps_veiculo(self, data_inicio_str, data_fim_str, vec_asset_id):
         query = f"""
+        WITH eventos_viagem AS (
             SELECT
-            *
+                tea."Description" AS event_label,
+                tea."DescriptionCLEAN" AS event_value,
+                COUNT(*) AS total_eventos
             FROM
-                public.posicao_gps
+                public.trip_possui_evento AS tpe
+            LEFT JOIN
+                tipos_eventos_api AS tea
+                ON tpe.event_type_id = tea."EventTypeId"
             WHERE
-                "AssetId" = '{vec_asset_id}'
-                AND
-                "Timestamp" IS NOT NULL
-                AND "Timestamp"::text NOT ILIKE 'NaN'
-                AND ("Timestamp"::timestamptz AT TIME ZONE 'America/Sao_Paulo')
-                    BETWEEN '{data_inicio_str}' AND '{data_fim_str}'
+                asset_id = :vec_asset_id
+                AND dia_evento IS NOT NULL
+                AND (
+                    "dia_evento"::timestamptz AT TIME ZONE 'America/Sao_Paulo'
+                ) BETWEEN CAST(:data_inicio AS timestamp) AND CAST(:data_fim AS timestamp)
+            GROUP BY
+                tea."Description", tea."DescriptionCLEAN"
+        )
+        SELECT
+            'evento' AS tipo,
+            event_value::text AS evento,
+            event_label::text AS rotulo,
+            total_eventos AS total,
+            NULL::timestamp AS momento,
+            NULL::double precision AS latitude,
+            NULL::double precision AS longitude,
+            NULL::text AS motorista
+        FROM
+            eventos_viagem
+        UNION ALL
+        SELECT
+            'gps' AS tipo,
+            NULL::text AS evento,
+            NULL::text AS rotulo,
+            NULL::bigint AS total,
+            "Timestamp"::timestamptz AT TIME ZONE 'UTC' AS momento,
+            "Latitude"::double precision AS latitude,
+            "Longitude"::double precision AS longitude,
+            NULL::text AS motorista
+        FROM
+            public.posicao_gps
+        WHERE
+            "AssetId" = :vec_asset_id
+            AND "Timestamp" IS NOT NULL
+            AND "Timestamp"::text NOT ILIKE 'NaN'
+            AND ("Timestamp"::timestamptz AT TIME ZONE 'America/Sao_Paulo')
+                BETWEEN CAST(:data_inicio AS timestamp) AND CAST(:data_fim AS timestamp)
+        {"".join(subqueries_eventos)}
         """
-        df = pd.read_sql(query, self.dbEngine)
+        df = le_sql(query, self.dbEngine, params)
 
         return df
 
-    def get_shape_linha(self, data_str, viagem_linha, viagem_sentido):
-        query = f"""
-        SELECT
-            id,
-            diahorario,
-            numero,
-            numero_sublinha,
-            desc_linha,
-            sentido,
-            tamanhokm,
-            geojsondata
-        FROM (
-            SELECT DISTINCT ON (numero_sublinha, sentido) *
-            FROM rmtc_kml_via_ra kml
-            ORDER BY numero_sublinha, sentido, ABS(EXTRACT(EPOCH FROM (kml.diahorario::timestamp - '{data_str}'::timestamp)))
-        ) AS via_ra
-        WHERE numero_sublinha = '{viagem_linha}' AND sentido = '{viagem_sentido}'
+    def get_bundle_viagem(
+        self, data_inicio_str, data_fim_str, vec_asset_id, viagem_linha, viagem_sentido, lista_eventos_com_gps
+    ):
+        """
+        Função para obter os dados do mapa de uma viagem, separados por camada:
+            - geojson_linha: shape da linha (dict) ou None
+            - df_eventos: eventos que ocorreram na viagem (event_label, event_value, total_eventos)
+            - df_posicoes_gps: posições GPS do veículo (Timestamp, Latitude, Longitude)
+            - eventos_gps: dicionário event_value -> posições do evento (mesmas colunas das tabelas da Mix)
         """
-        df = pd.read_sql(query, self.dbEngine)
+        lista_eventos_com_gps = [str(evt) for evt in lista_eventos_com_gps]
+        df = self.get_dados_viagem(data_inicio_str, data_fim_str, vec_asset_id, lista_eventos_com_gps)
+
+        # Shape da linha (versão mais próxima do início da viagem)
+        geojson_linha = self.registro_shapes.get_geojson(data_inicio_str, viagem_linha, viagem_sentido)
+
+        # Eventos que ocorreram na viagem
+        df_eventos = (
+            df[df["tipo"] == "evento"][["rotulo", "evento", "total"]]
+            .rename(columns={"rotulo": "event_label", "evento": "event_value", "total": "total_eventos"})
+            .sort_values(by="event_label")
+            .reset_index(drop=True)
+        )
 
-        return df
+        # Posições GPS
+        df_posicoes_gps = (
+            df[df["tipo"] == "gps"][["momento", "latitude", "longitude"]]
+            .rename(columns={"momento": "Timestamp", "latitude": "Latitude", "longitude": "Longitude"})
+            .reset_index(drop=True)
+        )
+
+        # Posições dos eventos com GPS (inclusive os que ocorreram mas não possuem posição)
+        df_eventos_gps = df[df["tipo"] == "evento_gps"].rename(
+            columns={
+                "momento": "StartDateTime",
+                "latitude": "StartPosition_Latitude",
+                "longitude": "StartPosition_Longitude",
+                "motorista": "Name",
+            }
+        )
+        df_eventos_gps["Name"] = df_eventos_gps["Name"].fillna("Não informado")
+        colunas_eventos_gps = ["StartDateTime", "StartPosition_Latitude", "StartPosition_Longitude", "Name"]
+
+        eventos_gps = {}
+        for event_value in df_eventos["event_value"]:
+            if event_value in lista_eventos_com_gps:
+                eventos_gps[event_value] = df_eventos_gps[df_eventos_gps["evento"] == event_value][
+                    colunas_eventos_gps
+                ].reset_index(drop=True)
+
+        return {
+            "geojson_linha": geojson_linha,
+            "df_eventos": df_eventos,
+            "df_posicoes_gps": df_posicoes_gps,
+            "eventos_gps": eventos_gps,
+        }
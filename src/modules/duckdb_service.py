@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Motor analítico alternativo (DuckDB) para as consultas agregadas sobre as viagens
+#
+# Com VIAGENS_MOTOR_ANALITICO=duckdb, as consultas das páginas (visão geral, linha e veículo) sobre
+# rmtc_viagens_analise_mix (e o join com motoristas_api) são executadas pelo DuckDB sobre o snapshot das viagens
+# (snapshot_viagens.py), em vez do Postgres. O DuckDB é colunar e vetorizado, então as varreduras e GROUP BYs sobre
+# milhões de viagens são bem mais rápidos e não ocupam o banco operacional. Sem o banco, o painel também pode ser usado
+# offline (demonstrações e benchmarks), desde que existam o snapshot das viagens e o snapshot das dimensões
+# (ENTIDADES_SNAPSHOT_DIR).
+#
+# O snapshot é o mesmo das viagens em memória: com o motor DuckDB configurado, a exportação também grava as linhas
+# completas das viagens (um Parquet por mês) e os motoristas na versão (versoes/<versao>/parquet/<tabela>/), com o
+# mesmo reaproveitamento dos meses que não mudaram. Exportação (executar a partir do diretório src, ex: via cron):
+#   python -m modules.snapshot_viagens
+#
+# As tabelas são views (read_parquet) sobre a versão atual, recriadas em cada conexão do DuckDB (em memória, uma por
+# thread) quando a versão muda. Uma consulta só usa o DuckDB se o snapshot cobrir o período pedido (até data_fim ou
+# até o último dia das viagens no banco); caso contrário, é executada no Postgres.
+#
+# Os pacotes duckdb e duckdb_engine são opcionais: só são carregados (ao criar a engine) com o motor DuckDB.
+
+# Imports básicos
+import functools
+import glob
+import os
+import threading
+
+import pandas as pd
+
+# Imports BD
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import SingletonThreadPool
+from sqlalchemy.sql import text
+
+# Imports auxiliares
+from modules.cache_utils import cache_resultados
+from modules import snapshot_viagens
+from modules.snapshot_viagens import TABELA_MOTORISTAS, TABELA_VIAGENS
+
+# Configurações
+VIAGENS_MOTOR_ANALITICO = os.getenv("VIAGENS_MOTOR_ANALITICO", "postgres").lower()
+
+# Indica se as consultas analíticas usam o DuckDB
+VIAGENS_MOTOR_DUCKDB = VIAGENS_MOTOR_ANALITICO == "duckdb"
+
+# Versões do snapshot já avisadas como desatualizadas (evita repetir o aviso a cada consulta)
+versoes_desatualizadas_avisadas = set()
+
+
+def cria_views(conexao, nome_versao):
+    """Cria as views das tabelas da versão do snapshot na conexão do DuckDB (somente as tabelas que possuem arquivos)"""
+    for tabela in [TABELA_VIAGENS, TABELA_MOTORISTAS]:
+        padrao = os.path.join(snapshot_viagens.caminho_parquet(nome_versao, tabela), "*.parquet")
+        if not glob.glob(padrao):
+            print(f"Snapshot Parquet da tabela {tabela} não encontrado na versão {nome_versao}")
+            conexao.execute(f"DROP VIEW IF EXISTS {tabela}")
+            continue
+
+        padrao_sql = padrao.replace("'", "''")
+        conexao.execute(
+            f"CREATE OR REPLACE VIEW {tabela} AS SELECT * FROM read_parquet('{padrao_sql}', union_by_name = true)"
+        )
+
+
+def atualiza_views(conexao, registro, _proxy):
+    # Recria as views quando a versão atual do snapshot muda (cada conexão guarda a versão das suas views)
+    nome_versao = snapshot_viagens.versao_atual()
+    if nome_versao is not None and registro.info.get("versao_snapshot") != nome_versao:
+        cria_views(conexao, nome_versao)
+        registro.info["versao_snapshot"] = nome_versao
+
+
+class DuckDBSingleton:
+    """
+    Singleton para acessar o DuckDB (snapshot das viagens)
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls, *args, **kwargs):
+        """
+        Cria ou retorna uma instância do singleton
+        """
+        with cls._lock:  # Garante thead safety
+            if cls._instance is None:
+                cls._instance = super(DuckDBSingleton, cls).__new__(cls)
+                cls._instance._initialize(*args, **kwargs)
+        return cls._instance
+
+    def _initialize(self):
+        """
+        Inicializa a engine (requer os pacotes opcionais duckdb e duckdb_engine)
+        """
+        if hasattr(self, "_initialized") and self._initialized:
+            return
+
+        # Banco em memória: cada thread tem a sua conexão, com as views sobre os arquivos do snapshot
+        self._engine = create_engine("duckdb:///:memory:", poolclass=SingletonThreadPool)
+        event.listen(self._engine, "checkout", atualiza_views)
+        self._initialized = True
+
+    @classmethod
+    def get_instance(cls):
+        """
+        Retorna a singleton
+        """
+        return cls()
+
+    def get_engine(self):
+        """
+        Retorna a SQLAlchemy engine.
+        """
+        return self._engine
+
+
+@functools.lru_cache(maxsize=4)
+def le_manifesto(nome_versao):
+    # As versões são imutáveis, então o manifesto pode ser guardado
+    return snapshot_viagens.le_manifesto(nome_versao)
+
+
+def usa_duckdb(pgEngine, data_fim):
+    """
+    Indica se a consulta até data_fim deve ser executada no DuckDB: motor configurado e snapshot (com os Parquet)
+    cobrindo o período até min(data_fim, último dia das viagens no banco), a mesma regra do cubo diário
+    """
+    if not VIAGENS_MOTOR_DUCKDB or data_fim is None:
+        return False
+
+    nome_versao = snapshot_viagens.versao_atual()
+    if nome_versao is None:
+        return False
+
+    manifesto = le_manifesto(nome_versao)
+    if not manifesto.get("parquet") or not manifesto.get("ultimo_dia"):
+        return False
+
+    # Sem o banco (ex: offline), o snapshot é usado
+    ultimo_dia_viagens = cache_resultados.get_watermark(pgEngine)
+    if ultimo_dia_viagens is None:
+        return True
+
+    ultimo_dia_snapshot = pd.to_datetime(manifesto["ultimo_dia"])
+    ultimo_dia_viagens = pd.to_datetime(ultimo_dia_viagens).normalize()
+    if ultimo_dia_snapshot < ultimo_dia_viagens and nome_versao not in versoes_desatualizadas_avisadas:
+        versoes_desatualizadas_avisadas.add(nome_versao)
+        print(
+            f"Snapshot das viagens {nome_versao} desatualizado (até {manifesto['ultimo_dia']}, banco até "
+            f"{ultimo_dia_viagens.date()}): consultas dos períodos recentes executadas no Postgres"
+        )
+
+    return ultimo_dia_snapshot >= min(pd.to_datetime(data_fim), ultimo_dia_viagens)
+
+
+def get_engine_analitico(pgEngine, data_fim):
+    """Retorna a engine usada na consulta analítica sobre as viagens até data_fim (Postgres ou DuckDB)"""
+    if usa_duckdb(pgEngine, data_fim):
+        return DuckDBSingleton.get_instance().get_engine()
+
+    return pgEngine
+
+
+def exporta_parquet_viagens(conn, dia_inicio, dia_fim, caminho):
+    """
+    Escreve as linhas completas das viagens do período [dia_inicio, dia_fim) em Parquet.
+    Retorna False (sem escrever o arquivo) se não houver viagens.
+    """
+    query = f"""
+    SELECT *
+    FROM {TABELA_VIAGENS}
+    WHERE
+        CAST("dia" AS date) >= CAST(:dia_inicio AS date)
+        AND CAST("dia" AS date) < CAST(:dia_fim AS date)
+    """
+    df = pd.read_sql(text(query), conn, params={"dia_inicio": str(dia_inicio), "dia_fim": str(dia_fim)})
+    if df.empty:
+        return False
+
+    df.to_parquet(caminho, index=False)
+    return True
+
+
+def exporta_parquet_motoristas(conn, caminho):
+    """Escreve os motoristas em Parquet"""
+    pd.read_sql(text(f"SELECT * FROM {TABELA_MOTORISTAS}"), conn).to_parquet(caminho, index=False)
@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Serviço (singleton) com as dimensões usadas nos filtros das páginas (linhas, veículos, modelos e tipos de eventos)
+#
+# As dimensões são carregadas sob demanda (no primeiro acesso, e não no import das páginas) e mantidas em memória.
+# Após ENTIDADES_TTL_SEGUNDOS, o valor atual continua sendo retornado enquanto uma nova versão é carregada em segundo
+# plano. Cada dimensão também é salva em disco (ENTIDADES_SNAPSHOT_DIR), permitindo que um worker novo inicie sem
+# precisar consultar o banco.
+
+# Imports básicos
+import os
+import tempfile
+import threading
+import time
+
+import pandas as pd
+
+# Imports auxiliares
+from modules.entities_utils import (
+    get_linhas_possui_info_combustivel,
+    get_veiculos_com_combustivel,
+    get_modelos_com_combustivel,
+    get_veiculos_modelos_com_combustivel,
+    get_tipos_eventos_telemetria_mix_com_data,
+    get_tipos_eventos_telemetria_mix_com_gps,
+)
+
+# Configurações
+ENTIDADES_TTL_SEGUNDOS = int(os.getenv("ENTIDADES_TTL_SEGUNDOS", 60 * 60))
+ENTIDADES_SNAPSHOT_DIR = os.getenv(
+    "ENTIDADES_SNAPSHOT_DIR", os.path.join(tempfile.gettempdir(), "ra_dash_combustivel_entidades")
+)
+
+# Dimensões disponíveis e a função que as carrega do banco
+DIMENSOES = {
+    "linhas": get_linhas_possui_info_combustivel,
+    "veiculos": get_veiculos_com_combustivel,
+    "modelos": get_modelos_com_combustivel,
+    "veiculos_modelos": get_veiculos_modelos_com_combustivel,
+    "tipos_eventos_com_data": get_tipos_eventos_telemetria_mix_com_data,
+    "tipos_eventos_com_gps": get_tipos_eventos_telemetria_mix_com_gps,
+}
+
+
+class EntidadesService:
+    """
+    Singleton que fornece as dimensões (entidades) do sistema
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls, *args, **kwargs):
+        """
+        Cria ou retorna uma instância do singleton
+        """
+        with cls._lock:  # Garante thead safety
+            if cls._instance is None:
+                cls._instance = super(EntidadesService, cls).__new__(cls)
+                cls._instance._initialize(*args, **kwargs)
+        return cls._instance
+
+    def _initialize(self, dbEngine):
+        """
+        Inicializa o serviço (nenhuma dimensão é carregada aqui)
+        """
+        if hasattr(self, "_initialized") and self._initialized:
+            return
+
+        self.dbEngine = dbEngine
+        self._dimensoes = {}  # nome -> (carregado_em, DataFrame)
+        self._atualizando = set()
+        self._lock_dimensoes = threading.Lock()
+        self._locks_carga = {nome: threading.Lock() for nome in DIMENSOES}
+        self._initialized = True
+
+    @classmethod
+    def get_instance(cls, dbEngine):
+        """
+        Retorna a singleton
+        """
+        return cls(dbEngine)
+
+    def __caminho_snapshot(self, nome):
+        return os.path.join(ENTIDADES_SNAPSHOT_DIR, f"{nome}.parquet")
+
+    def __le_snapshot(self, nome):
+        caminho = self.__caminho_snapshot(nome)
+        try:
+            if os.path.exists(caminho):
+                return os.path.getmtime(caminho), pd.read_parquet(caminho)
+        except Exception as e:
+            print(f"Erro ao ler o snapshot da dimensão {nome}: {e}")
+
+        return None
+
+    def __salva_snapshot(self, nome, df):
+        caminho = self.__caminho_snapshot(nome)
+        try:
+            os.makedirs(ENTIDADES_SNAPSHOT_DIR, exist_ok=True)
+
+            # Escreve em um arquivo temporário e renomeia (evita arquivo corrompido com vários workers)
+            caminho_tmp = f"{caminho}.{os.getpid()}.tmp"
+            df.to_parquet(caminho_tmp, index=False)
+            os.replace(caminho_tmp, caminho)
+        except Exception as e:
+            print(f"Erro ao salvar o snapshot da dimensão {nome}: {e}")
+
+    def __carrega(self, nome):
+        """Carrega a dimensão do banco, atualiza a memória e o snapshot"""
+        df = DIMENSOES[nome](self.dbEngine)
+
+        with self._lock_dimensoes:
+            self._dimensoes[nome] = (time.time(), df)
+
+        self.__salva_snapshot(nome, df)
+        return df
+
+    def __atualiza_em_segundo_plano(self, nome):
+        with self._lock_dimensoes:
+            if nome in self._atualizando:
+                return
+            self._atualizando.add(nome)
+
+        def atualiza():
+            try:
+                self.__carrega(nome)
+            except Exception as e:
+                print(f"Erro ao atualizar a dimensão {nome}: {e}")
+            finally:
+                with self._lock_dimensoes:
+                    self._atualizando.discard(nome)
+
+        threading.Thread(target=atualiza, name=f"entidades-{nome}", daemon=True).start()
+
+    def get_dimensao(self, nome):
+        """
+        Retorna a dimensão (DataFrame).
+        Somente o primeiro acesso sem snapshot espera a consulta ao banco; depois disso, valores antigos são
+        retornados imediatamente e atualizados em segundo plano.
+        """
+        with self._lock_dimensoes:
+            entrada = self._dimensoes.get(nome)
+
+        if entrada is None:
+            # Evita que várias requisições simultâneas carreguem a mesma dimensão
+            with self._locks_carga[nome]:
+                with self._lock_dimensoes:
+                    entrada = self._dimensoes.get(nome)
+
+                if entrada is None:
+                    entrada = self.__le_snapshot(nome)
+                    if entrada is not None:
+                        with self._lock_dimensoes:
+                            self._dimensoes[nome] = entrada
+                    else:
+                        return self.__carrega(nome).copy()
+
+        carregado_em, df = entrada
+        if time.time() - carregado_em > ENTIDADES_TTL_SEGUNDOS:
+            self.__atualiza_em_segundo_plano(nome)
+
+        return df.copy()
+
+    def get_linhas(self):
+        return self.get_dimensao("linhas")
+
+    def get_veiculos(self):
+        return self.get_dimensao("veiculos")
+
+    def get_modelos(self):
+        return self.get_dimensao("modelos")
+
+    def get_veiculos_modelos(self):
+        return self.get_dimensao("veiculos_modelos")
+
+    def get_tipos_eventos_com_data(self):
+        return self.get_dimensao("tipos_eventos_com_data")
+
+    def get_tipos_eventos_com_gps(self):
+        return self.get_dimensao("tipos_eventos_com_gps")
@@ -2,7 +2,6 @@
 # coding: utf-8
 
 import pandas as pd
-import io
 
 
 # Funções utilitárias para obtenção das principais entidades do sistema
@@ -40,20 +39,40 @@ def get_veiculos_com_combustivel(dbEngine):
     )
 
 
-def get_modelos_veiculos_com_combustivel(dbEngine):
-    # Modelos de veículos que possuem informações de consumo
+def get_modelos_com_combustivel(dbEngine):
+    # Modelos de veículos que possuem informações de consumo (um por modelo)
+    return pd.read_sql(
+        """
+        SELECT 
+            DISTINCT "vec_model" AS "LABEL"
+        FROM 
+            rmtc_viagens_analise_mix rva 
+        WHERE 
+            "vec_model" IS NOT NULL
+        ORDER BY
+            "vec_model"
+        """,
+        dbEngine,
+    )
+
+
+def get_veiculos_modelos_com_combustivel(dbEngine):
+    # Modelo e asset de cada veículo que possui informações de consumo (conforme a viagem mais recente)
     return pd.read_sql(
         """
         SELECT 
-            DISTINCT "vec_model" AS "LABEL",
+            DISTINCT ON ("vec_num_id")
+            "vec_model" AS "LABEL",
             "vec_num_id",
             "vec_asset_id"
         FROM 
             rmtc_viagens_analise_mix rva 
         WHERE 
             "vec_model" IS NOT NULL
+            AND "vec_num_id" IS NOT NULL
         ORDER BY
-            "vec_model"
+            "vec_num_id",
+            "dia" DESC
         """,
         dbEngine,
     )
@@ -153,14 +172,6 @@ def get_modelos(dbEngine):
     )
 
 
-def gerar_excel(df):
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
-        df.to_excel(writer, index=False, sheet_name="Dados")
-    output.seek(0)
-    return output.getvalue()
-
-
 def get_regras(dbEngine):
     # Lista de regras
     return pd.read_sql(
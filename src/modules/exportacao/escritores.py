@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Escritores em streaming para as exportações (CSV, Parquet e XLSX)
+#
+# Cada escritor recebe um iterador de DataFrames (lotes) e retorna um gerador de bytes, enviado aos poucos na resposta
+# HTTP. Assim, somente um lote fica em memória por vez:
+#   - CSV: cada lote é convertido e enviado (o primeiro com o cabeçalho e o BOM do UTF-8, para o Excel reconhecer os
+#     acentos);
+#   - Parquet: cada lote é um row group, enviado assim que é escrito (o rodapé vai no final);
+#   - XLSX: o xlsxwriter no modo constant_memory grava cada linha em disco; como o XLSX é um zip, o arquivo só fica
+#     pronto no final e então é enviado em blocos a partir do arquivo temporário.
+
+# Imports básicos
+import tempfile
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import xlsxwriter
+
+# Tamanho dos blocos enviados a partir de arquivos temporários
+TAMANHO_BLOCO_BYTES = 1024 * 1024
+
+
+class SaidaEmBlocos:
+    """Arquivo (somente escrita) que acumula os bytes escritos até serem retirados pelo gerador"""
+
+    def __init__(self):
+        self.blocos = []
+        self.posicao = 0
+        self.closed = False
+
+    def write(self, dados):
+        self.blocos.append(bytes(dados))
+        self.posicao += len(dados)
+        return len(dados)
+
+    def tell(self):
+        return self.posicao
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def retira(self):
+        dados = b"".join(self.blocos)
+        self.blocos = []
+        return dados
+
+
+def escreve_csv(lotes):
+    primeiro = True
+    for df in lotes:
+        yield df.to_csv(index=False, header=primeiro).encode("utf-8-sig" if primeiro else "utf-8")
+        primeiro = False
+
+
+def escreve_parquet(lotes):
+    saida = SaidaEmBlocos()
+    writer = None
+    for df in lotes:
+        if writer is None:
+            tabela = pa.Table.from_pandas(df, preserve_index=False)
+            writer = pq.ParquetWriter(saida, tabela.schema)
+        else:
+            # Os lotes seguintes usam o esquema do primeiro (ex: colunas somente com nulos)
+            tabela = pa.Table.from_pandas(df, schema=writer.schema, preserve_index=False)
+
+        writer.write_table(tabela)
+        yield saida.retira()
+
+    if writer is not None:
+        writer.close()
+        yield saida.retira()
+
+
+def escreve_xlsx(lotes):
+    with tempfile.TemporaryFile() as arquivo:
+        workbook = xlsxwriter.Workbook(
+            arquivo,
+            {
+                "constant_memory": True,
+                "remove_timezone": True,
+                "default_date_format": "dd/mm/yyyy hh:mm:ss",
+            },
+        )
+        worksheet = workbook.add_worksheet("Dados")
+
+        num_linha = 0
+        for df in lotes:
+            if num_linha == 0:
+                worksheet.write_row(0, 0, [str(coluna) for coluna in df.columns])
+                num_linha = 1
+
+            # Valores Python (nulos como None, que o xlsxwriter deixa em branco)
+            df = df.astype(object).where(df.notna(), None)
+            for valores in df.itertuples(index=False, name=None):
+                worksheet.write_row(num_linha, 0, valores)
+                num_linha += 1
+
+        workbook.close()
+
+        arquivo.seek(0)
+        while True:
+            bloco = arquivo.read(TAMANHO_BLOCO_BYTES)
+            if not bloco:
+                break
+            yield bloco
+
+
+# Formato -> (escritor, mimetype)
+FORMATOS_EXPORTACAO = {
+    "csv": (escreve_csv, "text/csv"),
+    "parquet": (escreve_parquet, "application/vnd.apache.parquet"),
+    "xlsx": (escreve_xlsx, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
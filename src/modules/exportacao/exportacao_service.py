@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Exportação das tabelas das páginas por uma rota do Flask (servidor do Dash)
+#
+# Antes, o callback gerava o XLSX inteiro em memória e o devolvia via dcc.send_bytes (em base64, dentro da resposta
+# JSON do callback), mantendo o DataFrame, o XLSX e o base64 em memória ao mesmo tempo. Agora:
+#   - cada página registra as suas exportações (registra_exportacao): uma função que recebe os filtros e retorna um
+#     iterador de DataFrames (ex: lidos do banco em lotes);
+#   - os botões são links para EXPORTACAO_ROTA/<token>, onde o token (assinado com SECRET_KEY e com validade) contém a
+#     exportação, o formato e os filtros. O link é atualizado sem consultar o banco;
+#   - a rota valida o token e envia o arquivo em streaming (ver escritores.py), com memória limitada.
+
+# Imports básicos
+import os
+import secrets
+from datetime import date
+
+# Imports do Flask
+from flask import Response, abort
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+# Imports auxiliares
+from modules.exportacao.escritores import FORMATOS_EXPORTACAO
+
+# Configurações
+EXPORTACAO_TOKEN_TTL_SEGUNDOS = int(os.getenv("EXPORTACAO_TOKEN_TTL_SEGUNDOS", 8 * 60 * 60))
+EXPORTACAO_TAMANHO_LOTE = int(os.getenv("EXPORTACAO_TAMANHO_LOTE", 10000))
+
+# Rota das exportações
+EXPORTACAO_ROTA = "/exportar"
+
+# Sem SECRET_KEY, a chave é gerada por processo (os links só funcionam no worker que os gerou)
+EXPORTACAO_CHAVE = os.getenv("SECRET_KEY")
+if not EXPORTACAO_CHAVE:
+    print("SECRET_KEY não definida: os links de exportação usarão uma chave gerada para este processo")
+    EXPORTACAO_CHAVE = secrets.token_hex(32)
+
+# Assinatura dos tokens
+serializador = URLSafeTimedSerializer(EXPORTACAO_CHAVE, salt="exportacao")
+
+# Exportações registradas: nome -> (função que gera os lotes, prefixo do nome do arquivo)
+EXPORTACOES = {}
+
+
+def registra_exportacao(nome, funcao_lotes, prefixo_arquivo):
+    """Registra uma exportação (funcao_lotes recebe os filtros como argumentos nomeados e retorna os DataFrames)"""
+    EXPORTACOES[nome] = (funcao_lotes, prefixo_arquivo)
+
+
+def url_exportacao(nome, formato, **filtros):
+    """Retorna o link (assinado) para a exportação com os filtros (valores serializáveis em JSON)"""
+    token = serializador.dumps({"nome": nome, "formato": formato, "filtros": filtros})
+    return f"{EXPORTACAO_ROTA}/{token}"
+
+
+def exporta(token):
+    try:
+        dados = serializador.loads(token, max_age=EXPORTACAO_TOKEN_TTL_SEGUNDOS)
+    except SignatureExpired:
+        abort(410, "Link de exportação expirado, atualize a página")
+    except BadSignature:
+        abort(403)
+
+    if dados["nome"] not in EXPORTACOES or dados["formato"] not in FORMATOS_EXPORTACAO:
+        abort(404)
+
+    funcao_lotes, prefixo_arquivo = EXPORTACOES[dados["nome"]]
+    escritor, mimetype = FORMATOS_EXPORTACAO[dados["formato"]]
+
+    # Dia de hoje formatado
+    dia_hoje_str = date.today().strftime("%d-%m-%Y")
+    nome_arquivo = f"{prefixo_arquivo}_{dia_hoje_str}.{dados['formato']}"
+
+    return Response(
+        escritor(funcao_lotes(**dados["filtros"])),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f'attachment; filename="{nome_arquivo}"'},
+    )
+
+
+def registra_rota_exportacao(server):
+    """Registra a rota das exportações no servidor Flask"""
+    server.add_url_rule(f"{EXPORTACAO_ROTA}/<token>", "exportacao", exporta)
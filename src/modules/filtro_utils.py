@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Especificação canônica dos filtros usados nas consultas de combustível
+#
+# Os callbacks recebem os filtros em formatos variados (datas como string ou datetime, listas com "TODAS"/"TODOS",
+# km/L como int ou float). Aqui normalizamos esses valores em um objeto imutável e hashable, que:
+#   - gera sempre o mesmo texto SQL (com parâmetros) para filtros equivalentes, permitindo reuso de plano no Postgres;
+#   - fornece uma chave estável para as camadas de cache.
+
+# Imports básicos
+import os
+import pandas as pd
+
+# Imports auxiliares
+from modules.sql_utils import filtro_lista_param, subquery_lista_dia_marcado
+
+# Constante indica o número mínimo de viagens que devem existir para poder classificar o consumo de uma viagem
+NUM_MIN_VIAGENS_PARA_CLASSIFICAR = int(os.getenv("NUM_MIN_VIAGENS_PARA_CLASSIFICAR", 5))
+
+# Tempo (ms) sem digitação para os campos numéricos dos filtros (ex: km/L) atualizarem o estado dos filtros
+FILTROS_DEBOUNCE_MS = int(os.getenv("FILTROS_DEBOUNCE_MS", 800))
+
+
+def normaliza_data(data):
+    """Converte uma data (string, date ou datetime) para o formato YYYY-MM-DD"""
+    if data is None:
+        return None
+
+    return pd.to_datetime(data).strftime("%Y-%m-%d")
+
+
+def normaliza_lista(lista, termo_all="TODAS"):
+    """
+    Normaliza uma lista de seleção múltipla.
+    Retorna None quando a lista representa "todos" os itens, caso contrário uma tupla ordenada e sem repetições.
+    """
+    if lista is None:
+        return None
+
+    # Valor único (ex: dropdown sem multi)
+    if isinstance(lista, str):
+        lista = [lista]
+
+    if not lista or termo_all in lista:
+        return None
+
+    return tuple(sorted({str(x) for x in lista}))
+
+
+def corrige_selecao(lista, termo_all="TODAS"):
+    """
+    Corrige o valor de um dropdown de seleção múltipla com o termo para todos (espelhado em assets/filtros.js).
+    Sem seleção ou com o termo selecionado por último, retorna somente o termo; com o termo e outros itens, remove o termo.
+    """
+    # Caso 1: Nenhuma opcao é selecionada, reseta para "TODAS"
+    if not lista:
+        return [termo_all]
+
+    # Caso 2: Se "TODAS" foi selecionado após outras opções, reseta para "TODAS"
+    if len(lista) > 1 and termo_all in lista[1:]:
+        return [termo_all]
+
+    # Caso 3: Se alguma opção foi selecionada após "TODAS", remove "TODAS"
+    if termo_all in lista and len(lista) > 1:
+        return [value for value in lista if value != termo_all]
+
+    # Por fim, se não caiu em nenhum caso, retorna o valor original
+    return lista
+
+
+def valores_filtros(estado, campos):
+    """Retorna os valores dos campos do estado dos filtros de uma página (dcc.Store), na ordem pedida"""
+    estado = estado or {}
+    return [estado.get(campo) for campo in campos]
+
+
+def normaliza_km_l(valor):
+    """Normaliza o limite de km/L para float (ou None)"""
+    if valor is None:
+        return None
+
+    return float(valor)
+
+
+class FiltroCombustivel:
+    """
+    Filtro canônico (imutável e hashable) das consultas de combustível.
+    Filtros equivalentes (ex: ["TODAS", "001"] e ["TODAS"]) possuem a mesma chave.
+    """
+
+    __slots__ = (
+        "data_inicio",
+        "data_fim",
+        "modelos",
+        "linhas",
+        "sentidos",
+        "dias_marcados",
+        "vec_num_id",
+        "km_l_min",
+        "km_l_max",
+    )
+
+    def __init__(
+        self,
+        datas,
+        lista_modelos=None,
+        lista_linhas=None,
+        km_l_min=None,
+        km_l_max=None,
+        vec_num_id=None,
+        lista_sentido=None,
+        lista_dia_semana=None,
+    ):
+        data_inicio, data_fim = datas[0], datas[1]
+        object.__setattr__(self, "data_inicio", normaliza_data(data_inicio))
+        object.__setattr__(self, "data_fim", normaliza_data(data_fim))
+        object.__setattr__(self, "modelos", normaliza_lista(lista_modelos, termo_all="TODOS"))
+        object.__setattr__(self, "linhas", normaliza_lista(lista_linhas, termo_all="TODAS"))
+        object.__setattr__(self, "sentidos", normaliza_lista(lista_sentido, termo_all="TODOS"))
+        object.__setattr__(self, "dias_marcados", self.__normaliza_dias_marcados(lista_dia_semana))
+        object.__setattr__(self, "vec_num_id", None if vec_num_id is None else str(vec_num_id))
+        object.__setattr__(self, "km_l_min", normaliza_km_l(km_l_min))
+        object.__setattr__(self, "km_l_max", normaliza_km_l(km_l_max))
+
+    @staticmethod
+    def __normaliza_dias_marcados(lista_dia_semana):
+        # O checklist pode retornar listas aninhadas (ex: [["SEG_SEX"], "SABADO"])
+        if not lista_dia_semana:
+            return None
+
+        dias = set()
+        for dia in lista_dia_semana:
+            if isinstance(dia, (list, tuple)):
+                dias.update(dia)
+            else:
+                dias.add(dia)
+
+        return tuple(sorted(dias))
+
+    def __setattr__(self, nome, valor):
+        raise AttributeError("FiltroCombustivel é imutável")
+
+    def chave(self):
+        """Tupla que identifica unicamente o filtro (usada como chave de cache)"""
+        return tuple(getattr(self, campo) for campo in self.__slots__)
+
+    def __eq__(self, outro):
+        return isinstance(outro, FiltroCombustivel) and self.chave() == outro.chave()
+
+    def __hash__(self):
+        return hash(self.chave())
+
+    def __repr__(self):
+        campos = ", ".join(f"{campo}={getattr(self, campo)!r}" for campo in self.__slots__)
+        return f"FiltroCombustivel({campos})"
+
+    def sql(self, prefix="", usa_num_min_viagens=True, usa_datas_cast=True):
+        """
+        Retorna as cláusulas (começando com AND) e os parâmetros correspondentes a este filtro.
+        As listas são passadas como parâmetros de array (= ANY(:param)), mantendo o texto SQL estável.
+        """
+        clausulas = []
+        params = {}
+
+        if self.data_inicio is not None and self.data_fim is not None:
+            if usa_datas_cast:
+                clausulas.append(
+                    f'AND CAST({prefix}"dia" AS date) BETWEEN CAST(:data_inicio AS date) AND CAST(:data_fim AS date)'
+                )
+            else:
+                clausulas.append(f'AND {prefix}"dia" >= :data_inicio AND {prefix}"dia" <= :data_fim')
+            params["data_inicio"] = self.data_inicio
+            params["data_fim"] = self.data_fim
+
+        if usa_num_min_viagens:
+            clausulas.append(f"AND {prefix}analise_num_amostras_90_dias >= :num_min_viagens")
+            params["num_min_viagens"] = NUM_MIN_VIAGENS_PARA_CLASSIFICAR
+
+        if self.km_l_min is not None:
+            clausulas.append(f"AND {prefix}km_por_litro >= :km_l_min")
+            params["km_l_min"] = self.km_l_min
+
+        if self.km_l_max is not None:
+            clausulas.append(f"AND {prefix}km_por_litro <= :km_l_max")
+            params["km_l_max"] = self.km_l_max
+
+        if self.vec_num_id is not None:
+            clausulas.append(f"AND {prefix}vec_num_id = :vec_num_id")
+            params["vec_num_id"] = self.vec_num_id
+
+        for coluna, valores, nome_param in [
+            ("vec_model", self.modelos, "modelos"),
+            ("encontrou_numero_linha", self.linhas, "linhas"),
+            ("encontrou_sentido_linha", self.sentidos, "sentidos"),
+        ]:
+            clausula, params_clausula = filtro_lista_param(coluna, valores, nome_param, prefix=prefix)
+            if clausula:
+                clausulas.append(clausula)
+                params.update(params_clausula)
+
+        if self.dias_marcados:
+            clausulas.append(subquery_lista_dia_marcado(self.dias_marcados))
+
+        return "\n            ".join(clausulas), params
@@ -8,111 +8,48 @@ import os
 import pandas as pd
 
 # Imports auxiliares
-from modules.sql_utils import subquery_modelos_combustivel, subquery_linha_combustivel, subquery_sentido_combustivel
+from modules.sql_utils import le_sql
+from modules.filtro_utils import FiltroCombustivel
+from modules.rollup.rollup_service import RollupService
+from modules.viagens_memoria_service import ViagensMemoriaService
+from modules.duckdb_service import get_engine_analitico, usa_duckdb
+from modules.cache_utils import cache_resultado
 
-# Constante indica o número mínimo de viagens que devem existir para poder classificar o consumo de uma viagem
-# Por exemplo, NUM_MIN_VIAGENS_PARA_CLASSIFICAR = 5 indica que somente as viagens cuja configuração possuam outras 5
-# viagens iguais (mesma linha, sentido, dia, etc) será incluída na análise
-NUM_MIN_VIAGENS_PARA_CLASSIFICAR = os.getenv("NUM_MIN_VIAGENS_PARA_CLASSIFICAR", 5)
+# Tempo (em segundos) que o resumo da visão geral fica no cache
+HOME_RESUMO_TTL_SEGUNDOS = int(os.getenv("HOME_RESUMO_TTL_SEGUNDOS", 300))
 
-class HomeService:
-    def __init__(self, dbEngine):
-        self.dbEngine = dbEngine
+# Status considerados como baixa performance
+STATUS_BAIXA_PERFORMANCE = ("BAIXA PERFOMANCE (<= 2 STD)", "BAIXA PERFORMANCE (<= 1.5 STD)")
 
-    def get_sinteze_status_viagens(self, datas, lista_modelos, lista_linhas, km_l_min, km_l_max):
-        """Função para obter a classificação das viagens analisadas"""
 
-        # Extraí a data inicial e final
-        data_inicio_str = datas[0]
-        data_fim_str = datas[1]
+class ResumoVisaoGeral:
+    """Resultado único (uma varredura) com todos os agregados da visão geral"""
 
-        # Subqueries
-        subquery_modelos_str = subquery_modelos_combustivel(lista_modelos, termo_all="TODOS")
-        subquery_linha_combustivel_str = subquery_linha_combustivel(lista_linhas, termo_all="TODAS")
+    def __init__(self, df_agg):
+        # Separa cada conjunto de agrupamento (GROUPING SETS) pelo nível
+        self.df_status = self.__prepara_status(df_agg[df_agg["nivel"] == "status"])
+        self.df_modelos = self.__prepara_modelos(df_agg[df_agg["nivel"] == "modelo"])
+        self.df_veiculos = self.__prepara_veiculos(df_agg[df_agg["nivel"] == "veiculo"])
+        self.df_linhas = self.__prepara_linhas(df_agg[df_agg["nivel"] == "linha"])
 
-        query = f"""
-        SELECT  
-            analise_status_90_dias,
-            COUNT(*) as total_viagens
-        FROM
-            rmtc_viagens_analise_mix
-        WHERE
-	        encontrou_linha = true
-	        AND CAST("dia" AS date) BETWEEN DATE '{data_inicio_str}' AND DATE '{data_fim_str}'
-	        AND analise_num_amostras_90_dias >= {NUM_MIN_VIAGENS_PARA_CLASSIFICAR}
- 	        AND km_por_litro >= {km_l_min}
-	        AND km_por_litro <= {km_l_max}
-            {subquery_modelos_str}
-            {subquery_linha_combustivel_str}
-        GROUP BY
-            analise_status_90_dias 
-        """
-        # Executa a query
-        df = pd.read_sql(query, self.dbEngine)
+        df_total = df_agg[df_agg["nivel"] == "total"]
+        self.media_km_por_l = None
+        self.litros_excedentes_baixa_perfomance = None
+        if not df_total.empty:
+            self.media_km_por_l = df_total.iloc[0]["media_km_por_litro"]
+            self.litros_excedentes_baixa_perfomance = df_total.iloc[0]["litros_excedentes_baixa_perfomance"]
 
-        return df
-    
-    def get_sinteze_consumo_modelos(self, datas, lista_modelos, lista_linhas, km_l_min, km_l_max):
-        """Função para obter a classificação do consumo dos modelos"""
+    @staticmethod
+    def __percentual(parte, total):
+        return 100 * parte.astype(float) / total.astype(float)
 
-        # Extraí a data inicial e final
-        data_inicio_str = datas[0]
-        data_fim_str = datas[1]
-
-        # Subqueries
-        subquery_modelos_str = subquery_modelos_combustivel(lista_modelos, termo_all="TODOS")
-        subquery_linha_combustivel_str = subquery_linha_combustivel(lista_linhas, termo_all="TODAS")
-
-        query = f"""
-        WITH rmtc_viagens_analise_mix_padronizado AS (
-            SELECT 
-                CASE
-                    WHEN vec_model ILIKE 'MB OF 1721%%' THEN 'MB OF 1721 MPOLO TORINO U'
-                    WHEN vec_model ILIKE 'IVECO/MASCA%%' THEN 'IVECO/MASCA GRAN VIA'
-                    WHEN vec_model ILIKE 'VW 17230 APACHE VIP%%' THEN 'VW 17230 APACHE VIP-SC'
-                    WHEN vec_model ILIKE 'O500%%' THEN 'O500'
-                    WHEN vec_model ILIKE 'ELETRA INDUSCAR MILLENNIUM%%' THEN 'ELETRA INDUSCAR MILLENNIUM'
-                    WHEN vec_model ILIKE 'Induscar%%' THEN 'INDUSCAR'
-                    WHEN vec_model ILIKE 'VW 22.260 CAIO INDUSCAR%%' THEN 'VW 22.260 CAIO INDUSCAR'
-                    ELSE vec_model
-                END AS vec_model_padronizado,
-                r.*
-            FROM rmtc_viagens_analise_mix r
-        )
-        SELECT
-            vec_model,
-            COUNT(*) AS total_viagens,
-            AVG(km_por_litro) AS media_km_litro,
-            SUM(total_comb_l) AS total_consumo_litros,
-            SUM(
-                ABS(
-                    total_comb_l - (tamanho_linha_km_sobreposicao / analise_valor_mediana_90_dias)
-                )
-            ) AS total_litros_excedentes,
-            100 * (
-                SUM(
-                    ABS(
-                        total_comb_l - (tamanho_linha_km_sobreposicao / analise_valor_mediana_90_dias)
-                    )
-                )::NUMERIC 
-                / SUM(total_comb_l)::NUMERIC
-            ) AS perc_excedente
-        FROM 
-            rmtc_viagens_analise_mix_padronizado
-        WHERE 
-            encontrou_linha = true
-	        AND CAST("dia" AS date) BETWEEN DATE '{data_inicio_str}' AND DATE '{data_fim_str}'
-	        AND analise_num_amostras_90_dias >= {NUM_MIN_VIAGENS_PARA_CLASSIFICAR}
- 	        AND km_por_litro >= {km_l_min}
-	        AND km_por_litro <= {km_l_max}
-            {subquery_modelos_str}
-            {subquery_linha_combustivel_str}
-        GROUP BY 
-            vec_model
-        """
-        # Executa a query
-        df = pd.read_sql(query, self.dbEngine)
+    def __prepara_status(self, df):
+        return df[["analise_status_90_dias", "total_viagens"]].reset_index(drop=True)
 
+    def __prepara_modelos(self, df):
+        df = df[["vec_model", "total_viagens", "media_km_por_litro", "total_consumo_litros", "litros_excedentes"]].copy()
+        df = df.rename(columns={"media_km_por_litro": "media_km_litro", "litros_excedentes": "total_litros_excedentes"})
+        df["perc_excedente"] = self.__percentual(df["total_litros_excedentes"], df["total_consumo_litros"])
 
         # Arrendonda as colunas necessárias
         df["media_km_litro"] = df["media_km_litro"].round(2)
@@ -120,121 +57,154 @@ class HomeService:
         df["total_litros_excedentes"] = df["total_litros_excedentes"].round(2)
         df["perc_excedente"] = df["perc_excedente"].round(2)
 
-        return df
+        return df.reset_index(drop=True)
+
+    def __prepara_veiculos(self, df):
+        df = df[
+            [
+                "vec_num_id",
+                "vec_model",
+                "total_viagens",
+                "media_km_por_litro",
+                "total_abaixo_mediana",
+                "total_baixa_perfomance",
+                "total_consumo_litros",
+                "litros_excedentes",
+                "total_erro_telemetria",
+            ]
+        ].copy()
+        df["perc_total_abaixo_mediana"] = self.__percentual(df["total_abaixo_mediana"], df["total_viagens"])
+        df["perc_baixa_perfomance"] = self.__percentual(df["total_baixa_perfomance"], df["total_viagens"])
+        df["perc_erro_telemetria"] = self.__percentual(df["total_erro_telemetria"], df["total_viagens"])
 
-    def get_indicador_consumo_medio_km_l(self, datas, lista_modelos, lista_linhas, km_l_min, km_l_max):
-        """Função para obter o indicador de consumo médio de km/L"""
-        # Extraí a data inicial e final
-        data_inicio_str = datas[0]
-        data_fim_str = datas[1]
+        # Arrendonda as colunas necessárias
+        df["media_km_por_litro"] = df["media_km_por_litro"].round(2)
+        df["perc_total_abaixo_mediana"] = df["perc_total_abaixo_mediana"].round(2)
+        df["perc_baixa_perfomance"] = df["perc_baixa_perfomance"].round(2)
+        df["perc_erro_telemetria"] = df["perc_erro_telemetria"].round(2)
+        df["litros_excedentes"] = df["litros_excedentes"].round(2)
+        df["total_consumo_litros"] = df["total_consumo_litros"].round(2)
 
-        # Subqueries
-        subquery_modelos_str = subquery_modelos_combustivel(lista_modelos, termo_all="TODOS")
-        subquery_linha_combustivel_str = subquery_linha_combustivel(lista_linhas, termo_all="TODAS")
+        df = df.sort_values("perc_baixa_perfomance", ascending=False)
+        return df.reset_index(drop=True)
+
+    def __prepara_linhas(self, df):
+        df = df[
+            [
+                "encontrou_numero_linha",
+                "total_viagens",
+                "media_tam_linha",
+                "media_km_por_litro",
+                "total_consumo_litros",
+                "litros_excedentes",
+            ]
+        ].copy()
+        df = df.rename(columns={"total_consumo_litros": "total_combustivel_gasto"})
 
-        query = f"""
-        SELECT  
-            AVG(km_por_litro) as media_km_por_l
-        FROM
-            rmtc_viagens_analise_mix
-        WHERE
-            encontrou_linha = true
-            AND CAST("dia" AS date) BETWEEN DATE '{data_inicio_str}' AND DATE '{data_fim_str}'
-            AND analise_num_amostras_90_dias >= {NUM_MIN_VIAGENS_PARA_CLASSIFICAR}
-            AND km_por_litro >= {km_l_min}
-            AND km_por_litro <= {km_l_max}
-            {subquery_modelos_str}
-            {subquery_linha_combustivel_str}
-        """
-        # Executa a query
-        df = pd.read_sql(query, self.dbEngine)
+        # Arrendonda as colunas necessárias
+        df["media_tam_linha"] = df["media_tam_linha"].round(3)
+        df["media_km_por_litro"] = df["media_km_por_litro"].round(2)
+        df["total_combustivel_gasto"] = df["total_combustivel_gasto"].round(2)
+        df["litros_excedentes"] = df["litros_excedentes"].round(2)
 
-        return df
+        df = df.sort_values("total_viagens", ascending=False)
+        return df.reset_index(drop=True)
 
-    def get_indicador_consumo_litros_excedente(self, datas, lista_modelos, lista_linhas, km_l_min, km_l_max):
-        """Função para obter o indicador de consumo excedente em L"""
-        # Extraí a data inicial e final
-        data_inicio_str = datas[0]
-        data_fim_str = datas[1]
+    # Os callbacks alteram os dataframes (ex: adicionam colunas), por isso retornamos cópias
+    def sinteze_status_viagens(self):
+        return self.df_status.copy()
 
-        # Subqueries
-        subquery_modelos_str = subquery_modelos_combustivel(lista_modelos, termo_all="TODOS")
-        subquery_linha_combustivel_str = subquery_linha_combustivel(lista_linhas, termo_all="TODAS")
+    def sinteze_consumo_modelos(self):
+        return self.df_modelos.copy()
 
-        query = f"""
-        SELECT  
-            SUM(ABS(total_comb_l - (tamanho_linha_km_sobreposicao / analise_valor_mediana_90_dias))) AS litros_excedentes
-        FROM
-            rmtc_viagens_analise_mix
-        WHERE
-            encontrou_linha = true
-            AND CAST("dia" AS date) BETWEEN DATE '{data_inicio_str}' AND DATE '{data_fim_str}'
-            AND analise_num_amostras_90_dias >= {NUM_MIN_VIAGENS_PARA_CLASSIFICAR}
-		    AND analise_status_90_dias = 'BAIXA PERFOMANCE (<= 2 STD)'
-            AND km_por_litro >= {km_l_min}
-            AND km_por_litro <= {km_l_max}
-            {subquery_modelos_str}
-            {subquery_linha_combustivel_str}
-        """
+    def tabela_consumo_veiculos(self):
+        return self.df_veiculos.copy()
 
-        # Executa a query
-        df = pd.read_sql(query, self.dbEngine)
+    def tabela_consumo_linhas(self):
+        return self.df_linhas.copy()
 
-        return df
 
-    def get_tabela_consumo_veiculos(self, datas, lista_modelos, lista_linhas, km_l_min, km_l_max):
-        """Função para obter os dados da tabela de consumo dos veículos"""
-        # Extraí a data inicial e final
-        data_inicio_str = datas[0]
-        data_fim_str = datas[1]
+class HomeService:
+    def __init__(self, dbEngine):
+        self.dbEngine = dbEngine
+
+        # Viagens recentes em memória e cubo diário (usados quando o filtro pode ser respondido por eles)
+        self.viagens_memoria = ViagensMemoriaService.get_instance(dbEngine)
+        self.rollup_service = RollupService(dbEngine)
+
+    def get_resumo_visao_geral(self, datas, lista_modelos, lista_linhas, km_l_min, km_l_max):
+        """Função para obter o resumo da visão geral (status, modelos, veículos, linhas e indicadores)"""
+        filtro = FiltroCombustivel(datas, lista_modelos, lista_linhas, km_l_min, km_l_max)
 
-        # Subqueries
-        subquery_modelos_str = subquery_modelos_combustivel(lista_modelos, termo_all="TODOS")
-        subquery_linha_combustivel_str = subquery_linha_combustivel(lista_linhas, termo_all="TODAS")
+        return ResumoVisaoGeral(self.get_agregados_visao_geral_por_filtro(filtro))
+
+    @cache_resultado(ttl=HOME_RESUMO_TTL_SEGUNDOS)
+    def get_agregados_visao_geral_por_filtro(self, filtro):
+        """
+        Função para obter os agregados da visão geral a partir do filtro canônico.
+        Os callbacks da página disparam juntos com o mesmo filtro; o cache garante que somente um executa a query.
+        """
+        # Tenta responder pelas viagens em memória e pelo cubo diário, caso contrário agrega as viagens no banco
+        # (com o DuckDB cobrindo o período, o cubo no Postgres não é usado: a varredura do snapshot já é rápida)
+        df_agg = self.__get_agregados_visao_geral_memoria(filtro)
+        if df_agg is None and not usa_duckdb(self.dbEngine, filtro.data_fim):
+            df_agg = self.rollup_service.get_agregados_visao_geral(filtro)
+        if df_agg is None:
+            df_agg = self.__get_agregados_visao_geral(filtro)
+
+        return df_agg
+
+    def __get_agregados_visao_geral_memoria(self, filtro):
+        """Mesmos agregados (e níveis) da consulta abaixo, calculados sobre as viagens em memória"""
+        niveis = [
+            ("status", ["analise_status_90_dias"]),
+            ("modelo", ["vec_model"]),
+            ("veiculo", ["vec_num_id", "vec_model"]),
+            ("linha", ["encontrou_numero_linha"]),
+            ("total", []),
+        ]
+
+        dfs = []
+        for nivel, chaves in niveis:
+            df_nivel = self.viagens_memoria.agrega(filtro, chaves)
+            if df_nivel is None:
+                return None
+
+            df_nivel.insert(0, "nivel", nivel)
+            dfs.append(df_nivel)
+
+        return pd.concat(dfs, ignore_index=True)
+
+    def __get_agregados_visao_geral(self, filtro):
+        """Função que calcula, em uma única varredura, os agregados por status, modelo, veículo e linha"""
+        subquery_filtro_str, params = filtro.sql()
+        params["status_baixa_perfomance"] = list(STATUS_BAIXA_PERFORMANCE)
 
         query = f"""
         SELECT
-            vec_num_id,
+            CASE
+                WHEN GROUPING(analise_status_90_dias) = 0 THEN 'status'
+                WHEN GROUPING(vec_num_id) = 0 THEN 'veiculo'
+                WHEN GROUPING(vec_model) = 0 THEN 'modelo'
+                WHEN GROUPING(encontrou_numero_linha) = 0 THEN 'linha'
+                ELSE 'total'
+            END AS nivel,
+            analise_status_90_dias,
             vec_model,
+            vec_num_id,
+            encontrou_numero_linha,
             COUNT(*) AS total_viagens,
-            AVG(km_por_litro) as media_km_por_litro,
+            AVG(km_por_litro) AS media_km_por_litro,
+            AVG(tamanho_linha_km) AS media_tam_linha,
+
             -- Total abaixo da mediana
-            SUM(
-                CASE 
-                    WHEN analise_diff_mediana_90_dias < 0 THEN 1 
-                    ELSE 0 
-                END
-            ) AS total_abaixo_mediana,
-
-            -- Percentual abaixo da mediana
-            100 * (
-                SUM(
-                    CASE 
-                        WHEN analise_diff_mediana_90_dias < 0 THEN 1 
-                        ELSE 0 
-                    END
-                )::NUMERIC / COUNT(*)::NUMERIC
-            ) AS perc_total_abaixo_mediana,
+            COUNT(*) FILTER (WHERE analise_diff_mediana_90_dias < 0) AS total_abaixo_mediana,
 
             -- Total baixa performance
-            SUM(
-                CASE 
-                    WHEN analise_status_90_dias = 'BAIXA PERFOMANCE (<= 2 STD)' THEN 1 
-                    WHEN analise_status_90_dias = 'BAIXA PERFORMANCE (<= 1.5 STD)' THEN 1 
-                    ELSE 0 
-                END
-            ) AS total_baixa_perfomance,
-            
-            -- Percentual baixa performance
-            100 * (
-                SUM(
-                    CASE 
-                        WHEN analise_status_90_dias = 'BAIXA PERFOMANCE (<= 2 STD)' THEN 1 
-                        WHEN analise_status_90_dias = 'BAIXA PERFORMANCE (<= 1.5 STD)' THEN 1 
-                        ELSE 0 
-                    END
-                )::NUMERIC / COUNT(*)::NUMERIC
-            ) AS perc_baixa_perfomance,
+            COUNT(*) FILTER (WHERE analise_status_90_dias = ANY(:status_baixa_perfomance)) AS total_baixa_perfomance,
+
+            -- Total erro de telemetria
+            COUNT(*) FILTER (WHERE analise_status_90_dias = 'ERRO TELEMETRIA (>= 2.0 STD)') AS total_erro_telemetria,
 
             -- Total de consumo
             SUM(total_comb_l) AS total_consumo_litros,
@@ -245,104 +215,28 @@ class HomeService:
                     total_comb_l - (tamanho_linha_km_sobreposicao / analise_valor_mediana_90_dias)
                 )
             ) AS litros_excedentes,
-            
-            -- Total erro de telemetria,
-            SUM(
-                CASE 
-                    WHEN analise_status_90_dias = 'ERRO TELEMETRIA (>= 2.0 STD)' THEN 1 
-                    ELSE 0 
-                END
-            ) AS total_erro_telemetria,
-
-            -- Perc Erro
-            100 * (
-                SUM(
-                    CASE 
-                        WHEN analise_status_90_dias = 'ERRO TELEMETRIA (>= 2.0 STD)' THEN 1 
-                        ELSE 0 
-                    END
-                )::NUMERIC / COUNT(*)::NUMERIC
-            ) AS perc_erro_telemetria
 
-        FROM
-            rmtc_viagens_analise_mix
-
-        WHERE
-            encontrou_linha = true
-            AND analise_num_amostras_90_dias >= {NUM_MIN_VIAGENS_PARA_CLASSIFICAR}
-            AND CAST("dia" AS date) BETWEEN DATE '{data_inicio_str}' AND DATE '{data_fim_str}'
-            AND km_por_litro >= {km_l_min}
-            AND km_por_litro <= {km_l_max}
-            {subquery_modelos_str}
-            {subquery_linha_combustivel_str}
-        GROUP BY
-            vec_num_id, 
-            vec_model
-        ORDER BY
-            perc_baixa_perfomance DESC;
-        """
-
-        # Executa a query
-        df = pd.read_sql(query, self.dbEngine)
-
-        # Arrendonda as colunas necessárias
-        df["media_km_por_litro"] = df["media_km_por_litro"].round(2)
-        df["perc_total_abaixo_mediana"] = df["perc_total_abaixo_mediana"].round(2)
-        df["perc_baixa_perfomance"] = df["perc_baixa_perfomance"].round(2)
-        df["perc_erro_telemetria"] = df["perc_erro_telemetria"].round(2)
-        df["litros_excedentes"] = df["litros_excedentes"].round(2)
-        df["total_consumo_litros"] = df["total_consumo_litros"].round(2)
-
-        return df
-    
-    def get_tabela_consumo_linhas(self, datas, lista_modelos, lista_linhas, km_l_min, km_l_max):
-        """Função para obter os dados da tabela de consumo dos veículos"""
-        # Extraí a data inicial e final
-        data_inicio_str = datas[0]
-        data_fim_str = datas[1]
-
-        # Subqueries
-        subquery_modelos_str = subquery_modelos_combustivel(lista_modelos, termo_all="TODOS")
-        subquery_linha_combustivel_str = subquery_linha_combustivel(lista_linhas, termo_all="TODAS")
-
-        query = f"""
-        SELECT
-            encontrou_numero_linha,
-            COUNT(*) AS total_viagens,
-            AVG(tamanho_linha_km) as media_tam_linha,
-            AVG(km_por_litro) as media_km_por_litro,
-			SUM(total_comb_l) as total_combustivel_gasto,
-			-- Litros excedentes
+            -- Litros excedentes somente das viagens com baixa performance (indicador)
             SUM(
                 ABS(
                     total_comb_l - (tamanho_linha_km_sobreposicao / analise_valor_mediana_90_dias)
                 )
-            ) AS litros_excedentes
+            ) FILTER (WHERE analise_status_90_dias = 'BAIXA PERFOMANCE (<= 2 STD)') AS litros_excedentes_baixa_perfomance
         FROM
             rmtc_viagens_analise_mix
         WHERE
             encontrou_linha = true
-            AND analise_num_amostras_90_dias >= {NUM_MIN_VIAGENS_PARA_CLASSIFICAR}
-            AND CAST("dia" AS date) BETWEEN DATE '{data_inicio_str}' AND DATE '{data_fim_str}'
-            AND km_por_litro >= {km_l_min}
-            AND km_por_litro <= {km_l_max}
-            {subquery_modelos_str}
-            {subquery_linha_combustivel_str}
-        GROUP BY
-            encontrou_numero_linha
-        ORDER BY
-            total_viagens DESC;
+            {subquery_filtro_str}
+        GROUP BY GROUPING SETS (
+            (analise_status_90_dias),
+            (vec_model),
+            (vec_num_id, vec_model),
+            (encontrou_numero_linha),
+            ()
+        )
         """
 
-        # Executa a query
-        df = pd.read_sql(query, self.dbEngine)
-
-        # Arrendonda as colunas necessárias
-        df["media_tam_linha"] = df["media_tam_linha"].round(3)
-        df["media_km_por_litro"] = df["media_km_por_litro"].round(2)
-        df["total_combustivel_gasto"] = df["total_combustivel_gasto"].round(2)
-        df["litros_excedentes"] = df["litros_excedentes"].round(2)
+        # Executa a query (Postgres ou DuckDB, ver duckdb_service.py)
+        df = le_sql(query, get_engine_analitico(self.dbEngine, filtro.data_fim), params)
 
         return df
-    
-   
\ No newline at end of file
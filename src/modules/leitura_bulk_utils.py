@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Leitura em massa (COPY) para consultas que retornam muitas linhas
+#
+# O pd.read_sql materializa cada linha como objetos Python (tupla + um objeto por valor) antes de montar o DataFrame.
+# Para resultados grandes (ex: todas as viagens de uma linha no mês), a consulta é executada com
+# COPY (query) TO STDOUT (CSV), gravada em um arquivo temporário e lida pelo leitor CSV do pyarrow (colunar, em C++),
+# com os tipos de cada coluna definidos a partir dos tipos do Postgres. É bem mais rápido e o pico de memória é menor.
+#
+# Quem chama decide se usa o COPY (ex: periodo_usa_copy, a partir do período pedido), sem consulta extra ao banco.
+# Os tipos do COPY seguem os do le_sql (int64, float64, datetime64[ns], objetos date); se o resultado tiver uma coluna
+# de tipo sem mapeamento (ex: time, interval, json, uuid), a consulta é executada com o le_sql, para que os tipos do
+# DataFrame não dependam do caminho de leitura.
+
+# Imports básicos
+import os
+import tempfile
+
+import pandas as pd
+import psycopg2
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+# Imports BD
+from sqlalchemy.sql import text
+
+# Imports auxiliares
+from modules.sql_utils import le_sql
+
+# Configurações
+LEITURA_BULK_HABILITADO = os.getenv("LEITURA_BULK_HABILITADO", "True").lower() in ("true", "1")
+LEITURA_BULK_MIN_DIAS = int(os.getenv("LEITURA_BULK_MIN_DIAS", 15))
+
+# Tipos do Postgres (OID) -> tipos do Arrow, com os mesmos tipos do le_sql no DataFrame (inteiros e reais em 64 bits)
+TIPOS_POSTGRES_ARROW = {
+    16: pa.bool_(),  # boolean
+    20: pa.int64(),  # bigint
+    21: pa.int64(),  # smallint
+    23: pa.int64(),  # integer
+    700: pa.float64(),  # real
+    701: pa.float64(),  # double precision
+    1700: pa.float64(),  # numeric (o read_sql converte os Decimal em float)
+    1082: pa.date32(),  # date
+    1114: pa.timestamp("us"),  # timestamp
+    1184: pa.timestamp("us", tz="UTC"),  # timestamptz (a sessão do COPY usa UTC)
+    18: pa.string(),  # char
+    19: pa.string(),  # name
+    25: pa.string(),  # text
+    1042: pa.string(),  # character
+    1043: pa.string(),  # character varying
+}
+
+
+class TipoSemMapeamentoCopy(ValueError):
+    """Coluna do resultado com tipo do Postgres sem mapeamento para o Arrow"""
+
+
+def periodo_usa_copy(data_inicio, data_fim):
+    """Indica se o período pedido é longo o bastante (LEITURA_BULK_MIN_DIAS) para a leitura via COPY"""
+    if data_inicio is None or data_fim is None:
+        return False
+
+    dias = (pd.to_datetime(data_fim) - pd.to_datetime(data_inicio)).days + 1
+    return dias >= LEITURA_BULK_MIN_DIAS
+
+
+def le_sql_copy(query, dbEngine, params):
+    """Executa a consulta com COPY ... TO STDOUT (CSV) e retorna um DataFrame"""
+    # Texto SQL com os parâmetros no formato do psycopg2 (%(nome)s), que os converte em literais (inclusive arrays)
+    sql = str(text(query).compile(dialect=dbEngine.dialect))
+    sql = sql.strip().rstrip(";")
+
+    conn = dbEngine.raw_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SET LOCAL TIME ZONE 'UTC'")
+            sql = cursor.mogrify(sql, params).decode()
+
+            # Colunas e tipos do resultado (sem ler nenhuma linha)
+            cursor.execute(f"SELECT * FROM ({sql}) AS q LIMIT 0")
+            nomes_colunas = [coluna.name for coluna in cursor.description]
+            tipos_colunas = [coluna.type_code for coluna in cursor.description]
+
+            sem_mapeamento = {
+                nome: tipo for nome, tipo in zip(nomes_colunas, tipos_colunas) if tipo not in TIPOS_POSTGRES_ARROW
+            }
+            if sem_mapeamento:
+                raise TipoSemMapeamentoCopy(f"Colunas com tipo (OID) sem mapeamento: {sem_mapeamento}")
+
+            with tempfile.TemporaryFile() as arquivo:
+                cursor.copy_expert(f"COPY ({sql}) TO STDOUT WITH (FORMAT csv, HEADER false)", arquivo)
+                arquivo.seek(0)
+
+                # Nomes internos únicos (a consulta pode repetir nomes, ex: SELECT * com join)
+                nomes_internos = [f"c{i}" for i in range(len(nomes_colunas))]
+                tabela = pa_csv.read_csv(
+                    arquivo,
+                    read_options=pa_csv.ReadOptions(column_names=nomes_internos),
+                    convert_options=pa_csv.ConvertOptions(
+                        column_types={
+                            nome: TIPOS_POSTGRES_ARROW[tipo]
+                            for nome, tipo in zip(nomes_internos, tipos_colunas)
+                        },
+                        true_values=["t"],
+                        false_values=["f"],
+                        # No CSV do Postgres, NULL é o campo vazio sem aspas e a string vazia é ""
+                        null_values=[""],
+                        strings_can_be_null=True,
+                        quoted_strings_can_be_null=False,
+                    ),
+                )
+    finally:
+        conn.rollback()
+        conn.close()
+
+    df = tabela.to_pandas()
+    df.columns = nomes_colunas
+
+    # Timestamps em nanossegundos, como no read_sql (versões recentes do pyarrow mantêm os microssegundos)
+    for i, tipo in enumerate(tipos_colunas):
+        if tipo == 1114:
+            df.isetitem(i, df.iloc[:, i].astype("datetime64[ns]"))
+        elif tipo == 1184:
+            df.isetitem(i, df.iloc[:, i].astype("datetime64[ns, UTC]"))
+
+    return df
+
+
+def le_sql_bulk(query, dbEngine, params=None, usa_copy=False):
+    """
+    Executa a consulta e retorna um DataFrame, usando o COPY quando pedido por quem chama (usa_copy).
+    Em outros bancos (ex: DuckDB), com tipos sem mapeamento ou em caso de erro no COPY, usa o le_sql.
+    """
+    params = params or {}
+    if not usa_copy or not LEITURA_BULK_HABILITADO or dbEngine.dialect.name != "postgresql":
+        return le_sql(query, dbEngine, params)
+
+    try:
+        return le_sql_copy(query, dbEngine, params)
+    except TipoSemMapeamentoCopy as e:
+        print(f"Leitura via COPY não suportada, usando read_sql: {e}")
+    except (psycopg2.Error, pa.ArrowException) as e:
+        print(f"Erro na leitura via COPY, usando read_sql: {e}")
+
+    return le_sql(query, dbEngine, params)
@@ -5,9 +5,6 @@
 import pandas as pd
 import io
 
-# Importar bibliotecas do dash básicas
-from dash import html
-
 # Imports de mapa
 import dash_leaflet as dl
 
@@ -36,68 +33,65 @@ def getMapaFundo():
     ]
 
 
+def gera_geojson_pontos(longitudes, latitudes, propriedades):
+    """Função para gerar um FeatureCollection de pontos (as propriedades são um dict de colunas)"""
+    nomes = list(propriedades.keys())
+    colunas = [propriedades[nome] for nome in nomes]
+
+    features = [
+        {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [lon, lat]},
+            "properties": dict(zip(nomes, valores)),
+        }
+        for lon, lat, *valores in zip(longitudes, latitudes, *colunas)
+    ]
+
+    return {"type": "FeatureCollection", "features": features}
+
+
+def gera_layer_pontos(geojson, titulo, cor_icone):
+    """Função para gerar uma única camada GeoJSON, estilizada e com popups no navegador (assets/mapa-camadas.js)"""
+    return dl.GeoJSON(
+        data=geojson,
+        pointToLayer=dict(variable="mapaCamadas.pontoParaCamada"),
+        onEachFeature=dict(variable="mapaCamadas.popupPorPonto"),
+        hideout=dict(cor=cor_icone, titulo=titulo),
+    )
+
+
 def gera_layer_posicao(df_pos, cor_icone):
-    lista_marcadores = []
-
-    # Itera em cada evento
-    for _, row in df_pos.iterrows():
-        evt_lon = row["Longitude"]
-        evt_lat = row["Latitude"]
-        evt_timestamp = (pd.to_datetime(row["Timestamp"]) - pd.Timedelta(hours=3)).strftime("%H:%M:%S - %Y-%m-%d")
-
-        marcador = dl.CircleMarker(
-            center=[evt_lat, evt_lon],
-            radius=10,
-            color="black",
-            fillColor=cor_icone,
-            fillOpacity=0.75,
-            children=dl.Popup(
-                html.Div(
-                    [
-                        html.H6("Posição GPS"),
-                        html.Ul([html.Li(f"Hora: {evt_timestamp}")]),
-                    ]
-                )
-            ),
-        )
+    # Remove as posições sem coordenadas
+    df_pos = df_pos[df_pos["Latitude"].notna() & df_pos["Longitude"].notna()]
 
-        # Adiciona o marcador
-        lista_marcadores.append(marcador)
+    # Hora (BR) de cada posição
+    hora = (pd.to_datetime(df_pos["Timestamp"]) - pd.Timedelta(hours=3)).dt.strftime("%H:%M:%S - %Y-%m-%d")
 
-    return lista_marcadores
+    geojson = gera_geojson_pontos(
+        df_pos["Longitude"].astype(float).round(6).tolist(),
+        df_pos["Latitude"].astype(float).round(6).tolist(),
+        {"hora": hora.tolist()},
+    )
+
+    return [gera_layer_pontos(geojson, "Posição GPS", cor_icone)]
 
 
 def gera_layer_eventos_mix(df_eventos_mix, evt_name, cor_icone):
-    lista_marcadores = []
+    # Remove os eventos sem coordenadas
+    df_eventos_mix = df_eventos_mix[
+        df_eventos_mix["StartPosition_Latitude"].notna() & df_eventos_mix["StartPosition_Longitude"].notna()
+    ]
 
     # Seta nome não conhecido para os motoristas que não tiverem dado
-    df_eventos_mix["Name"] = df_eventos_mix["Name"].fillna("Não informado")
-
-    # Itera em cada evento
-    for _, row in df_eventos_mix.iterrows():
-        evt_lon = row["StartPosition_Longitude"]
-        evt_lat = row["StartPosition_Latitude"]
-        evt_driver_name = row["Name"]
-        evt_timestamp = (pd.to_datetime(row["StartDateTime"]) - pd.Timedelta(hours=3)).strftime("%H:%M:%S - %Y-%m-%d")
-
-        if pd.notna(evt_lat) and pd.notna(evt_lon):
-            marcador = dl.CircleMarker(
-                center=[evt_lat, evt_lon],
-                radius=10,
-                color="black",
-                fillColor=cor_icone,
-                fillOpacity=0.75,
-                children=dl.Popup(
-                    html.Div(
-                        [
-                            html.H6(evt_name),
-                            html.Ul([html.Li(f"Motorista: {evt_driver_name}"), html.Li(f"Hora: {evt_timestamp}")]),
-                        ]
-                    )
-                ),
-            )
-
-            # Adiciona o marcador
-            lista_marcadores.append(marcador)
-
-    return lista_marcadores
+    motorista = df_eventos_mix["Name"].fillna("Não informado")
+
+    # Hora (BR) de cada evento
+    hora = (pd.to_datetime(df_eventos_mix["StartDateTime"]) - pd.Timedelta(hours=3)).dt.strftime("%H:%M:%S - %Y-%m-%d")
+
+    geojson = gera_geojson_pontos(
+        df_eventos_mix["StartPosition_Longitude"].astype(float).round(6).tolist(),
+        df_eventos_mix["StartPosition_Latitude"].astype(float).round(6).tolist(),
+        {"motorista": motorista.tolist(), "hora": hora.tolist()},
+    )
+
+    return [gera_layer_pontos(geojson, evt_name, cor_icone)]
@@ -3,9 +3,17 @@
 
 # Função utilitária para pegar o preço do combustível via API
 # https://combustivelapi.com.br/
+#
+# O preço é mantido por um provedor único (singleton) que nunca bloqueia quem o consulta: o valor é atualizado em
+# segundo plano a cada PRECO_DIESEL_TTL_SEGUNDOS (com timeout), e o último valor obtido é salvo em disco para ser
+# usado na próxima inicialização (ex: sem acesso à internet).
 
 # Imports básicos
 import json
+import os
+import tempfile
+import threading
+import time
 
 # Imports para requisições HTTP
 import requests
@@ -13,22 +21,128 @@ import requests
 # Constantes
 BASE_URL = "https://combustivelapi.com.br"
 ENDPOINT = "/api/precos"
+PRECO_PADRAO_DIESEL = 6
 
+# Configurações do provedor
+PRECO_DIESEL_TIMEOUT_SEGUNDOS = float(os.getenv("PRECO_DIESEL_TIMEOUT_SEGUNDOS", 5))
+PRECO_DIESEL_TTL_SEGUNDOS = int(os.getenv("PRECO_DIESEL_TTL_SEGUNDOS", 6 * 60 * 60))
+PRECO_DIESEL_CACHE_PATH = os.getenv(
+    "PRECO_DIESEL_CACHE_PATH", os.path.join(tempfile.gettempdir(), "ra_dash_combustivel_preco_diesel.json")
+)
 
-def get_preco_diesel():
+
+def consulta_preco_diesel_api():
+    """Consulta o preço do diesel (GO) na API. Retorna None em caso de erro"""
     url = BASE_URL + ENDPOINT
-    preco_padrao_diesel = 6
-    preco_diesel = preco_padrao_diesel
 
     try:
         headers = {"Accept": "application/json", "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"}
-        response = requests.request("GET", url, headers=headers)
+        response = requests.request("GET", url, headers=headers, timeout=PRECO_DIESEL_TIMEOUT_SEGUNDOS)
         if response.status_code == 200:
             data = response.json()
-            preco_diesel = float(str(data["precos"]["diesel"]["go"]).replace(",", "."))
+            return float(str(data["precos"]["diesel"]["go"]).replace(",", "."))
         else:
             print(f"Erro ao acessar a API: {response.status_code}")
     except Exception as e:
         print(f"Exceção ao acessar a API: {e}")
 
-    return preco_diesel
+    return None
+
+
+class PrecoDieselProvider:
+    """
+    Singleton que fornece o preço do diesel
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls, *args, **kwargs):
+        """
+        Cria ou retorna uma instância do singleton
+        """
+        with cls._lock:  # Garante thead safety
+            if cls._instance is None:
+                cls._instance = super(PrecoDieselProvider, cls).__new__(cls)
+                cls._instance._initialize(*args, **kwargs)
+        return cls._instance
+
+    def _initialize(self):
+        """
+        Inicializa o provedor com o último valor salvo (ou o padrão) e inicia a atualização em segundo plano
+        """
+        if hasattr(self, "_initialized") and self._initialized:
+            return
+
+        self._preco = PRECO_PADRAO_DIESEL
+        self._atualizado_em = None
+        self._carrega_preco_salvo()
+
+        self._thread = threading.Thread(target=self._loop_atualizacao, name="preco-diesel", daemon=True)
+        self._thread.start()
+        self._initialized = True
+
+    @classmethod
+    def get_instance(cls):
+        """
+        Retorna a singleton
+        """
+        return cls()
+
+    def _carrega_preco_salvo(self):
+        try:
+            with open(PRECO_DIESEL_CACHE_PATH, "r") as f:
+                dados = json.load(f)
+            self._preco = float(dados["preco"])
+            self._atualizado_em = dados.get("atualizado_em")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Erro ao ler o preço do diesel salvo: {e}")
+
+    def _salva_preco(self):
+        try:
+            # Escreve em um arquivo temporário e renomeia (evita arquivo corrompido com vários workers)
+            caminho_tmp = f"{PRECO_DIESEL_CACHE_PATH}.{os.getpid()}.tmp"
+            with open(caminho_tmp, "w") as f:
+                json.dump({"preco": self._preco, "atualizado_em": self._atualizado_em}, f)
+            os.replace(caminho_tmp, PRECO_DIESEL_CACHE_PATH)
+        except Exception as e:
+            print(f"Erro ao salvar o preço do diesel: {e}")
+
+    def atualizar(self):
+        """
+        Consulta a API e atualiza o preço (mantém o último valor em caso de erro)
+        """
+        preco = consulta_preco_diesel_api()
+        if preco is None:
+            return False
+
+        self._preco = preco
+        self._atualizado_em = time.time()
+        self._salva_preco()
+        return True
+
+    def _loop_atualizacao(self):
+        while True:
+            # Outro worker pode ter atualizado o valor salvo: usa-o enquanto estiver dentro do TTL
+            self._carrega_preco_salvo()
+            if self._atualizado_em is not None:
+                espera = self._atualizado_em + PRECO_DIESEL_TTL_SEGUNDOS - time.time()
+                if espera > 0:
+                    time.sleep(espera)
+                    continue
+
+            # Em caso de erro (ex: sem rede), tenta novamente antes do TTL
+            if not self.atualizar():
+                time.sleep(min(PRECO_DIESEL_TTL_SEGUNDOS, 300))
+
+    def get_preco(self):
+        """
+        Retorna o preço atual (nunca bloqueia)
+        """
+        return self._preco
+
+
+def get_preco_diesel():
+    return PrecoDieselProvider.get_instance().get_preco()
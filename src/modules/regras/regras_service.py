@@ -18,16 +18,14 @@ from sqlalchemy.sql import text
 
 # Imports auxiliares
 from modules.sql_utils import *
-
-# Constante indica o número mínimo de viagens que devem existir para poder classificar o consumo de uma viagem
-# Por exemplo, NUM_MIN_VIAGENS_PARA_CLASSIFICAR = 5 indica que somente as viagens cuja configuração possuam outras 5
-# viagens iguais (mesma linha, sentido, dia, etc) será incluída na análise
-NUM_MIN_VIAGENS_PARA_CLASSIFICAR = os.getenv("NUM_MIN_VIAGENS_PARA_CLASSIFICAR", 5)
+from modules.filtro_utils import normaliza_lista, NUM_MIN_VIAGENS_PARA_CLASSIFICAR
+from modules.rollup.sketch_veiculo_service import SketchVeiculoService
 
 
 class RegrasService:
     def __init__(self, dbEngine):
         self.dbEngine = dbEngine
+        self.sketch_veiculo_service = SketchVeiculoService(dbEngine)
         
     def get_todas_regras(self):
         """Função para obter todas as regras de monitoramento"""
@@ -61,14 +59,14 @@ class RegrasService:
         """Função para apagar uma regra de monitoramento"""
 
         # Query
-        query = f"""
-            DELETE FROM regra_monitoramento_combustivel WHERE id = {id_regra}
+        query = """
+            DELETE FROM regra_monitoramento_combustivel WHERE id = :id_regra
         """
 
         try:
             # Executa a query
             with self.dbEngine.begin() as conn:
-                conn.execute(text(query))
+                conn.execute(text(query), {"id_regra": id_regra})
 
             return True
         except Exception as e:
@@ -79,13 +77,13 @@ class RegrasService:
         """Função para obter uma regra de monitoramento pelo ID"""
 
         # Query
-        query = f"""
-            SELECT * FROM regra_monitoramento_combustivel WHERE id = {id_regra}
+        query = """
+            SELECT * FROM regra_monitoramento_combustivel WHERE id = :id_regra
             ORDER BY nome_regra
         """
 
         # Executa a query
-        df = pd.read_sql(query, self.dbEngine)
+        df = le_sql(query, self.dbEngine, {"id_regra": id_regra})
 
         return df
 
@@ -120,8 +118,13 @@ class RegrasService:
         limite_baixa_perfomance,
         limite_erro_telemetria,
     ):
-        subquery_dia_marcado_str = subquery_dia_marcado_str(dias_marcados)
-        subquery_modelos_str = subquery_modelos_combustivel(lista_modelos, termo_all="TODOS")
+        # O seletor de dias da regra é de valor único (ex: "SEG_SEX")
+        if isinstance(dias_marcados, str):
+            dias_marcados = [dias_marcados]
+        subquery_dia_marcado_str = subquery_lista_dia_marcado(dias_marcados) if dias_marcados else ""
+        subquery_modelos_str, params = filtro_lista_param(
+            "vec_model", normaliza_lista(lista_modelos, termo_all="TODOS"), "modelos"
+        )
 
         # Ajusta os limites antes de executar a query
         if limite_mediana is None:
@@ -133,6 +136,51 @@ class RegrasService:
         if limite_erro_telemetria is None:
             limite_erro_telemetria = 0
 
+        # Tenta responder pelos agregados diários dos veículos (HyperLogLog dos motoristas)
+        df = self.sketch_veiculo_service.get_agregados_veiculos_regra(
+            params.get("modelos"), dias_marcados, int(qtd_min_viagens or 0), int(qtd_min_motoristas or 0)
+        )
+        if df is not None:
+            df = df[
+                (df["perc_total_abaixo_mediana"] >= float(limite_mediana))
+                & (df["perc_baixa_perfomance"] >= float(limite_baixa_perfomance))
+                & (df["perc_erro_telemetria"] >= float(limite_erro_telemetria))
+            ]
+            df = df.sort_values(by="perc_baixa_perfomance", ascending=False).reset_index(drop=True)
+        else:
+            df = self.__get_preview_regra_viagens(
+                subquery_modelos_str,
+                subquery_dia_marcado_str,
+                params,
+                qtd_min_motoristas,
+                qtd_min_viagens,
+                limite_mediana,
+                limite_baixa_perfomance,
+                limite_erro_telemetria,
+            )
+
+        # Arrendonda as colunas necessárias
+        df["media_km_por_litro"] = df["media_km_por_litro"].round(2)
+        df["perc_total_abaixo_mediana"] = df["perc_total_abaixo_mediana"].round(2)
+        df["perc_baixa_perfomance"] = df["perc_baixa_perfomance"].round(2)
+        df["perc_erro_telemetria"] = df["perc_erro_telemetria"].round(2)
+        df["litros_excedentes"] = df["litros_excedentes"].round(2)
+        df["total_consumo_litros"] = df["total_consumo_litros"].round(2)
+
+        return df
+
+    def __get_preview_regra_viagens(
+        self,
+        subquery_modelos_str,
+        subquery_dia_marcado_str,
+        params,
+        qtd_min_motoristas,
+        qtd_min_viagens,
+        limite_mediana,
+        limite_baixa_perfomance,
+        limite_erro_telemetria,
+    ):
+        """Prévia da regra consultando as viagens"""
         query = f"""
         WITH viagens_agg_periodo AS (
             SELECT
@@ -211,8 +259,8 @@ class RegrasService:
                 rmtc_viagens_analise_mix
             WHERE
                 encontrou_linha = true
-                AND analise_num_amostras_90_dias >= {NUM_MIN_VIAGENS_PARA_CLASSIFICAR}
-                AND CAST("dia" AS date) BETWEEN CURRENT_DATE - INTERVAL '{350} days' AND CURRENT_DATE + INTERVAL '2 days'
+                AND analise_num_amostras_90_dias >= :num_min_viagens
+                AND CAST("dia" AS date) BETWEEN CURRENT_DATE - INTERVAL '350 days' AND CURRENT_DATE + INTERVAL '2 days'
                 AND km_por_litro >= 1
                 AND km_por_litro <= 10
                 {subquery_modelos_str}
@@ -221,33 +269,34 @@ class RegrasService:
                 vec_num_id,
                 vec_model
             HAVING
-                COUNT(*) >= {qtd_min_viagens}
-                AND COUNT(DISTINCT "DriverId") >= {qtd_min_motoristas}
+                COUNT(*) >= :qtd_min_viagens
+                AND COUNT(DISTINCT "DriverId") >= :qtd_min_motoristas
         )
         SELECT
             *
         FROM
             viagens_agg_periodo
         WHERE
-            perc_total_abaixo_mediana >= {limite_mediana}
-            AND perc_baixa_perfomance >= {limite_baixa_perfomance}
-            AND perc_erro_telemetria >= {limite_erro_telemetria}
+            perc_total_abaixo_mediana >= :limite_mediana
+            AND perc_baixa_perfomance >= :limite_baixa_perfomance
+            AND perc_erro_telemetria >= :limite_erro_telemetria
         ORDER BY
             perc_baixa_perfomance DESC;
         """
 
-        # Executa a query
-        df = pd.read_sql(query, self.dbEngine)
-
-        # Arrendonda as colunas necessárias
-        df["media_km_por_litro"] = df["media_km_por_litro"].round(2)
-        df["perc_total_abaixo_mediana"] = df["perc_total_abaixo_mediana"].round(2)
-        df["perc_baixa_perfomance"] = df["perc_baixa_perfomance"].round(2)
-        df["perc_erro_telemetria"] = df["perc_erro_telemetria"].round(2)
-        df["litros_excedentes"] = df["litros_excedentes"].round(2)
-        df["total_consumo_litros"] = df["total_consumo_litros"].round(2)
+        params.update(
+            {
+                "num_min_viagens": NUM_MIN_VIAGENS_PARA_CLASSIFICAR,
+                "qtd_min_viagens": int(qtd_min_viagens or 0),
+                "qtd_min_motoristas": int(qtd_min_motoristas or 0),
+                "limite_mediana": float(limite_mediana),
+                "limite_baixa_perfomance": float(limite_baixa_perfomance),
+                "limite_erro_telemetria": float(limite_erro_telemetria),
+            }
+        )
 
-        return df
+        # Executa a query
+        return le_sql(query, self.dbEngine, params)
 
     def criar_regra_monitoramento(self, payload):
         """Função para criar uma regra de monitoramento"""
@@ -280,21 +329,21 @@ class RegrasService:
 
     def get_ultima_data_regra(self, id_regra):
         """Função para obter a última data de uma regra de monitoramento"""
-        query = f"""
+        query = """
             SELECT id_regra, MAX(dia) AS ultimo_dia
             FROM relatorio_regra_monitoramento_combustivel
-            WHERE id_regra = {id_regra}
+            WHERE id_regra = :id_regra
             GROUP BY id_regra
         """
-        df = pd.read_sql(query, self.dbEngine)
+        df = le_sql(query, self.dbEngine, {"id_regra": id_regra})
         return df
     
     def existe_execucao_regra_no_dia(self, id_regra, dia):
         """Função para verificar se uma regra já foi executada no dia"""
-        query = f"""
-            SELECT 1 AS "EXISTE" FROM relatorio_regra_monitoramento_combustivel WHERE id_regra = {id_regra} AND dia = '{dia}'
+        query = """
+            SELECT 1 AS "EXISTE" FROM relatorio_regra_monitoramento_combustivel WHERE id_regra = :id_regra AND dia = :dia
         """
-        df = pd.read_sql(query, self.dbEngine)
+        df = le_sql(query, self.dbEngine, {"id_regra": id_regra, "dia": dia})
 
         if df.empty:
             return False
@@ -303,12 +352,12 @@ class RegrasService:
 
     def get_resultado_regra(self, id_regra, dia_execucao):
         """Função para obter o resultado de uma regra de monitoramento"""
-        query = f"""
+        query = """
             SELECT *
             FROM relatorio_regra_monitoramento_combustivel r 
-            WHERE r.id_regra = {id_regra} AND r.dia = '{dia_execucao}'
+            WHERE r.id_regra = :id_regra AND r.dia = :dia
         """
-        df = pd.read_sql(query, self.dbEngine)
+        df = le_sql(query, self.dbEngine, {"id_regra": id_regra, "dia": dia_execucao})
 
         return df
 
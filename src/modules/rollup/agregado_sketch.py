@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Base das tabelas de agregados diários com sketches (t-digest, HyperLogLog)
+#
+# Os sketches são calculados em Python, então a atualização lê as viagens dos dias a recalcular (mês a mês, para limitar
+# a memória na primeira execução), agrega e insere os resultados. Cada tabela define a criação (criar_tabela), a
+# leitura das viagens (le_viagens) e a agregação (agrega_viagens).
+
+# Imports básicos
+import abc
+import threading
+import time
+
+import pandas as pd
+
+# Imports BD
+from sqlalchemy.sql import text
+
+# Imports auxiliares
+from modules.rollup.rollup_service import ROLLUP_DIAS_REPROCESSAR, ROLLUP_WATERMARK_TTL_SEGUNDOS
+
+
+class AgregadoSketchDiario(abc.ABC):
+    # Nome da tabela (definido pelas subclasses)
+    TABELA = None
+
+    def __init__(self, dbEngine):
+        self.dbEngine = dbEngine
+
+        # Watermark da tabela e das viagens (guardados por ROLLUP_WATERMARK_TTL_SEGUNDOS)
+        self.__watermark = None
+        self.__watermark_verificado_em = None
+        self.__lock = threading.Lock()
+
+    @abc.abstractmethod
+    def criar_tabela(self):
+        """Função para criar a tabela (caso não exista)"""
+
+    @abc.abstractmethod
+    def le_viagens(self, conn, dia_inicio, dia_fim):
+        """Função para ler as viagens do período [dia_inicio, dia_fim)"""
+
+    @staticmethod
+    @abc.abstractmethod
+    def agrega_viagens(df):
+        """Função para agregar as viagens lidas por le_viagens (colunas da tabela)"""
+
+    def atualizar(self):
+        """
+        Função para atualizar a tabela de forma incremental (recalcula os últimos ROLLUP_DIAS_REPROCESSAR dias).
+        Retorna o último dia presente na tabela.
+        """
+        self.criar_tabela()
+
+        with self.dbEngine.begin() as conn:
+            # Evita duas atualizações simultâneas (ex: mais de um worker / cron)
+            conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:nome))"), {"nome": self.TABELA})
+
+            ultimo_dia = conn.execute(text(f"SELECT MAX(dia) FROM {self.TABELA}")).scalar()
+            primeiro_dia_viagens, ultimo_dia_viagens = conn.execute(
+                text('SELECT CAST(MIN("dia") AS date), CAST(MAX("dia") AS date) FROM rmtc_viagens_analise_mix')
+            ).one()
+
+            if ultimo_dia_viagens is not None:
+                dia_inicio = pd.to_datetime(primeiro_dia_viagens)
+                if ultimo_dia is not None:
+                    dia_inicio = pd.to_datetime(ultimo_dia) - pd.Timedelta(days=ROLLUP_DIAS_REPROCESSAR)
+                    conn.execute(
+                        text(f"DELETE FROM {self.TABELA} WHERE dia >= CAST(:dia_inicio AS date)"),
+                        {"dia_inicio": dia_inicio.strftime("%Y-%m-%d")},
+                    )
+
+                # Processa mês a mês (limita a memória na primeira execução)
+                dia_fim_total = pd.to_datetime(ultimo_dia_viagens) + pd.Timedelta(days=1)
+                while dia_inicio < dia_fim_total:
+                    dia_fim = min(dia_inicio + pd.DateOffset(months=1), dia_fim_total)
+
+                    df_viagens = self.le_viagens(conn, dia_inicio, dia_fim)
+                    if not df_viagens.empty:
+                        df_agg = self.agrega_viagens(df_viagens)
+                        df_agg.to_sql(self.TABELA, conn, if_exists="append", index=False, method="multi", chunksize=1000)
+
+                    dia_inicio = dia_fim
+
+            novo_ultimo_dia = conn.execute(text(f"SELECT MAX(dia) FROM {self.TABELA}")).scalar()
+
+        # Força uma nova leitura do watermark
+        with self.__lock:
+            self.__watermark_verificado_em = None
+
+        return novo_ultimo_dia
+
+    def get_watermark(self):
+        """
+        Função para obter o último dia da tabela e o último dia das viagens.
+        Retorna None se a tabela não estiver disponível.
+        """
+        with self.__lock:
+            agora = time.monotonic()
+            if (
+                self.__watermark_verificado_em is not None
+                and agora - self.__watermark_verificado_em < ROLLUP_WATERMARK_TTL_SEGUNDOS
+            ):
+                return self.__watermark
+
+            try:
+                with self.dbEngine.connect() as conn:
+                    ultimo_dia_sketch = conn.execute(text(f"SELECT MAX(dia) FROM {self.TABELA}")).scalar()
+                    ultimo_dia_viagens = conn.execute(
+                        text('SELECT CAST(MAX("dia") AS date) FROM rmtc_viagens_analise_mix')
+                    ).scalar()
+
+                self.__watermark = None
+                if ultimo_dia_sketch is not None:
+                    self.__watermark = (pd.to_datetime(ultimo_dia_sketch), pd.to_datetime(ultimo_dia_viagens))
+            except Exception as e:
+                print(f"Tabela {self.TABELA} indisponível: {e}")
+                self.__watermark = None
+
+            self.__watermark_verificado_em = agora
+            return self.__watermark
+
+    def cobre_ate(self, data_fim):
+        """Verifica se a tabela cobre o período até data_fim (até o último dia existente nas viagens)"""
+        watermark = self.get_watermark()
+        if watermark is None:
+            return False
+
+        ultimo_dia_sketch, ultimo_dia_viagens = watermark
+        if pd.isna(ultimo_dia_viagens):
+            return True
+
+        return ultimo_dia_sketch >= min(pd.to_datetime(data_fim), ultimo_dia_viagens)
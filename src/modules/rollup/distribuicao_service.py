@@ -0,0 +1,290 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Distribuição de referência do consumo (km/L) das viagens, usada para comparar uma viagem com as viagens semelhantes
+#
+# A tabela guarda, por dia e por configuração (modelo, faixa horária, sublinha, sentido, dia da semana e feriado), o
+# histograma do km/L em faixas de 0.1 km/L. Os histogramas são aditivos: a distribuição de qualquer janela (ex: 90 dias
+# antes da viagem) é obtida somando os dias, e os quantis são calculados a partir do histograma somado.
+#
+# Todos os dias de uma configuração são lidos de uma vez (e mantidos no cache de resultados); assim, navegar entre
+# viagens da mesma configuração não consulta o banco.
+#
+# Atualização incremental (executar a partir do diretório src):
+#   python -m modules.rollup.distribuicao_service
+
+# Imports básicos
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+# Imports BD
+from sqlalchemy.sql import text
+
+# Imports auxiliares
+from modules.sql_utils import le_sql
+from modules.filtro_utils import NUM_MIN_VIAGENS_PARA_CLASSIFICAR
+from modules.cache_utils import cache_resultado
+from modules.rollup.rollup_service import ROLLUP_DIAS_REPROCESSAR, ROLLUP_WATERMARK_TTL_SEGUNDOS
+
+# Nome da tabela
+TABELA_DISTRIBUICAO = "rmtc_viagens_distribuicao_diaria"
+
+# Faixas de 0.1 km/L (faixa = FLOOR(km_por_litro * 10))
+FAIXAS_POR_KM_L = 10
+
+# Janela da distribuição de referência (dias antes da viagem)
+DISTRIBUICAO_JANELA_DIAS = 90
+
+# Agregação das viagens por dia e configuração
+QUERY_AGREGA_VIAGENS = """
+    SELECT
+        CAST("dia" AS date) AS dia,
+        vec_model,
+        time_slot,
+        encontrou_numero_sublinha,
+        encontrou_sentido_linha,
+        dia_numerico,
+        dia_eh_feriado,
+        CAST(FLOOR(km_por_litro * {faixas_por_km_l}) AS integer) AS faixa_km_l,
+        COUNT(*) AS total_viagens
+    FROM
+        rmtc_viagens_analise_mix
+    WHERE
+        encontrou_linha = true
+        AND analise_num_amostras_90_dias >= :num_min_viagens
+        AND km_por_litro IS NOT NULL
+        AND km_por_litro <> 'NaN'
+        {subquery_dia_str}
+    GROUP BY
+        1, 2, 3, 4, 5, 6, 7, 8
+"""
+
+
+def calcula_estatisticas_histograma(df_hist):
+    """
+    Função para calcular os quantis (box plot) de um histograma (colunas km_por_litro e total_viagens).
+    Os valores de cada faixa são representados pelo centro da faixa.
+    """
+    df_hist = df_hist[df_hist["total_viagens"] > 0].sort_values(by="km_por_litro")
+    total = int(df_hist["total_viagens"].sum())
+    if total == 0:
+        return None
+
+    valores = df_hist["km_por_litro"].to_numpy(dtype=float)
+    acumulado = np.cumsum(df_hist["total_viagens"].to_numpy())
+
+    def quantil(q):
+        # Primeira faixa cujo acumulado atinge a posição do quantil
+        return float(valores[np.searchsorted(acumulado, q * total, side="left")])
+
+    q1, mediana, q3 = quantil(0.25), quantil(0.5), quantil(0.75)
+    iqr = q3 - q1
+
+    # Limites do box plot (1.5 * IQR, restritos aos valores existentes)
+    dentro = valores[(valores >= q1 - 1.5 * iqr) & (valores <= q3 + 1.5 * iqr)]
+
+    return {
+        "total_viagens": total,
+        "minimo": float(valores[0]),
+        "maximo": float(valores[-1]),
+        "q1": q1,
+        "mediana": mediana,
+        "q3": q3,
+        "limite_inferior": float(dentro.min()) if len(dentro) else q1,
+        "limite_superior": float(dentro.max()) if len(dentro) else q3,
+        "media": float(np.average(valores, weights=df_hist["total_viagens"].to_numpy())),
+    }
+
+
+class DistribuicaoService:
+    def __init__(self, dbEngine):
+        self.dbEngine = dbEngine
+
+        # Último dia presente na tabela (guardado por ROLLUP_WATERMARK_TTL_SEGUNDOS)
+        self.__ultimo_dia = None
+        self.__ultimo_dia_verificado_em = None
+        self.__lock = threading.Lock()
+
+    def criar_tabela(self):
+        """Função para criar a tabela da distribuição (caso não exista)"""
+        query_cria = f"""
+            CREATE TABLE IF NOT EXISTS {TABELA_DISTRIBUICAO} AS
+            {QUERY_AGREGA_VIAGENS.format(faixas_por_km_l=FAIXAS_POR_KM_L, subquery_dia_str="")}
+            WITH NO DATA
+        """
+        query_indice = f"""
+            CREATE INDEX IF NOT EXISTS {TABELA_DISTRIBUICAO}_configuracao_idx
+            ON {TABELA_DISTRIBUICAO} (vec_model, encontrou_numero_sublinha, encontrou_sentido_linha, time_slot)
+        """
+        query_indice_dia = f"""
+            CREATE INDEX IF NOT EXISTS {TABELA_DISTRIBUICAO}_dia_idx ON {TABELA_DISTRIBUICAO} (dia)
+        """
+
+        with self.dbEngine.begin() as conn:
+            conn.execute(text(query_cria), {"num_min_viagens": NUM_MIN_VIAGENS_PARA_CLASSIFICAR})
+            conn.execute(text(query_indice))
+            conn.execute(text(query_indice_dia))
+
+    def atualizar(self):
+        """
+        Função para atualizar a tabela de forma incremental (recalcula os últimos ROLLUP_DIAS_REPROCESSAR dias).
+        Retorna o último dia presente na tabela.
+        """
+        self.criar_tabela()
+
+        with self.dbEngine.begin() as conn:
+            # Evita duas atualizações simultâneas (ex: mais de um worker / cron)
+            conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:nome))"), {"nome": TABELA_DISTRIBUICAO})
+
+            ultimo_dia = conn.execute(text(f"SELECT MAX(dia) FROM {TABELA_DISTRIBUICAO}")).scalar()
+
+            params = {"num_min_viagens": NUM_MIN_VIAGENS_PARA_CLASSIFICAR}
+            subquery_dia_str = ""
+            if ultimo_dia is not None:
+                params["dia_inicio"] = pd.to_datetime(ultimo_dia) - pd.Timedelta(days=ROLLUP_DIAS_REPROCESSAR)
+                params["dia_inicio"] = params["dia_inicio"].strftime("%Y-%m-%d")
+                subquery_dia_str = 'AND CAST("dia" AS date) >= CAST(:dia_inicio AS date)'
+
+                conn.execute(
+                    text(f"DELETE FROM {TABELA_DISTRIBUICAO} WHERE dia >= CAST(:dia_inicio AS date)"),
+                    {"dia_inicio": params["dia_inicio"]},
+                )
+
+            query_insere = f"""
+                INSERT INTO {TABELA_DISTRIBUICAO}
+                {QUERY_AGREGA_VIAGENS.format(faixas_por_km_l=FAIXAS_POR_KM_L, subquery_dia_str=subquery_dia_str)}
+            """
+            conn.execute(text(query_insere), params)
+
+            novo_ultimo_dia = conn.execute(text(f"SELECT MAX(dia) FROM {TABELA_DISTRIBUICAO}")).scalar()
+
+        # Força uma nova leitura do último dia
+        with self.__lock:
+            self.__ultimo_dia_verificado_em = None
+
+        return novo_ultimo_dia
+
+    def get_ultimo_dia(self):
+        """Função para obter o último dia da tabela (ou None se a tabela não estiver disponível)"""
+        with self.__lock:
+            agora = time.monotonic()
+            if (
+                self.__ultimo_dia_verificado_em is not None
+                and agora - self.__ultimo_dia_verificado_em < ROLLUP_WATERMARK_TTL_SEGUNDOS
+            ):
+                return self.__ultimo_dia
+
+            try:
+                with self.dbEngine.connect() as conn:
+                    ultimo_dia = conn.execute(text(f"SELECT MAX(dia) FROM {TABELA_DISTRIBUICAO}")).scalar()
+                self.__ultimo_dia = None if ultimo_dia is None else pd.to_datetime(ultimo_dia)
+            except Exception as e:
+                print(f"Tabela {TABELA_DISTRIBUICAO} indisponível: {e}")
+                self.__ultimo_dia = None
+
+            self.__ultimo_dia_verificado_em = agora
+            return self.__ultimo_dia
+
+    @cache_resultado()
+    def get_histogramas_diarios_configuracao(self, vec_model, time_slot, sublinha, sentido, dia_eh_feriado):
+        """Função para obter os histogramas diários (todos os dias) de uma configuração"""
+        query = f"""
+        SELECT
+            dia,
+            dia_numerico,
+            faixa_km_l,
+            total_viagens
+        FROM
+            {TABELA_DISTRIBUICAO}
+        WHERE
+            vec_model = :vec_model
+            AND time_slot = :time_slot
+            AND encontrou_numero_sublinha = :sublinha
+            AND encontrou_sentido_linha = :sentido
+            AND dia_eh_feriado = :dia_eh_feriado
+        """
+        params = {
+            "vec_model": vec_model,
+            "time_slot": time_slot,
+            "sublinha": sublinha,
+            "sentido": sentido,
+            "dia_eh_feriado": bool(dia_eh_feriado),
+        }
+        df = le_sql(query, self.dbEngine, params)
+        df["dia"] = pd.to_datetime(df["dia"])
+
+        return df
+
+    def get_distribuicao_referencia(
+        self,
+        km_l_min,
+        km_l_max,
+        viagem_data,
+        viagem_vec_model,
+        viagem_linha,
+        viagem_sentido,
+        viagem_time_slot,
+        viagem_dia_semana,
+        viagem_dia_eh_feriado,
+    ):
+        """
+        Função para obter a distribuição (histograma e quantis) das viagens semelhantes nos 90 dias antes da viagem.
+        Retorna None se a tabela não estiver disponível ou não cobrir a data da viagem.
+        """
+        data_viagem = pd.to_datetime(viagem_data).normalize()
+        ultimo_dia = self.get_ultimo_dia()
+        if ultimo_dia is None or ultimo_dia < data_viagem:
+            return None
+
+        try:
+            df = self.get_histogramas_diarios_configuracao(
+                viagem_vec_model, viagem_time_slot, viagem_linha, viagem_sentido, viagem_dia_eh_feriado
+            )
+        except Exception as e:
+            print(f"Erro ao obter a distribuição de referência: {e}")
+            return None
+
+        # Janela (mesmo período da consulta sobre as viagens)
+        data_inicio = data_viagem - pd.DateOffset(days=DISTRIBUICAO_JANELA_DIAS)
+        data_fim = data_viagem + pd.DateOffset(days=1)
+        df = df[(df["dia"] >= data_inicio) & (df["dia"] <= data_fim)]
+
+        # Dia da semana (domingo, sábado ou dia útil)
+        if viagem_dia_semana:
+            if viagem_dia_semana == 1:
+                df = df[df["dia_numerico"] == 1]
+            elif viagem_dia_semana == 7:
+                df = df[df["dia_numerico"] == 7]
+            else:
+                df = df[df["dia_numerico"].between(2, 6)]
+
+        # Faixas de km/L (resolução de 0.1 km/L) inteiramente dentro do filtro [km_l_min, km_l_max]; o arredondamento
+        # evita erros de ponto flutuante (ex: 0.7 * 10 = 7.000000000000001)
+        faixa_min = np.ceil(np.round(float(km_l_min) * FAIXAS_POR_KM_L, 6))
+        faixa_max = np.ceil(np.round(float(km_l_max) * FAIXAS_POR_KM_L, 6)) - 1
+        df = df[(df["faixa_km_l"] >= faixa_min) & (df["faixa_km_l"] <= faixa_max)]
+
+        # Soma os dias
+        df_hist = df.groupby("faixa_km_l", as_index=False)["total_viagens"].sum()
+        df_hist["km_por_litro"] = (df_hist["faixa_km_l"] + 0.5) / FAIXAS_POR_KM_L
+
+        return {
+            "df_histograma": df_hist,
+            "estatisticas": calcula_estatisticas_histograma(df_hist),
+        }
+
+
+if __name__ == "__main__":
+    # Atualização incremental da distribuição (ex: via cron)
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+    from db import PostgresSingleton
+
+    pgEngine = PostgresSingleton.get_instance().get_engine()
+    ultimo_dia = DistribuicaoService(pgEngine).atualizar()
+    print(f"Tabela {TABELA_DISTRIBUICAO} atualizada até {ultimo_dia}")
@@ -0,0 +1,319 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Cubo diário (rollup) das viagens de rmtc_viagens_analise_mix
+#
+# Cada linha do cubo agrega as viagens de um dia para a combinação (modelo, veículo, linha). Os agregados são
+# aditivos (contagens e somas), logo qualquer intervalo de datas é respondido somando as linhas dos dias, sem
+# precisar varrer novamente as viagens.
+#
+# O cubo considera somente as viagens usadas na visão geral: encontrou_linha = true, com o número mínimo de amostras
+# para classificação e com km/L dentro da faixa padrão (ROLLUP_KM_L_MIN a ROLLUP_KM_L_MAX). Filtros com outra faixa de
+# km/L continuam sendo respondidos pelas viagens.
+#
+# Atualização incremental (executar a partir do diretório src):
+#   python -m modules.rollup.rollup_service
+
+# Imports básicos
+import os
+import threading
+import time
+
+import pandas as pd
+
+# Imports BD
+from sqlalchemy.sql import text
+
+# Imports auxiliares
+from modules.sql_utils import le_sql, filtro_lista_param
+from modules.filtro_utils import NUM_MIN_VIAGENS_PARA_CLASSIFICAR
+
+# Nome da tabela do cubo
+TABELA_ROLLUP = "rmtc_viagens_rollup_diario"
+
+# Faixa de km/L materializada no cubo (valores padrão dos filtros da visão geral)
+ROLLUP_KM_L_MIN = float(os.getenv("ROLLUP_KM_L_MIN", 1))
+ROLLUP_KM_L_MAX = float(os.getenv("ROLLUP_KM_L_MAX", 10))
+
+# Dias recalculados a cada atualização (a análise dos últimos dias ainda pode ser alterada)
+ROLLUP_DIAS_REPROCESSAR = int(os.getenv("ROLLUP_DIAS_REPROCESSAR", 3))
+
+# Intervalo (em segundos) para verificar novamente o watermark do cubo
+ROLLUP_WATERMARK_TTL_SEGUNDOS = int(os.getenv("ROLLUP_WATERMARK_TTL_SEGUNDOS", 60))
+
+# Status da análise e a coluna de contagem correspondente no cubo
+COLUNAS_STATUS = {
+    "NORMAL": "total_status_normal",
+    "SUSPEITA BAIXA PERFORMANCE (<= 1.0 STD)": "total_status_suspeita_baixa_perfomance",
+    "BAIXA PERFORMANCE (<= 1.5 STD)": "total_status_baixa_perfomance_1_5_std",
+    "BAIXA PERFOMANCE (<= 2 STD)": "total_status_baixa_perfomance_2_std",
+    "ERRO TELEMETRIA (>= 2.0 STD)": "total_status_erro_telemetria",
+}
+
+# Contagem das viagens por status (uma coluna por status)
+CONTAGEM_STATUS_STR = ",\n        ".join(
+    f"COUNT(*) FILTER (WHERE analise_status_90_dias = '{status}') AS {coluna}" for status, coluna in COLUNAS_STATUS.items()
+)
+
+# Agregação das viagens por dia (base da criação e da atualização do cubo)
+QUERY_AGREGA_VIAGENS = """
+    SELECT
+        CAST("dia" AS date) AS dia,
+        vec_model,
+        vec_num_id,
+        encontrou_numero_linha,
+        COUNT(*) AS total_viagens,
+        SUM(km_por_litro) AS soma_km_por_litro,
+        COUNT(km_por_litro) AS num_km_por_litro,
+        SUM(tamanho_linha_km) AS soma_tamanho_linha_km,
+        COUNT(tamanho_linha_km) AS num_tamanho_linha_km,
+        SUM(total_comb_l) AS soma_total_comb_l,
+        SUM(
+            ABS(
+                total_comb_l - (tamanho_linha_km_sobreposicao / analise_valor_mediana_90_dias)
+            )
+        ) AS soma_litros_excedentes,
+        SUM(
+            ABS(
+                total_comb_l - (tamanho_linha_km_sobreposicao / analise_valor_mediana_90_dias)
+            )
+        ) FILTER (WHERE analise_status_90_dias = 'BAIXA PERFOMANCE (<= 2 STD)') AS soma_litros_excedentes_baixa_perfomance,
+        COUNT(*) FILTER (WHERE analise_diff_mediana_90_dias < 0) AS total_abaixo_mediana,
+        {contagem_status_str}
+    FROM
+        rmtc_viagens_analise_mix
+    WHERE
+        encontrou_linha = true
+        AND analise_num_amostras_90_dias >= :num_min_viagens
+        AND km_por_litro >= :km_l_min
+        AND km_por_litro <= :km_l_max
+        {subquery_dia_str}
+    GROUP BY
+        CAST("dia" AS date),
+        vec_model,
+        vec_num_id,
+        encontrou_numero_linha
+"""
+
+
+class RollupService:
+    def __init__(self, dbEngine):
+        self.dbEngine = dbEngine
+
+        # Watermark do cubo e das viagens (guardados por ROLLUP_WATERMARK_TTL_SEGUNDOS)
+        self.__watermark = None
+        self.__watermark_verificado_em = None
+        self.__lock = threading.Lock()
+
+    def __params_base(self):
+        return {
+            "num_min_viagens": NUM_MIN_VIAGENS_PARA_CLASSIFICAR,
+            "km_l_min": ROLLUP_KM_L_MIN,
+            "km_l_max": ROLLUP_KM_L_MAX,
+        }
+
+    def criar_tabela(self):
+        """Função para criar a tabela do cubo (caso não exista)"""
+        query_cria = f"""
+            CREATE TABLE IF NOT EXISTS {TABELA_ROLLUP} AS
+            {QUERY_AGREGA_VIAGENS.format(contagem_status_str=CONTAGEM_STATUS_STR, subquery_dia_str="")}
+            WITH NO DATA
+        """
+        query_indice = f"""
+            CREATE INDEX IF NOT EXISTS {TABELA_ROLLUP}_dia_idx ON {TABELA_ROLLUP} (dia)
+        """
+
+        with self.dbEngine.begin() as conn:
+            conn.execute(text(query_cria), self.__params_base())
+            conn.execute(text(query_indice))
+
+    def atualizar(self):
+        """
+        Função para atualizar o cubo de forma incremental.
+        Recalcula os dias a partir de MAX(dia) - ROLLUP_DIAS_REPROCESSAR; na primeira execução calcula todo o histórico.
+        Retorna o novo watermark (último dia presente no cubo).
+        """
+        self.criar_tabela()
+
+        with self.dbEngine.begin() as conn:
+            # Evita duas atualizações simultâneas (ex: mais de um worker / cron)
+            conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:nome))"), {"nome": TABELA_ROLLUP})
+
+            ultimo_dia = conn.execute(text(f"SELECT MAX(dia) FROM {TABELA_ROLLUP}")).scalar()
+
+            params = self.__params_base()
+            subquery_dia_str = ""
+            if ultimo_dia is not None:
+                params["dia_inicio"] = pd.to_datetime(ultimo_dia) - pd.Timedelta(days=ROLLUP_DIAS_REPROCESSAR)
+                params["dia_inicio"] = params["dia_inicio"].strftime("%Y-%m-%d")
+                subquery_dia_str = 'AND CAST("dia" AS date) >= CAST(:dia_inicio AS date)'
+
+                conn.execute(
+                    text(f"DELETE FROM {TABELA_ROLLUP} WHERE dia >= CAST(:dia_inicio AS date)"),
+                    {"dia_inicio": params["dia_inicio"]},
+                )
+
+            query_insere = f"""
+                INSERT INTO {TABELA_ROLLUP}
+                {QUERY_AGREGA_VIAGENS.format(
+                    contagem_status_str=CONTAGEM_STATUS_STR, subquery_dia_str=subquery_dia_str
+                )}
+            """
+            conn.execute(text(query_insere), params)
+
+            novo_ultimo_dia = conn.execute(text(f"SELECT MAX(dia) FROM {TABELA_ROLLUP}")).scalar()
+
+        # Força uma nova leitura do watermark
+        with self.__lock:
+            self.__watermark_verificado_em = None
+
+        return novo_ultimo_dia
+
+    def get_watermark(self):
+        """
+        Função para obter o último dia do cubo e o último dia das viagens.
+        Retorna None se o cubo não estiver disponível.
+        """
+        with self.__lock:
+            agora = time.monotonic()
+            if (
+                self.__watermark_verificado_em is not None
+                and agora - self.__watermark_verificado_em < ROLLUP_WATERMARK_TTL_SEGUNDOS
+            ):
+                return self.__watermark
+
+            try:
+                with self.dbEngine.connect() as conn:
+                    ultimo_dia_rollup = conn.execute(text(f"SELECT MAX(dia) FROM {TABELA_ROLLUP}")).scalar()
+                    ultimo_dia_viagens = conn.execute(
+                        text('SELECT CAST(MAX("dia") AS date) FROM rmtc_viagens_analise_mix')
+                    ).scalar()
+
+                self.__watermark = None
+                if ultimo_dia_rollup is not None:
+                    self.__watermark = (pd.to_datetime(ultimo_dia_rollup), pd.to_datetime(ultimo_dia_viagens))
+            except Exception as e:
+                print(f"Cubo {TABELA_ROLLUP} indisponível: {e}")
+                self.__watermark = None
+
+            self.__watermark_verificado_em = agora
+            return self.__watermark
+
+    def pode_responder(self, filtro):
+        """Verifica se o filtro pode ser respondido pelo cubo"""
+        if filtro.km_l_min != ROLLUP_KM_L_MIN or filtro.km_l_max != ROLLUP_KM_L_MAX:
+            return False
+
+        # Dimensões que não estão no cubo
+        if filtro.sentidos is not None or filtro.dias_marcados is not None:
+            return False
+
+        if filtro.data_inicio is None or filtro.data_fim is None:
+            return False
+
+        watermark = self.get_watermark()
+        if watermark is None:
+            return False
+
+        # O cubo precisa cobrir o período pedido (até o último dia existente nas viagens)
+        ultimo_dia_rollup, ultimo_dia_viagens = watermark
+        data_fim = pd.to_datetime(filtro.data_fim)
+        if pd.isna(ultimo_dia_viagens):
+            return True
+
+        return ultimo_dia_rollup >= min(data_fim, ultimo_dia_viagens)
+
+    def get_agregados_visao_geral(self, filtro):
+        """
+        Função para obter os agregados da visão geral somando os dias do cubo.
+        Retorna o mesmo formato da consulta sobre as viagens (colunas nivel, analise_status_90_dias, ...) ou
+        None caso o filtro não possa ser respondido pelo cubo.
+        """
+        if not self.pode_responder(filtro):
+            return None
+
+        params = {"data_inicio": filtro.data_inicio, "data_fim": filtro.data_fim}
+        subquery_filtro_str = ""
+        if filtro.vec_num_id is not None:
+            subquery_filtro_str += "AND vec_num_id = :vec_num_id"
+            params["vec_num_id"] = filtro.vec_num_id
+
+        for coluna, valores, nome_param in [
+            ("vec_model", filtro.modelos, "modelos"),
+            ("encontrou_numero_linha", filtro.linhas, "linhas"),
+        ]:
+            clausula, params_clausula = filtro_lista_param(coluna, valores, nome_param)
+            if clausula:
+                subquery_filtro_str += f"\n            {clausula}"
+                params.update(params_clausula)
+
+        soma_status_str = ",\n            ".join(
+            f"CAST(SUM({coluna}) AS bigint) AS {coluna}" for coluna in COLUNAS_STATUS.values()
+        )
+
+        query = f"""
+        SELECT
+            CASE
+                WHEN GROUPING(vec_num_id) = 0 THEN 'veiculo'
+                WHEN GROUPING(vec_model) = 0 THEN 'modelo'
+                WHEN GROUPING(encontrou_numero_linha) = 0 THEN 'linha'
+                ELSE 'total'
+            END AS nivel,
+            vec_model,
+            vec_num_id,
+            encontrou_numero_linha,
+            CAST(SUM(total_viagens) AS bigint) AS total_viagens,
+            SUM(soma_km_por_litro) / NULLIF(SUM(num_km_por_litro), 0) AS media_km_por_litro,
+            SUM(soma_tamanho_linha_km) / NULLIF(SUM(num_tamanho_linha_km), 0) AS media_tam_linha,
+            CAST(SUM(total_abaixo_mediana) AS bigint) AS total_abaixo_mediana,
+            CAST(
+                SUM(total_status_baixa_perfomance_1_5_std + total_status_baixa_perfomance_2_std) AS bigint
+            ) AS total_baixa_perfomance,
+            CAST(SUM(total_status_erro_telemetria) AS bigint) AS total_erro_telemetria,
+            SUM(soma_total_comb_l) AS total_consumo_litros,
+            SUM(soma_litros_excedentes) AS litros_excedentes,
+            SUM(soma_litros_excedentes_baixa_perfomance) AS litros_excedentes_baixa_perfomance,
+            {soma_status_str}
+        FROM
+            {TABELA_ROLLUP}
+        WHERE
+            dia BETWEEN CAST(:data_inicio AS date) AND CAST(:data_fim AS date)
+            {subquery_filtro_str}
+        GROUP BY GROUPING SETS (
+            (vec_model),
+            (vec_num_id, vec_model),
+            (encontrou_numero_linha),
+            ()
+        )
+        """
+        df = le_sql(query, self.dbEngine, params)
+
+        # Converte as contagens por status para linhas (nivel = status), como no GROUPING SETS das viagens
+        linhas_status = []
+        df_total = df[df["nivel"] == "total"]
+        if not df_total.empty:
+            total = df_total.iloc[0]
+            for status, coluna in COLUNAS_STATUS.items():
+                if pd.notna(total[coluna]) and total[coluna] > 0:
+                    linhas_status.append(
+                        {"nivel": "status", "analise_status_90_dias": status, "total_viagens": total[coluna]}
+                    )
+
+        df = df.drop(columns=list(COLUNAS_STATUS.values()))
+        df["analise_status_90_dias"] = None
+        df_status = pd.DataFrame(linhas_status, columns=["nivel", "analise_status_90_dias", "total_viagens"])
+
+        return pd.concat([df, df_status], ignore_index=True)
+
+
+if __name__ == "__main__":
+    # Atualização incremental do cubo (ex: via cron)
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+    from db import PostgresSingleton
+
+    pgEngine = PostgresSingleton.get_instance().get_engine()
+    ultimo_dia = RollupService(pgEngine).atualizar()
+    print(f"Cubo {TABELA_ROLLUP} atualizado até {ultimo_dia}")
@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Agregados diários com sketches do consumo das linhas
+#
+# Cada linha da tabela agrega as viagens de um dia para a combinação (linha, sentido, faixa horária, modelo, dia da
+# semana, feriado), guardando:
+#   - contagem, soma e soma dos quadrados do km/L (média e desvio padrão exatos para qualquer período);
+#   - um t-digest do km/L (ver sketches.py), combinado sob demanda para obter os quantis (p10, p50, p90) do período;
+#   - um HyperLogLog dos veículos, para contar os veículos distintos de qualquer período (os modelos distintos saem da
+#     própria dimensão vec_model);
+#   - as somas usadas nos indicadores da linha (velocidade média e litros excedentes).
+#
+# Assim como o cubo diário, considera somente as viagens com km/L na faixa padrão (ROLLUP_KM_L_MIN a ROLLUP_KM_L_MAX);
+# filtros com outra faixa continuam sendo respondidos pelas viagens.
+#
+# Os sketches são calculados em Python, por isso a atualização lê as viagens dos dias a recalcular (ver agregado_sketch.py).
+# Atualização incremental (executar a partir do diretório src):
+#   python -m modules.rollup.sketch_linha_service
+
+# Imports básicos
+import numpy as np
+import pandas as pd
+
+# Imports BD
+from sqlalchemy.sql import text
+
+# Imports auxiliares
+from modules.sql_utils import le_sql, filtro_lista_param, subquery_lista_dia_marcado
+from modules.rollup.rollup_service import ROLLUP_KM_L_MIN, ROLLUP_KM_L_MAX
+from modules.rollup.agregado_sketch import AgregadoSketchDiario
+from modules.rollup.sketches import TDigest, HyperLogLog
+
+# Nome da tabela
+TABELA_SKETCH_LINHA = "rmtc_viagens_sketch_linha_diario"
+
+# Dimensões da tabela
+DIMENSOES_SKETCH_LINHA = [
+    "dia",
+    "encontrou_numero_linha",
+    "encontrou_sentido_linha",
+    "time_slot",
+    "vec_model",
+    "dia_numerico",
+    "dia_eh_feriado",
+]
+
+
+class SketchLinhaService(AgregadoSketchDiario):
+    TABELA = TABELA_SKETCH_LINHA
+
+    def criar_tabela(self):
+        """Função para criar a tabela (caso não exista)"""
+        query_cria = f"""
+            CREATE TABLE IF NOT EXISTS {TABELA_SKETCH_LINHA} (
+                dia date NOT NULL,
+                encontrou_numero_linha text,
+                encontrou_sentido_linha text,
+                time_slot text,
+                vec_model text,
+                dia_numerico integer,
+                dia_eh_feriado boolean,
+                total_viagens bigint NOT NULL,
+                soma_km_por_litro double precision NOT NULL,
+                soma_quadrados_km_por_litro double precision NOT NULL,
+                digest_km_por_litro bytea NOT NULL,
+                hll_vec_num_id bytea NOT NULL,
+                soma_velocidade_kmh double precision NOT NULL,
+                total_velocidade_kmh bigint NOT NULL,
+                soma_litros_excedentes double precision NOT NULL
+            )
+        """
+        query_indice = f"""
+            CREATE INDEX IF NOT EXISTS {TABELA_SKETCH_LINHA}_linha_dia_idx
+            ON {TABELA_SKETCH_LINHA} (encontrou_numero_linha, dia)
+        """
+
+        with self.dbEngine.begin() as conn:
+            conn.execute(text(query_cria))
+            conn.execute(text(query_indice))
+
+    def le_viagens(self, conn, dia_inicio, dia_fim):
+        query = """
+        SELECT
+            CAST("dia" AS date) AS dia,
+            encontrou_numero_linha::text AS encontrou_numero_linha,
+            encontrou_sentido_linha::text AS encontrou_sentido_linha,
+            time_slot::text AS time_slot,
+            vec_model,
+            dia_numerico,
+            dia_eh_feriado,
+            km_por_litro,
+            vec_num_id::text AS vec_num_id,
+            3600 * (tamanho_linha_km_sobreposicao / NULLIF(encontrou_tempo_viagem_segundos, 0)) AS velocidade_kmh,
+            CASE
+                WHEN analise_status_90_dias = 'BAIXA PERFOMANCE (<= 2 STD)'
+                THEN ABS(total_comb_l - (tamanho_linha_km_sobreposicao / analise_valor_mediana_90_dias))
+                ELSE 0
+            END AS litros_excedentes
+        FROM
+            rmtc_viagens_analise_mix
+        WHERE
+            encontrou_linha = true
+            AND km_por_litro >= :km_l_min
+            AND km_por_litro <= :km_l_max
+            AND CAST("dia" AS date) >= CAST(:dia_inicio AS date)
+            AND CAST("dia" AS date) < CAST(:dia_fim AS date)
+        """
+        params = {
+            "km_l_min": ROLLUP_KM_L_MIN,
+            "km_l_max": ROLLUP_KM_L_MAX,
+            "dia_inicio": dia_inicio.strftime("%Y-%m-%d"),
+            "dia_fim": dia_fim.strftime("%Y-%m-%d"),
+        }
+        return pd.read_sql(text(query), conn, params=params)
+
+    @staticmethod
+    def agrega_viagens(df):
+        """Função para agregar as viagens (uma linha por dia e combinação das dimensões, com os sketches)"""
+        df = df.copy()
+        df["km_por_litro_quadrado"] = df["km_por_litro"] ** 2
+
+        grupos = df.groupby(DIMENSOES_SKETCH_LINHA, dropna=False, sort=False)
+        df_agg = grupos.agg(
+            total_viagens=("km_por_litro", "size"),
+            soma_km_por_litro=("km_por_litro", "sum"),
+            soma_quadrados_km_por_litro=("km_por_litro_quadrado", "sum"),
+            soma_velocidade_kmh=("velocidade_kmh", "sum"),
+            total_velocidade_kmh=("velocidade_kmh", "count"),
+            soma_litros_excedentes=("litros_excedentes", "sum"),
+        )
+        df_agg["digest_km_por_litro"] = grupos["km_por_litro"].agg(lambda valores: TDigest.de_valores(valores).para_bytes())
+        df_agg["hll_vec_num_id"] = grupos["vec_num_id"].agg(lambda valores: HyperLogLog.de_valores(valores).para_bytes())
+
+        return df_agg.reset_index()
+
+    def pode_responder(self, filtro):
+        """Verifica se o filtro pode ser respondido pela tabela"""
+        if filtro.km_l_min != ROLLUP_KM_L_MIN or filtro.km_l_max != ROLLUP_KM_L_MAX:
+            return False
+
+        if filtro.vec_num_id is not None:
+            return False
+
+        if filtro.data_inicio is None or filtro.data_fim is None:
+            return False
+
+        # A tabela precisa cobrir o período pedido
+        return self.cobre_ate(filtro.data_fim)
+
+    def __le_agregados(self, filtro, colunas):
+        params = {"data_inicio": filtro.data_inicio, "data_fim": filtro.data_fim}
+        subquery_filtro_str = ""
+        for coluna, valores, nome_param in [
+            ("vec_model", filtro.modelos, "modelos"),
+            ("encontrou_numero_linha", filtro.linhas, "linhas"),
+            ("encontrou_sentido_linha", filtro.sentidos, "sentidos"),
+        ]:
+            clausula, params_clausula = filtro_lista_param(coluna, valores, nome_param)
+            if clausula:
+                subquery_filtro_str += f"\n            {clausula}"
+                params.update(params_clausula)
+
+        if filtro.dias_marcados:
+            subquery_filtro_str += f"\n            {subquery_lista_dia_marcado(filtro.dias_marcados)}"
+
+        query = f"""
+        SELECT
+            {", ".join(colunas)}
+        FROM
+            {TABELA_SKETCH_LINHA}
+        WHERE
+            dia BETWEEN CAST(:data_inicio AS date) AND CAST(:data_fim AS date)
+            {subquery_filtro_str}
+        """
+        return le_sql(query, self.dbEngine, params)
+
+    def get_consumo_por_time_slot(self, filtro):
+        """
+        Função para obter o consumo por faixa horária e modelo combinando os dias da tabela.
+        Retorna as colunas da consulta sobre as viagens (time_slot, vec_model, mean, min, max, std) e os quantis
+        (p10, p50, p90), ou None caso o filtro não possa ser respondido pela tabela.
+        """
+        if not self.pode_responder(filtro):
+            return None
+
+        df = self.__le_agregados(
+            filtro,
+            [
+                "time_slot",
+                "vec_model",
+                "total_viagens",
+                "soma_km_por_litro",
+                "soma_quadrados_km_por_litro",
+                "digest_km_por_litro",
+            ],
+        )
+        df = df[df["vec_model"].notna()]
+
+        linhas = []
+        for (time_slot, vec_model), df_grupo in df.groupby(["time_slot", "vec_model"], sort=True):
+            total = df_grupo["total_viagens"].sum()
+            media = df_grupo["soma_km_por_litro"].sum() / total
+            variancia = max(df_grupo["soma_quadrados_km_por_litro"].sum() / total - media**2, 0)
+
+            digest = TDigest.combina([TDigest.de_bytes(dados) for dados in df_grupo["digest_km_por_litro"]])
+            linhas.append(
+                {
+                    "time_slot": time_slot,
+                    "vec_model": vec_model,
+                    "mean": media,
+                    "min": digest.minimo,
+                    "max": digest.maximo,
+                    "std": np.sqrt(variancia),
+                    "p10": digest.quantil(0.1),
+                    "p50": digest.quantil(0.5),
+                    "p90": digest.quantil(0.9),
+                }
+            )
+
+        return pd.DataFrame(
+            linhas, columns=["time_slot", "vec_model", "mean", "min", "max", "std", "p10", "p50", "p90"]
+        )
+
+    def get_indicadores(self, filtro):
+        """
+        Função para obter os indicadores da linha combinando os dias da tabela (mesmas colunas da consulta sobre as
+        viagens), ou None caso o filtro não possa ser respondido pela tabela
+        """
+        if not self.pode_responder(filtro):
+            return None
+
+        df = self.__le_agregados(
+            filtro,
+            [
+                "vec_model",
+                "total_viagens",
+                "soma_km_por_litro",
+                "hll_vec_num_id",
+                "soma_velocidade_kmh",
+                "total_velocidade_kmh",
+                "soma_litros_excedentes",
+            ],
+        )
+
+        total_viagens = int(df["total_viagens"].sum())
+        total_velocidade = df["total_velocidade_kmh"].sum()
+        total_veiculos = HyperLogLog.estima_por_grupo(np.zeros(len(df)), df["hll_vec_num_id"], 1)[0]
+
+        return pd.DataFrame(
+            [
+                {
+                    "total_num_viagens": total_viagens,
+                    "total_num_modelos": df["vec_model"].nunique(),
+                    "total_num_veiculos": int(round(total_veiculos)),
+                    "velocidade_media_kmh": (
+                        df["soma_velocidade_kmh"].sum() / total_velocidade if total_velocidade > 0 else None
+                    ),
+                    "media_consumo_viagem": df["soma_km_por_litro"].sum() / total_viagens if total_viagens else None,
+                    "total_litros_excedentes": df["soma_litros_excedentes"].sum() if total_viagens else None,
+                }
+            ]
+        )
+
+
+if __name__ == "__main__":
+    # Atualização incremental da tabela (ex: via cron)
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+    from db import PostgresSingleton
+
+    pgEngine = PostgresSingleton.get_instance().get_engine()
+    ultimo_dia = SketchLinhaService(pgEngine).atualizar()
+    print(f"Tabela {TABELA_SKETCH_LINHA} atualizada até {ultimo_dia}")
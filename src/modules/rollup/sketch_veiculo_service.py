@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Agregados diários por veículo, usados na prévia das regras de monitoramento
+#
+# Cada linha da tabela agrega as viagens classificadas de um veículo em um dia (com o dia da semana e o feriado, para o
+# filtro de dias da regra), guardando os totais da regra (abaixo da mediana, baixa performance, erro de telemetria,
+# consumo e litros excedentes) e um HyperLogLog dos motoristas (ver sketches.py). Assim, o COUNT(DISTINCT "DriverId")
+# dos últimos dias é obtido combinando os sketches diários, sem reler as viagens.
+#
+# Usa a mesma faixa de km/L da regra (1 a 10 km/L, igual à faixa padrão do cubo).
+# Atualização incremental (executar a partir do diretório src):
+#   python -m modules.rollup.sketch_veiculo_service
+
+# Imports básicos
+import numpy as np
+import pandas as pd
+
+# Imports BD
+from sqlalchemy.sql import text
+
+# Imports auxiliares
+from modules.sql_utils import le_sql, filtro_lista_param, subquery_lista_dia_marcado
+from modules.filtro_utils import NUM_MIN_VIAGENS_PARA_CLASSIFICAR
+from modules.rollup.rollup_service import ROLLUP_KM_L_MIN, ROLLUP_KM_L_MAX
+from modules.rollup.agregado_sketch import AgregadoSketchDiario
+from modules.rollup.sketches import HyperLogLog
+
+# Nome da tabela
+TABELA_SKETCH_VEICULO = "rmtc_viagens_sketch_veiculo_diario"
+
+# Dimensões da tabela
+DIMENSOES_SKETCH_VEICULO = ["dia", "vec_num_id", "vec_model", "dia_numerico", "dia_eh_feriado"]
+
+# Janela da prévia das regras (dias antes e depois de hoje)
+REGRA_JANELA_DIAS_ANTES = 350
+REGRA_JANELA_DIAS_DEPOIS = 2
+
+
+class SketchVeiculoService(AgregadoSketchDiario):
+    TABELA = TABELA_SKETCH_VEICULO
+
+    def criar_tabela(self):
+        """Função para criar a tabela (caso não exista)"""
+        query_cria = f"""
+            CREATE TABLE IF NOT EXISTS {TABELA_SKETCH_VEICULO} (
+                dia date NOT NULL,
+                vec_num_id text,
+                vec_model text,
+                dia_numerico integer,
+                dia_eh_feriado boolean,
+                total_viagens bigint NOT NULL,
+                soma_km_por_litro double precision NOT NULL,
+                total_abaixo_mediana bigint NOT NULL,
+                total_baixa_perfomance bigint NOT NULL,
+                total_erro_telemetria bigint NOT NULL,
+                total_consumo_litros double precision NOT NULL,
+                litros_excedentes double precision NOT NULL,
+                hll_motoristas bytea NOT NULL
+            )
+        """
+        query_indice = f"""
+            CREATE INDEX IF NOT EXISTS {TABELA_SKETCH_VEICULO}_dia_idx ON {TABELA_SKETCH_VEICULO} (dia)
+        """
+
+        with self.dbEngine.begin() as conn:
+            conn.execute(text(query_cria))
+            conn.execute(text(query_indice))
+
+    def le_viagens(self, conn, dia_inicio, dia_fim):
+        query = """
+        SELECT
+            CAST("dia" AS date) AS dia,
+            vec_num_id::text AS vec_num_id,
+            vec_model,
+            dia_numerico,
+            dia_eh_feriado,
+            km_por_litro,
+            CASE WHEN analise_diff_mediana_90_dias < 0 THEN 1 ELSE 0 END AS abaixo_mediana,
+            CASE
+                WHEN analise_status_90_dias = 'BAIXA PERFOMANCE (<= 2 STD)' THEN 1
+                WHEN analise_status_90_dias = 'BAIXA PERFORMANCE (<= 1.5 STD)' THEN 1
+                ELSE 0
+            END AS baixa_perfomance,
+            CASE WHEN analise_status_90_dias = 'ERRO TELEMETRIA (>= 2.0 STD)' THEN 1 ELSE 0 END AS erro_telemetria,
+            total_comb_l,
+            ABS(total_comb_l - (tamanho_linha_km_sobreposicao / analise_valor_mediana_90_dias)) AS litros_excedentes,
+            "DriverId"::text AS motorista
+        FROM
+            rmtc_viagens_analise_mix
+        WHERE
+            encontrou_linha = true
+            AND analise_num_amostras_90_dias >= :num_min_viagens
+            AND km_por_litro >= :km_l_min
+            AND km_por_litro <= :km_l_max
+            AND CAST("dia" AS date) >= CAST(:dia_inicio AS date)
+            AND CAST("dia" AS date) < CAST(:dia_fim AS date)
+        """
+        params = {
+            "num_min_viagens": NUM_MIN_VIAGENS_PARA_CLASSIFICAR,
+            "km_l_min": ROLLUP_KM_L_MIN,
+            "km_l_max": ROLLUP_KM_L_MAX,
+            "dia_inicio": dia_inicio.strftime("%Y-%m-%d"),
+            "dia_fim": dia_fim.strftime("%Y-%m-%d"),
+        }
+        return pd.read_sql(text(query), conn, params=params)
+
+    @staticmethod
+    def agrega_viagens(df):
+        """Função para agregar as viagens (uma linha por veículo e dia, com o sketch dos motoristas)"""
+        grupos = df.groupby(DIMENSOES_SKETCH_VEICULO, dropna=False, sort=False)
+        df_agg = grupos.agg(
+            total_viagens=("km_por_litro", "size"),
+            soma_km_por_litro=("km_por_litro", "sum"),
+            total_abaixo_mediana=("abaixo_mediana", "sum"),
+            total_baixa_perfomance=("baixa_perfomance", "sum"),
+            total_erro_telemetria=("erro_telemetria", "sum"),
+            total_consumo_litros=("total_comb_l", "sum"),
+            litros_excedentes=("litros_excedentes", "sum"),
+        )
+        df_agg["hll_motoristas"] = grupos["motorista"].agg(lambda valores: HyperLogLog.de_valores(valores).para_bytes())
+
+        return df_agg.reset_index()
+
+    def pode_responder_regra(self):
+        """Verifica se a prévia das regras (1 a 10 km/L, últimos 350 dias) pode ser respondida pela tabela"""
+        if ROLLUP_KM_L_MIN != 1 or ROLLUP_KM_L_MAX != 10:
+            return False
+
+        return self.cobre_ate(pd.Timestamp.today().normalize() + pd.Timedelta(days=REGRA_JANELA_DIAS_DEPOIS))
+
+    def get_agregados_veiculos_regra(self, lista_modelos, dias_marcados, qtd_min_viagens, qtd_min_motoristas):
+        """
+        Função para obter os totais por veículo (colunas da consulta da prévia das regras, antes dos limites
+        percentuais), ou None caso a tabela não possa responder
+        """
+        if not self.pode_responder_regra():
+            return None
+
+        subquery_modelos_str, params = filtro_lista_param("vec_model", lista_modelos, "modelos")
+        subquery_dia_marcado_str = subquery_lista_dia_marcado(dias_marcados) if dias_marcados else ""
+
+        query = f"""
+        SELECT
+            vec_num_id,
+            vec_model,
+            total_viagens,
+            soma_km_por_litro,
+            total_abaixo_mediana,
+            total_baixa_perfomance,
+            total_erro_telemetria,
+            total_consumo_litros,
+            litros_excedentes,
+            hll_motoristas
+        FROM
+            {TABELA_SKETCH_VEICULO}
+        WHERE
+            dia BETWEEN CURRENT_DATE - INTERVAL '{REGRA_JANELA_DIAS_ANTES} days'
+                AND CURRENT_DATE + INTERVAL '{REGRA_JANELA_DIAS_DEPOIS} days'
+            {subquery_modelos_str}
+            {subquery_dia_marcado_str}
+        """
+        df = le_sql(query, self.dbEngine, params)
+
+        # Totais por veículo
+        chaves = ["vec_num_id", "vec_model"]
+        df_veiculos = df.groupby(chaves, sort=False).agg(
+            total_viagens=("total_viagens", "sum"),
+            soma_km_por_litro=("soma_km_por_litro", "sum"),
+            total_abaixo_mediana=("total_abaixo_mediana", "sum"),
+            total_baixa_perfomance=("total_baixa_perfomance", "sum"),
+            total_consumo_litros=("total_consumo_litros", "sum"),
+            litros_excedentes=("litros_excedentes", "sum"),
+            total_erro_telemetria=("total_erro_telemetria", "sum"),
+        )
+        df_veiculos = df_veiculos[df_veiculos["total_viagens"] >= qtd_min_viagens].copy()
+
+        # Motoristas distintos (combina os sketches diários somente dos veículos restantes)
+        df = df.join(pd.Series(np.arange(len(df_veiculos)), index=df_veiculos.index, name="codigo"), on=chaves)
+        df = df[df["codigo"].notna()]
+        df_veiculos["total_motoristas"] = np.round(
+            HyperLogLog.estima_por_grupo(df["codigo"].astype(int), df["hll_motoristas"], len(df_veiculos))
+        )
+        df_veiculos = df_veiculos[df_veiculos["total_motoristas"] >= qtd_min_motoristas].copy()
+
+        df_veiculos["media_km_por_litro"] = df_veiculos["soma_km_por_litro"] / df_veiculos["total_viagens"]
+        df_veiculos["perc_total_abaixo_mediana"] = 100 * df_veiculos["total_abaixo_mediana"] / df_veiculos["total_viagens"]
+        df_veiculos["perc_baixa_perfomance"] = 100 * df_veiculos["total_baixa_perfomance"] / df_veiculos["total_viagens"]
+        df_veiculos["perc_erro_telemetria"] = 100 * df_veiculos["total_erro_telemetria"] / df_veiculos["total_viagens"]
+
+        return df_veiculos.reset_index()[
+            [
+                "vec_num_id",
+                "vec_model",
+                "total_viagens",
+                "media_km_por_litro",
+                "total_abaixo_mediana",
+                "perc_total_abaixo_mediana",
+                "total_baixa_perfomance",
+                "perc_baixa_perfomance",
+                "total_consumo_litros",
+                "litros_excedentes",
+                "total_erro_telemetria",
+                "perc_erro_telemetria",
+            ]
+        ]
+
+
+if __name__ == "__main__":
+    # Atualização incremental da tabela (ex: via cron)
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+    from db import PostgresSingleton
+
+    pgEngine = PostgresSingleton.get_instance().get_engine()
+    ultimo_dia = SketchVeiculoService(pgEngine).atualizar()
+    print(f"Tabela {TABELA_SKETCH_VEICULO} atualizada até {ultimo_dia}")
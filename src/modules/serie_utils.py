@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Funções utilitárias para reduzir a quantidade de pontos das séries temporais dos gráficos
+#
+# Usamos o Largest-Triangle-Three-Buckets (LTTB): a série é dividida em baldes e, de cada balde, mantemos o ponto que
+# forma o maior triângulo com o ponto escolhido no balde anterior e a média do balde seguinte. Assim, picos e vales
+# (ex: viagens com consumo muito diferente) são preservados mesmo com poucos pontos.
+
+# Imports básicos
+import numpy as np
+import pandas as pd
+
+
+def lttb_indices(x, y, n_saida):
+    """Retorna os índices (posições) dos pontos escolhidos pelo LTTB; x deve estar ordenado"""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+
+    if n_saida >= n or n_saida < 3:
+        return np.arange(n)
+
+    # O primeiro e o último ponto sempre são mantidos; os demais são divididos em n_saida - 2 baldes
+    tamanho_balde = (n - 2) / (n_saida - 2)
+
+    indices = np.empty(n_saida, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+
+    anterior = 0
+    for i in range(n_saida - 2):
+        inicio = int(np.floor(i * tamanho_balde)) + 1
+        fim = int(np.floor((i + 1) * tamanho_balde)) + 1
+
+        # Média do próximo balde (no último balde, é o último ponto)
+        prox_inicio = fim
+        prox_fim = min(int(np.floor((i + 2) * tamanho_balde)) + 1, n)
+        media_x = x[prox_inicio:prox_fim].mean()
+        media_y = y[prox_inicio:prox_fim].mean()
+
+        # Área (x2) dos triângulos formados com o ponto anterior e a média do próximo balde
+        areas = np.abs(
+            (x[anterior] - media_x) * (y[inicio:fim] - y[anterior])
+            - (x[anterior] - x[inicio:fim]) * (media_y - y[anterior])
+        )
+
+        anterior = inicio + int(np.argmax(areas))
+        indices[i + 1] = anterior
+
+    return indices
+
+
+def amostra_lttb(df, coluna_x, coluna_y, n_saida):
+    """Reduz o DataFrame para (no máximo) n_saida linhas usando o LTTB; linhas sem y são descartadas"""
+    df = df[df[coluna_y].notna()].sort_values(by=coluna_x)
+    if len(df) <= n_saida:
+        return df
+
+    x = df[coluna_x]
+    if pd.api.types.is_datetime64_any_dtype(x):
+        x = x.astype("int64") / 1e9
+
+    return df.iloc[lttb_indices(x.to_numpy(), df[coluna_y].to_numpy(), n_saida)]
+
+
+def amostra_janela(df, coluna_x, coluna_y, x_inicio, x_fim, max_pontos_janela, max_pontos_fora):
+    """
+    Mantém os pontos da janela visível [x_inicio, x_fim] em resolução total (ou LTTB se passar de max_pontos_janela)
+    e reduz os pontos fora da janela para max_pontos_fora (usados somente como contexto ao arrastar o gráfico)
+    """
+    dentro = (df[coluna_x] >= x_inicio) & (df[coluna_x] <= x_fim)
+
+    df_janela = amostra_lttb(df[dentro], coluna_x, coluna_y, max_pontos_janela)
+    df_fora = amostra_lttb(df[~dentro], coluna_x, coluna_y, max_pontos_fora)
+
+    return pd.concat([df_fora, df_janela]).sort_values(by=coluna_x)
+
+
+def segmentos_consecutivos(valores):
+    """
+    Run-length encoding: retorna a lista (inicio, fim, valor) de cada sequência de valores iguais consecutivos,
+    com inicio e fim sendo posições (fim exclusivo). Valores nulos formam uma única categoria.
+    """
+    valores = pd.Series(valores)
+    n = len(valores)
+    if n == 0:
+        return []
+
+    # Códigos inteiros das categorias (nulos = -1), permitindo comparar vizinhos com np.diff
+    codigos, _ = pd.factorize(valores)
+    inicios = np.concatenate(([0], np.flatnonzero(np.diff(codigos)) + 1))
+    fins = np.append(inicios[1:], n)
+
+    return list(zip(inicios.tolist(), fins.tolist(), valores.iloc[inicios].tolist()))
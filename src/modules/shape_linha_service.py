@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Registro (singleton) dos shapes das linhas (tabela rmtc_kml_via_ra)
+#
+# Cada linha (numero_sublinha, sentido) possui várias versões do shape, identificadas por diahorario. O registro mantém
+# em memória, para cada linha, a lista ordenada das versões; assim, a versão mais próxima de uma data é encontrada por
+# busca binária (bisect), sem consultar e ordenar a tabela inteira a cada clique no mapa. O GeoJSON de cada versão é
+# lido e convertido (json.loads) somente uma vez.
+#
+# A cada SHAPES_VERIFICACAO_SEGUNDOS verificamos se a tabela mudou (quantidade de versões e último diahorario); se
+# mudou, o registro é recarregado.
+
+# Imports básicos
+import bisect
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+# Imports auxiliares
+from modules.sql_utils import le_sql
+
+# Configurações
+SHAPES_VERIFICACAO_SEGUNDOS = int(os.getenv("SHAPES_VERIFICACAO_SEGUNDOS", 300))
+SHAPES_MAX_GEOJSON_MEMORIA = int(os.getenv("SHAPES_MAX_GEOJSON_MEMORIA", 512))
+
+
+class RegistroShapesLinha:
+    """
+    Singleton com o índice das versões dos shapes das linhas
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls, *args, **kwargs):
+        """
+        Cria ou retorna uma instância do singleton
+        """
+        with cls._lock:  # Garante thead safety
+            if cls._instance is None:
+                cls._instance = super(RegistroShapesLinha, cls).__new__(cls)
+                cls._instance._initialize(*args, **kwargs)
+        return cls._instance
+
+    def _initialize(self, dbEngine):
+        """
+        Inicializa o registro (o índice é carregado no primeiro uso)
+        """
+        if hasattr(self, "_initialized") and self._initialized:
+            return
+
+        self.dbEngine = dbEngine
+        self._versoes = None  # (numero_sublinha, sentido) -> (lista de diahorario em ns, lista de ids)
+        self._assinatura = None
+        self._verificado_em = None
+        self._geojson = OrderedDict()  # id -> GeoJSON (dict), LRU
+        self._lock_registro = threading.Lock()
+        self._initialized = True
+
+    @classmethod
+    def get_instance(cls, dbEngine):
+        """
+        Retorna a singleton
+        """
+        return cls(dbEngine)
+
+    def __get_assinatura(self):
+        query = """
+        SELECT
+            COUNT(*) AS total_versoes,
+            MAX(diahorario::timestamp)::text AS ultima_versao
+        FROM
+            rmtc_kml_via_ra
+        """
+        df = le_sql(query, self.dbEngine)
+        return tuple(df.iloc[0].tolist())
+
+    def __carrega_versoes(self):
+        query = """
+        SELECT
+            id,
+            numero_sublinha,
+            sentido,
+            diahorario::timestamp AS diahorario
+        FROM
+            rmtc_kml_via_ra
+        ORDER BY
+            numero_sublinha, sentido, diahorario::timestamp
+        """
+        df = le_sql(query, self.dbEngine)
+        df["diahorario_ns"] = pd.to_datetime(df["diahorario"]).astype("int64")
+
+        versoes = {}
+        for (numero_sublinha, sentido), df_linha in df.groupby(["numero_sublinha", "sentido"], sort=False):
+            versoes[(str(numero_sublinha), str(sentido))] = (df_linha["diahorario_ns"].tolist(), df_linha["id"].tolist())
+
+        return versoes
+
+    def __atualiza_se_necessario(self):
+        """Recarrega o índice se ainda não foi carregado ou se a tabela mudou"""
+        agora = time.monotonic()
+        if self._versoes is not None and agora - self._verificado_em < SHAPES_VERIFICACAO_SEGUNDOS:
+            return
+
+        assinatura = self.__get_assinatura()
+        if self._versoes is None or assinatura != self._assinatura:
+            self._versoes = self.__carrega_versoes()
+            self._assinatura = assinatura
+            self._geojson.clear()
+
+        self._verificado_em = agora
+
+    def get_id_versao(self, data_str, numero_sublinha, sentido):
+        """
+        Retorna o id da versão do shape mais próxima da data (ou None se a linha não possuir shape)
+        """
+        with self._lock_registro:
+            self.__atualiza_se_necessario()
+            versoes = self._versoes.get((str(numero_sublinha), str(sentido)))
+
+        if not versoes:
+            return None
+
+        lista_diahorario, lista_ids = versoes
+        alvo = pd.Timestamp(data_str).value
+
+        # Versão imediatamente antes ou depois da data, o que estiver mais próximo
+        pos = bisect.bisect_left(lista_diahorario, alvo)
+        if pos == 0:
+            return lista_ids[0]
+        if pos == len(lista_diahorario):
+            return lista_ids[-1]
+        if lista_diahorario[pos] - alvo < alvo - lista_diahorario[pos - 1]:
+            return lista_ids[pos]
+
+        return lista_ids[pos - 1]
+
+    def get_geojson(self, data_str, numero_sublinha, sentido):
+        """
+        Retorna o GeoJSON (já convertido) da versão do shape mais próxima da data (ou None)
+        """
+        id_versao = self.get_id_versao(data_str, numero_sublinha, sentido)
+        if id_versao is None:
+            return None
+
+        with self._lock_registro:
+            geojson = self._geojson.get(id_versao)
+            if geojson is not None:
+                self._geojson.move_to_end(id_versao)
+                return geojson
+
+        query = """
+        SELECT
+            geojsondata
+        FROM
+            rmtc_kml_via_ra
+        WHERE
+            id = :id
+        """
+        df = le_sql(query, self.dbEngine, {"id": id_versao})
+        if df.empty:
+            return None
+
+        geojson = json.loads(df["geojsondata"].values[0])
+
+        with self._lock_registro:
+            self._geojson[id_versao] = geojson
+            while len(self._geojson) > SHAPES_MAX_GEOJSON_MEMORIA:
+                self._geojson.popitem(last=False)
+
+        return geojson
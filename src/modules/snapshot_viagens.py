@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Snapshot das viagens em arquivos Arrow (IPC), compartilhado pelos workers via mmap
+#
+# Estrutura do diretório (SNAPSHOT_VIAGENS_DIR):
+#   ATUAL                          -> nome da versão atual (trocado de forma atômica com os.replace)
+#   versoes/<versao>/manifesto.json
+#   versoes/<versao>/viagens_<AAAA-MM>.arrow      -> uma partição por mês (colunas de tamanho fixo, sem compressão)
+#   versoes/<versao>/categorias_<coluna>.arrow    -> dicionários das colunas de texto (comuns a todas as partições)
+#   versoes/<versao>/parquet/<tabela>/*.parquet   -> somente com o motor DuckDB (ver duckdb_service.py): as linhas
+#                                                    completas das viagens (um arquivo por mês) e os motoristas
+#
+# As partições não usam compressão nem valores nulos (os nulos são NaN ou código -1), então os arrays numpy são views
+# diretas do arquivo mapeado em memória: todos os workers compartilham a mesma cópia física no page cache.
+# Uma nova versão é escrita em um diretório novo (os meses que não mudaram são hard links da versão anterior) e só
+# então o ponteiro ATUAL é trocado. Os workers que ainda mapeiam a versão antiga continuam lendo os arquivos
+# removidos até trocarem de versão (o sistema libera o espaço quando o último mapeamento é fechado).
+#
+# Exportação (executar a partir do diretório src, ex: via cron):
+#   python -m modules.snapshot_viagens
+
+# Imports básicos
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import pyarrow as pa
+
+# Configurações
+SNAPSHOT_VIAGENS_DIR = os.getenv(
+    "SNAPSHOT_VIAGENS_DIR", os.path.join(tempfile.gettempdir(), "ra_dash_combustivel_snapshot")
+)
+
+# Ponteiro para a versão atual
+ARQUIVO_VERSAO_ATUAL = "ATUAL"
+
+# Tabelas exportadas em Parquet (motor DuckDB)
+TABELA_VIAGENS = "rmtc_viagens_analise_mix"
+TABELA_MOTORISTAS = "motoristas_api"
+
+
+def caminho_versao(nome_versao):
+    return os.path.join(SNAPSHOT_VIAGENS_DIR, "versoes", nome_versao)
+
+
+def versao_atual():
+    """Retorna o nome da versão atual do snapshot (ou None se não existir)"""
+    try:
+        with open(os.path.join(SNAPSHOT_VIAGENS_DIR, ARQUIVO_VERSAO_ATUAL)) as f:
+            nome_versao = f.read().strip()
+    except FileNotFoundError:
+        return None
+
+    if not nome_versao or not os.path.isdir(caminho_versao(nome_versao)):
+        return None
+
+    return nome_versao
+
+
+def caminho_parquet(nome_versao, tabela):
+    return os.path.join(caminho_versao(nome_versao), "parquet", tabela)
+
+
+def le_manifesto(nome_versao):
+    with open(os.path.join(caminho_versao(nome_versao), "manifesto.json")) as f:
+        return json.load(f)
+
+
+def le_tabela_mmap(caminho):
+    """Lê uma tabela Arrow mapeando o arquivo em memória (sem cópia)"""
+    return pa.ipc.open_file(pa.memory_map(caminho, "r")).read_all()
+
+
+def coluna_para_numpy(coluna):
+    # Uma única chunk (como escrito por escreve_versao) é convertida sem cópia
+    if coluna.num_chunks == 1:
+        return coluna.chunk(0).to_numpy(zero_copy_only=True)
+    return coluna.to_numpy()
+
+
+def le_categorias(nome_versao):
+    """Retorna os dicionários das colunas de texto (coluna -> array de objetos)"""
+    manifesto = le_manifesto(nome_versao)
+
+    categorias = {}
+    for coluna in manifesto["colunas_texto"]:
+        tabela = le_tabela_mmap(os.path.join(caminho_versao(nome_versao), f"categorias_{coluna}.arrow"))
+        categorias[coluna] = tabela.column("valor").to_numpy(zero_copy_only=False).astype(object)
+
+    return categorias
+
+
+def le_versao(nome_versao):
+    """
+    Mapeia as partições da versão em memória.
+    Retorna as partições (mês -> coluna -> array numpy, views do arquivo) e os dicionários das colunas de texto.
+    """
+    manifesto = le_manifesto(nome_versao)
+
+    particoes = {}
+    for mes in manifesto["particoes"]:
+        tabela = le_tabela_mmap(os.path.join(caminho_versao(nome_versao), f"viagens_{mes}.arrow"))
+        particoes[mes] = {nome: coluna_para_numpy(tabela.column(nome)) for nome in tabela.column_names}
+
+    return particoes, le_categorias(nome_versao)
+
+
+def escreve_tabela(caminho, tabela):
+    tabela = tabela.combine_chunks()
+    with pa.OSFile(caminho, "wb") as arquivo:
+        with pa.ipc.new_file(arquivo, tabela.schema) as writer:
+            writer.write_table(tabela)
+
+
+def reaproveita_arquivo(origem, destino):
+    # Hard link (ou cópia, se o sistema de arquivos não suportar)
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    try:
+        os.link(origem, destino)
+    except OSError:
+        shutil.copy2(origem, destino)
+
+
+def escreve_versao(particoes_novas, meses_reaproveitados, categorias, manifesto, arquivos_parquet=None):
+    """
+    Escreve uma nova versão e a torna a versão atual.
+    particoes_novas: mês -> coluna -> array numpy; meses_reaproveitados: meses copiados (hard link) da versão atual.
+    arquivos_parquet: caminho relativo ao diretório parquet (ex: <tabela>/<arquivo>.parquet) -> arquivo já escrito, que
+    é movido para a versão; nesse caso, os Parquet dos meses reaproveitados também são copiados da versão atual.
+    """
+    nome_atual = versao_atual()
+    nome_versao = f"{time.strftime('%Y%m%d%H%M%S')}_{os.getpid()}"
+    caminho = caminho_versao(nome_versao)
+    caminho_tmp = f"{caminho}.tmp"
+    os.makedirs(caminho_tmp)
+
+    # Meses que não mudaram
+    for mes in meses_reaproveitados:
+        reaproveita_arquivo(
+            os.path.join(caminho_versao(nome_atual), f"viagens_{mes}.arrow"),
+            os.path.join(caminho_tmp, f"viagens_{mes}.arrow"),
+        )
+        # (os meses sem viagens não têm Parquet)
+        nome_arquivo = os.path.join("parquet", TABELA_VIAGENS, f"viagens_{mes}.parquet")
+        if arquivos_parquet is not None and os.path.exists(os.path.join(caminho_versao(nome_atual), nome_arquivo)):
+            reaproveita_arquivo(
+                os.path.join(caminho_versao(nome_atual), nome_arquivo), os.path.join(caminho_tmp, nome_arquivo)
+            )
+
+    for caminho_relativo, arquivo in (arquivos_parquet or {}).items():
+        destino = os.path.join(caminho_tmp, "parquet", caminho_relativo)
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        shutil.move(arquivo, destino)
+
+    for mes, arrays in particoes_novas.items():
+        escreve_tabela(os.path.join(caminho_tmp, f"viagens_{mes}.arrow"), pa.table(arrays))
+
+    for coluna, valores in categorias.items():
+        tabela = pa.table({"valor": pa.array(list(valores), type=pa.string())})
+        escreve_tabela(os.path.join(caminho_tmp, f"categorias_{coluna}.arrow"), tabela)
+
+    manifesto = {
+        **manifesto,
+        "criado_em": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "particoes": sorted([*meses_reaproveitados, *particoes_novas]),
+        "colunas_texto": list(categorias),
+        "parquet": arquivos_parquet is not None,
+    }
+    with open(os.path.join(caminho_tmp, "manifesto.json"), "w") as f:
+        json.dump(manifesto, f)
+
+    # Publica a versão: renomeia o diretório e troca o ponteiro de forma atômica
+    os.rename(caminho_tmp, caminho)
+    ponteiro_tmp = os.path.join(SNAPSHOT_VIAGENS_DIR, f"{ARQUIVO_VERSAO_ATUAL}.{os.getpid()}.tmp")
+    with open(ponteiro_tmp, "w") as f:
+        f.write(nome_versao)
+    os.replace(ponteiro_tmp, os.path.join(SNAPSHOT_VIAGENS_DIR, ARQUIVO_VERSAO_ATUAL))
+
+    # Mantém somente a versão nova e a anterior
+    for nome in os.listdir(os.path.join(SNAPSHOT_VIAGENS_DIR, "versoes")):
+        if nome not in (nome_versao, nome_atual):
+            shutil.rmtree(caminho_versao(nome), ignore_errors=True)
+
+    return nome_versao
+
+
+if __name__ == "__main__":
+    # Exportação do snapshot (ex: via cron)
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+    from db import PostgresSingleton
+    from modules.viagens_memoria_service import exporta_snapshot
+
+    pgEngine = PostgresSingleton.get_instance().get_engine()
+    nome_versao = exporta_snapshot(pgEngine)
+    print(f"Snapshot das viagens exportado: {nome_versao}")
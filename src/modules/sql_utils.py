@@ -3,6 +3,53 @@
 
 # Funções utilitárias para construção das queries SQL
 
+# Imports básicos
+import re
+
+import pandas as pd
+
+# Imports BD
+from sqlalchemy.sql import text
+
+
+# Executa uma query parametrizada (bind params no formato :nome) e retorna um DataFrame
+# Como o texto SQL não muda entre chamadas, o Postgres consegue reutilizar o plano (prepared statements)
+def le_sql(query, dbEngine, params=None, **kwargs):
+    if dbEngine.dialect.name == "duckdb":
+        query = adapta_sql_duckdb(query)
+
+    return pd.read_sql(text(query), dbEngine, params=params or {}, **kwargs)
+
+
+# Executa a query e retorna os resultados em lotes (DataFrames), usando um cursor no servidor (stream_results)
+# A conexão fica aberta até o gerador ser consumido (ex: durante o envio de uma exportação)
+def le_sql_lotes(query, dbEngine, params=None, tamanho_lote=10000):
+    if dbEngine.dialect.name == "duckdb":
+        query = adapta_sql_duckdb(query)
+
+    with dbEngine.connect() as conn:
+        conn = conn.execution_options(stream_results=True, max_row_buffer=tamanho_lote)
+        for df in pd.read_sql(text(query), conn, params=params or {}, chunksize=tamanho_lote):
+            yield df
+
+
+# O DuckDB não aceita "coluna = ANY(:param)" com uma lista; o equivalente é list_contains(:param, coluna)
+ANY_PARAM_REGEX = re.compile(r'([\w."]+)\s*=\s*ANY\(:(\w+)\)')
+
+
+def adapta_sql_duckdb(query):
+    return ANY_PARAM_REGEX.sub(r"list_contains(:\2, \1)", query)
+
+
+# Versão parametrizada das subqueries IN: gera "AND coluna = ANY(:param)" e o dicionário de parâmetros
+# A lista é enviada como array, então o texto da query é o mesmo para qualquer quantidade de itens
+def filtro_lista_param(coluna, lista, nome_param, prefix="", termo_all=None):
+    if not lista or (termo_all is not None and termo_all in lista):
+        return "", {}
+
+    return f"AND {prefix}{coluna} = ANY(:{nome_param})", {nome_param: list(lista)}
+
+
 
 # Subqueries para filtrar as oficinas, seções e ordens de serviço quando TODAS não for selecionado
 def subquery_oficinas(lista_oficinas, prefix="", termo_all="TODAS"):
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Store no servidor para os DataFrames das páginas
+#
+# Em vez de enviar o DataFrame inteiro para o navegador (dcc.Store + to_dict), o callback salva o DataFrame aqui e o
+# navegador guarda apenas o identificador (handle). Os dados ficam:
+#   - em memória (LRU limitado por STORE_SERVIDOR_MEMORIA_MAX_MB), com os tipos (ex: datas) preservados;
+#   - em disco (Parquet, em STORE_SERVIDOR_DIR), para que os demais workers do gunicorn encontrem o mesmo handle.
+# Os itens expiram após STORE_SERVIDOR_TTL_SEGUNDOS sem uso. Como um handle pode expirar, quem o usa deve saber
+# recalcular os dados (ex: guardando também o filtro no navegador).
+
+# Imports básicos
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# Imports auxiliares
+from modules.cache_utils import estima_tamanho
+from modules.cache_backend_utils import df_para_bytes, bytes_para_df
+
+# Configurações
+STORE_SERVIDOR_DIR = os.getenv("STORE_SERVIDOR_DIR", os.path.join(tempfile.gettempdir(), "ra_dash_combustivel_store"))
+STORE_SERVIDOR_MEMORIA_MAX_MB = float(os.getenv("STORE_SERVIDOR_MEMORIA_MAX_MB", 128))
+STORE_SERVIDOR_DISCO_MAX_MB = float(os.getenv("STORE_SERVIDOR_DISCO_MAX_MB", 1024))
+STORE_SERVIDOR_TTL_SEGUNDOS = int(os.getenv("STORE_SERVIDOR_TTL_SEGUNDOS", 4 * 60 * 60))
+
+# Intervalo mínimo entre as limpezas do diretório
+STORE_SERVIDOR_LIMPEZA_SEGUNDOS = 60
+
+# Os handles são uuid4 (hex); validamos antes de usá-los como nome de arquivo
+HANDLE_REGEX = re.compile(r"^[0-9a-f]{32}$")
+
+
+class StoreServidor:
+    """Store de DataFrames indexado por handle (memória + disco compartilhado entre os workers)"""
+
+    def __init__(self, diretorio, memoria_max_bytes, disco_max_bytes, ttl):
+        self.diretorio = diretorio
+        self.memoria_max_bytes = memoria_max_bytes
+        self.disco_max_bytes = disco_max_bytes
+        self.ttl = ttl
+        self.memoria_usada_bytes = 0
+
+        self.__entradas = OrderedDict()  # handle -> (usado_em, tamanho, DataFrame)
+        self.__lock = threading.Lock()
+        self.__limpo_em = 0
+
+    def __caminho(self, handle):
+        return os.path.join(self.diretorio, f"{handle}.parquet")
+
+    def __guarda_memoria(self, handle, df):
+        tamanho = estima_tamanho(df)
+        if tamanho > self.memoria_max_bytes:
+            return
+
+        with self.__lock:
+            entrada = self.__entradas.pop(handle, None)
+            if entrada is not None:
+                self.memoria_usada_bytes -= entrada[1]
+
+            self.__entradas[handle] = (time.monotonic(), tamanho, df)
+            self.memoria_usada_bytes += tamanho
+
+            # Remove os itens usados há mais tempo até caber no orçamento
+            while self.memoria_usada_bytes > self.memoria_max_bytes:
+                _, (_, tamanho_antigo, _) = self.__entradas.popitem(last=False)
+                self.memoria_usada_bytes -= tamanho_antigo
+
+    def __limpa_disco(self):
+        """Remove os arquivos expirados e, se necessário, os mais antigos até caber no orçamento"""
+        agora = time.time()
+        if agora - self.__limpo_em < STORE_SERVIDOR_LIMPEZA_SEGUNDOS:
+            return
+        self.__limpo_em = agora
+
+        try:
+            arquivos = []
+            for nome in os.listdir(self.diretorio):
+                caminho = os.path.join(self.diretorio, nome)
+                try:
+                    info = os.stat(caminho)
+                except FileNotFoundError:
+                    continue
+
+                if agora - info.st_mtime > self.ttl:
+                    os.remove(caminho)
+                else:
+                    arquivos.append((info.st_mtime, info.st_size, caminho))
+
+            tamanho_total = sum(tamanho for _, tamanho, _ in arquivos)
+            for _, tamanho, caminho in sorted(arquivos):
+                if tamanho_total <= self.disco_max_bytes:
+                    break
+                os.remove(caminho)
+                tamanho_total -= tamanho
+        except Exception as e:
+            print(f"Erro ao limpar o store do servidor: {e}")
+
+    def salvar(self, df):
+        """Salva o DataFrame e retorna o handle"""
+        handle = uuid.uuid4().hex
+        self.__guarda_memoria(handle, df)
+
+        try:
+            os.makedirs(self.diretorio, exist_ok=True)
+
+            # Escreve em um arquivo temporário e renomeia (evita que outro worker leia um arquivo incompleto)
+            caminho_tmp = f"{self.__caminho(handle)}.{os.getpid()}.tmp"
+            with open(caminho_tmp, "wb") as f:
+                f.write(df_para_bytes(df))
+            os.replace(caminho_tmp, self.__caminho(handle))
+        except Exception as e:
+            print(f"Erro ao salvar no store do servidor: {e}")
+
+        self.__limpa_disco()
+        return handle
+
+    def obter(self, handle):
+        """Retorna uma cópia do DataFrame do handle (ou None se não existir ou tiver expirado)"""
+        if not isinstance(handle, str) or not HANDLE_REGEX.match(handle):
+            return None
+
+        with self.__lock:
+            entrada = self.__entradas.get(handle)
+            if entrada is not None:
+                usado_em, tamanho, df = entrada
+                if time.monotonic() - usado_em <= self.ttl:
+                    self.__entradas[handle] = (time.monotonic(), tamanho, df)
+                    self.__entradas.move_to_end(handle)
+                    return df.copy()
+
+                self.__entradas.pop(handle)
+                self.memoria_usada_bytes -= tamanho
+
+        # Tenta o disco (o handle pode ter sido criado por outro worker)
+        caminho = self.__caminho(handle)
+        try:
+            if time.time() - os.path.getmtime(caminho) > self.ttl:
+                return None
+
+            with open(caminho, "rb") as f:
+                df = bytes_para_df(f.read())
+
+            # Renova a validade do arquivo
+            os.utime(caminho)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Erro ao ler o store do servidor: {e}")
+            return None
+
+        self.__guarda_memoria(handle, df)
+        return df.copy()
+
+
+# Instância única (por processo)
+store_servidor = StoreServidor(
+    STORE_SERVIDOR_DIR,
+    int(STORE_SERVIDOR_MEMORIA_MAX_MB * 1024**2),
+    int(STORE_SERVIDOR_DISCO_MAX_MB * 1024**2),
+    STORE_SERVIDOR_TTL_SEGUNDOS,
+)
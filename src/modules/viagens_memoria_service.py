@@ -0,0 +1,680 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Store colunar (em memória) com as viagens, usado pelos serviços das páginas no lugar do Postgres
+#
+# As páginas consultam repetidamente o mesmo período recente de rmtc_viagens_analise_mix. Com VIAGENS_MEMORIA_HABILITADO,
+# os serviços filtram e agregam as viagens em arrays numpy (um array por coluna; os textos, como modelo, linha, sentido,
+# status e motorista, codificados por dicionário). Filtros que não podem ser respondidos (ou enquanto a primeira carga
+# não termina) continuam sendo respondidos pelo banco. As viagens vêm de uma das fontes (VIAGENS_MEMORIA_FONTE):
+#   - banco: cada worker lê os últimos VIAGENS_MEMORIA_DIAS dias. A carga é incremental pelo watermark do dia: a cada
+#     VIAGENS_MEMORIA_ATUALIZACAO_SEGUNDOS, os dias a partir do último dia carregado (menos ROLLUP_DIAS_REPROCESSAR, que
+#     ainda podem mudar) são relidos em segundo plano e os dias que saíram da janela são descartados;
+#   - snapshot: todo o histórico, exportado em arquivos Arrow (um por mês, ver snapshot_viagens.py) e mapeado em
+#     memória (mmap) por todos os workers. Os arrays são lidos sem cópia, então existe uma única cópia física (no page
+#     cache) para todos os workers. O snapshot é atualizado pelo comando de exportação (ex: via cron).
+#
+# Cada atualização monta uma nova versão (partições + dicionários) e troca a referência, então as leituras nunca veem
+# dados parciais.
+
+# Imports básicos
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+# Imports BD
+from sqlalchemy.sql import text
+
+# Imports auxiliares
+from modules.cache_utils import cache_resultados
+from modules.filtro_utils import NUM_MIN_VIAGENS_PARA_CLASSIFICAR
+from modules.rollup.rollup_service import ROLLUP_DIAS_REPROCESSAR
+from modules import snapshot_viagens
+from modules.duckdb_service import VIAGENS_MOTOR_DUCKDB, exporta_parquet_motoristas, exporta_parquet_viagens
+
+# Configurações
+VIAGENS_MEMORIA_HABILITADO = os.getenv("VIAGENS_MEMORIA_HABILITADO", "False").lower() in ("true", "1")
+VIAGENS_MEMORIA_FONTE = os.getenv("VIAGENS_MEMORIA_FONTE", "banco").lower()
+VIAGENS_MEMORIA_DIAS = int(os.getenv("VIAGENS_MEMORIA_DIAS", 90))
+VIAGENS_MEMORIA_ATUALIZACAO_SEGUNDOS = int(os.getenv("VIAGENS_MEMORIA_ATUALIZACAO_SEGUNDOS", 10 * 60))
+
+# Colunas de texto (codificadas por dicionário) e numéricas
+COLUNAS_TEXTO = [
+    "vec_num_id",
+    "vec_model",
+    "encontrou_numero_linha",
+    "encontrou_sentido_linha",
+    "time_slot",
+    "analise_status_90_dias",
+    "DriverId",
+    "nome_motorista",
+]
+COLUNAS_NUMERICAS = [
+    "km_por_litro",
+    "analise_num_amostras_90_dias",
+    "analise_diff_mediana_90_dias",
+    "total_comb_l",
+    "tamanho_linha_km",
+    "velocidade_kmh",
+    "litros_excedentes",
+]
+
+# Status usados nas agregações
+STATUS_BAIXA_PERFORMANCE_2_STD = "BAIXA PERFOMANCE (<= 2 STD)"
+STATUS_BAIXA_PERFORMANCE = (STATUS_BAIXA_PERFORMANCE_2_STD, "BAIXA PERFORMANCE (<= 1.5 STD)")
+STATUS_ERRO_TELEMETRIA = "ERRO TELEMETRIA (>= 2.0 STD)"
+
+# Leitura das viagens do período [dia_inicio, dia_fim)
+QUERY_VIAGENS = """
+    SELECT
+        CAST(r."dia" AS date) AS dia,
+        r.dia_numerico,
+        r.dia_eh_feriado,
+        r.vec_num_id::text AS vec_num_id,
+        r.vec_model,
+        r.encontrou_numero_linha::text AS encontrou_numero_linha,
+        r.encontrou_sentido_linha::text AS encontrou_sentido_linha,
+        r.time_slot::text AS time_slot,
+        r.analise_status_90_dias,
+        r."DriverId"::text AS "DriverId",
+        m."Name" AS nome_motorista,
+        r.km_por_litro,
+        r.analise_num_amostras_90_dias,
+        r.analise_diff_mediana_90_dias,
+        r.total_comb_l,
+        r.tamanho_linha_km,
+        3600 * (r.tamanho_linha_km_sobreposicao / NULLIF(r.encontrou_tempo_viagem_segundos, 0)) AS velocidade_kmh,
+        ABS(r.total_comb_l - (r.tamanho_linha_km_sobreposicao / r.analise_valor_mediana_90_dias)) AS litros_excedentes
+    FROM
+        rmtc_viagens_analise_mix r
+    LEFT JOIN
+        motoristas_api m
+        ON r."DriverId" = m."DriverId"
+    WHERE
+        r.encontrou_linha = true
+        AND CAST(r."dia" AS date) >= CAST(:dia_inicio AS date)
+        AND CAST(r."dia" AS date) < CAST(:dia_fim AS date)
+    ORDER BY
+        1
+"""
+
+
+def le_viagens(conn, dia_inicio, dia_fim):
+    """Lê as viagens do período [dia_inicio, dia_fim) (datas YYYY-MM-DD)"""
+    return pd.read_sql(text(QUERY_VIAGENS), conn, params={"dia_inicio": str(dia_inicio), "dia_fim": str(dia_fim)})
+
+
+def categorias_vazias():
+    return {coluna: np.array([], dtype=object) for coluna in COLUNAS_TEXTO}
+
+
+def codifica(valores, categorias):
+    """
+    Codifica os valores pelo dicionário (categorias), acrescentando os valores novos ao final.
+    Retorna os códigos (int32, -1 para nulos) e o dicionário atualizado.
+    """
+    valores = pd.Series(valores, dtype=object)
+    codigos = pd.Index(categorias).get_indexer(valores)
+
+    novos = valores[(codigos == -1) & valores.notna()].unique()
+    if len(novos) > 0:
+        categorias = np.concatenate([categorias, np.asarray(novos, dtype=object)])
+        codigos = pd.Index(categorias).get_indexer(valores)
+
+    return codigos.astype(np.int32), categorias
+
+
+class ColunasViagens:
+    """Partição imutável das viagens em memória (ordenada por dia); os códigos referem-se aos dicionários da versão"""
+
+    __slots__ = ("dias", "dia_numerico", "dia_eh_feriado", "codigos", "numericas")
+
+    def __init__(self, dias, dia_numerico, dia_eh_feriado, codigos, numericas):
+        self.dias = dias
+        self.dia_numerico = dia_numerico
+        self.dia_eh_feriado = dia_eh_feriado
+        self.codigos = codigos
+        self.numericas = numericas
+
+    @classmethod
+    def vazia(cls):
+        return cls(
+            np.array([], dtype="datetime64[D]"),
+            np.array([], dtype=np.int8),
+            np.array([], dtype=bool),
+            {coluna: np.array([], dtype=np.int32) for coluna in COLUNAS_TEXTO},
+            {coluna: np.array([], dtype=float) for coluna in COLUNAS_NUMERICAS},
+        )
+
+    @classmethod
+    def de_df(cls, df, categorias):
+        """Cria a partição a partir das viagens lidas (le_viagens); retorna a partição e os dicionários atualizados"""
+        categorias = dict(categorias)
+        codigos = {}
+        for coluna in COLUNAS_TEXTO:
+            codigos[coluna], categorias[coluna] = codifica(df[coluna], categorias[coluna])
+
+        particao = cls(
+            pd.to_datetime(df["dia"]).to_numpy().astype("datetime64[D]"),
+            df["dia_numerico"].fillna(0).to_numpy(dtype=np.int8),
+            df["dia_eh_feriado"].fillna(False).to_numpy(dtype=bool),
+            codigos,
+            {coluna: df[coluna].astype(float).to_numpy() for coluna in COLUNAS_NUMERICAS},
+        )
+        return particao, categorias
+
+    @classmethod
+    def concatena(cls, particoes):
+        return cls(
+            np.concatenate([p.dias for p in particoes]),
+            np.concatenate([p.dia_numerico for p in particoes]),
+            np.concatenate([p.dia_eh_feriado for p in particoes]),
+            {coluna: np.concatenate([p.codigos[coluna] for p in particoes]) for coluna in COLUNAS_TEXTO},
+            {coluna: np.concatenate([p.numericas[coluna] for p in particoes]) for coluna in COLUNAS_NUMERICAS},
+        )
+
+    def seleciona_linhas(self, mascara):
+        return ColunasViagens(
+            self.dias[mascara],
+            self.dia_numerico[mascara],
+            self.dia_eh_feriado[mascara],
+            {coluna: valores[mascara] for coluna, valores in self.codigos.items()},
+            {coluna: valores[mascara] for coluna, valores in self.numericas.items()},
+        )
+
+    def para_arrays(self):
+        """Arrays da partição com tipos de tamanho fixo e sem nulos (lidos sem cópia a partir do snapshot)"""
+        return {
+            "dia": self.dias.astype(np.int64),
+            "dia_numerico": self.dia_numerico,
+            "dia_eh_feriado": self.dia_eh_feriado.astype(np.uint8),
+            **self.codigos,
+            **self.numericas,
+        }
+
+    @classmethod
+    def de_arrays(cls, arrays):
+        """Inverso de para_arrays (somente views, sem cópia)"""
+        return cls(
+            arrays["dia"].view("datetime64[D]"),
+            arrays["dia_numerico"],
+            arrays["dia_eh_feriado"].view(bool),
+            {coluna: arrays[coluna] for coluna in COLUNAS_TEXTO},
+            {coluna: arrays[coluna] for coluna in COLUNAS_NUMERICAS},
+        )
+
+    @property
+    def ultimo_dia(self):
+        return self.dias[-1] if len(self.dias) else None
+
+    def nbytes(self):
+        arrays = [self.dias, self.dia_numerico, self.dia_eh_feriado, *self.codigos.values(), *self.numericas.values()]
+        return sum(array.nbytes for array in arrays)
+
+    def mascara(self, filtro, codigos_filtro, usa_num_min_viagens=True):
+        """
+        Retorna o intervalo (inicio, fim) das linhas do período do filtro e a máscara dos demais filtros.
+        codigos_filtro: códigos (do dicionário) dos valores de cada coluna filtrada.
+        """
+        # As linhas estão ordenadas por dia: o período é um intervalo contíguo
+        inicio = int(np.searchsorted(self.dias, np.datetime64(filtro.data_inicio, "D"), side="left"))
+        fim = int(np.searchsorted(self.dias, np.datetime64(filtro.data_fim, "D"), side="right"))
+        mascara = np.ones(fim - inicio, dtype=bool)
+
+        km_por_litro = self.numericas["km_por_litro"][inicio:fim]
+        if usa_num_min_viagens:
+            mascara &= self.numericas["analise_num_amostras_90_dias"][inicio:fim] >= NUM_MIN_VIAGENS_PARA_CLASSIFICAR
+        if filtro.km_l_min is not None:
+            mascara &= km_por_litro >= filtro.km_l_min
+        if filtro.km_l_max is not None:
+            mascara &= km_por_litro <= filtro.km_l_max
+
+        for coluna, codigos in codigos_filtro.items():
+            mascara &= np.isin(self.codigos[coluna][inicio:fim], codigos)
+
+        if filtro.dias_marcados:
+            # Mesma regra de subquery_lista_dia_marcado (dias marcados combinados com OR)
+            dia_numerico = self.dia_numerico[inicio:fim]
+            mascara_dias = np.zeros(fim - inicio, dtype=bool)
+            for dia_marcado in filtro.dias_marcados:
+                if "SEG_SEX" in dia_marcado:
+                    mascara_dias |= (dia_numerico >= 2) & (dia_numerico <= 6)
+                elif "SABADO" in dia_marcado:
+                    mascara_dias |= dia_numerico == 7
+                elif "DOMINGO" in dia_marcado:
+                    mascara_dias |= dia_numerico == 1
+                elif "FERIADO" in dia_marcado:
+                    mascara_dias |= self.dia_eh_feriado[inicio:fim]
+            mascara &= mascara_dias
+
+        return inicio, fim, mascara
+
+
+class VersaoViagens:
+    """
+    Versão imutável do store: partições (ordenadas por dia), os dicionários das colunas de texto e o período coberto
+    (primeiro_dia e ultimo_dia; NaT se não houver viagens)
+    """
+
+    __slots__ = ("particoes", "categorias", "primeiro_dia", "ultimo_dia", "origem")
+
+    def __init__(self, particoes, categorias, primeiro_dia, ultimo_dia, origem=None):
+        self.particoes = particoes
+        self.categorias = categorias
+        self.primeiro_dia = primeiro_dia
+        self.ultimo_dia = ultimo_dia
+        self.origem = origem
+
+    @property
+    def total_viagens(self):
+        return sum(len(particao.dias) for particao in self.particoes)
+
+    def nbytes(self):
+        return sum(particao.nbytes() for particao in self.particoes)
+
+    def codigos_dos_valores(self, coluna, valores):
+        """Códigos do dicionário da coluna correspondentes aos valores (valores inexistentes são ignorados)"""
+        codigos = pd.Index(self.categorias[coluna]).get_indexer(pd.Series(list(valores), dtype=object))
+        return codigos[codigos >= 0]
+
+    def extrai(self, filtro, colunas, usa_num_min_viagens=True):
+        """Retorna os arrays (códigos para as colunas de texto) das colunas pedidas, somente das viagens do filtro"""
+        codigos_filtro = {}
+        for coluna, valores in [
+            ("vec_num_id", None if filtro.vec_num_id is None else (filtro.vec_num_id,)),
+            ("vec_model", filtro.modelos),
+            ("encontrou_numero_linha", filtro.linhas),
+            ("encontrou_sentido_linha", filtro.sentidos),
+        ]:
+            if valores is not None:
+                codigos_filtro[coluna] = self.codigos_dos_valores(coluna, valores)
+
+        data_inicio = np.datetime64(filtro.data_inicio, "D")
+        data_fim = np.datetime64(filtro.data_fim, "D")
+
+        partes = {coluna: [] for coluna in colunas}
+        for particao in self.particoes:
+            # Ignora as partições fora do período
+            if len(particao.dias) == 0 or particao.dias[0] > data_fim or particao.dias[-1] < data_inicio:
+                continue
+
+            inicio, fim, mascara = particao.mascara(filtro, codigos_filtro, usa_num_min_viagens)
+            for coluna in colunas:
+                if coluna == "dia":
+                    valores = particao.dias
+                elif coluna in particao.codigos:
+                    valores = particao.codigos[coluna]
+                else:
+                    valores = particao.numericas[coluna]
+                partes[coluna].append(valores[inicio:fim][mascara])
+
+        vazia = ColunasViagens.vazia()
+        arrays_vazios = {"dia": vazia.dias, **vazia.codigos, **vazia.numericas}
+        return {
+            coluna: np.concatenate(partes[coluna]) if partes[coluna] else arrays_vazios[coluna] for coluna in colunas
+        }
+
+
+class ViagensMemoriaService:
+    """
+    Singleton com as viagens em memória (colunar)
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls, *args, **kwargs):
+        """
+        Cria ou retorna uma instância do singleton
+        """
+        with cls._lock:  # Garante thead safety
+            if cls._instance is None:
+                cls._instance = super(ViagensMemoriaService, cls).__new__(cls)
+                cls._instance._initialize(*args, **kwargs)
+        return cls._instance
+
+    def _initialize(self, dbEngine):
+        """
+        Inicializa o serviço (as viagens são carregadas no primeiro acesso)
+        """
+        if hasattr(self, "_initialized") and self._initialized:
+            return
+
+        self.dbEngine = dbEngine
+        self._versao = None
+        self._carregado_em = None
+        self._atualizando = False
+        self._lock_atualizacao = threading.Lock()
+        self._initialized = True
+
+    @classmethod
+    def get_instance(cls, dbEngine):
+        """
+        Retorna a singleton
+        """
+        return cls(dbEngine)
+
+    def __atualiza_do_banco(self):
+        """Lê as viagens novas (e os últimos dias, que podem ter mudado) e retorna a nova versão"""
+        hoje = pd.Timestamp.today().normalize()
+        primeiro_dia = np.datetime64((hoje - pd.Timedelta(days=VIAGENS_MEMORIA_DIAS)).date(), "D")
+        dia_fim = np.datetime64((hoje + pd.Timedelta(days=2)).date(), "D")
+
+        versao = self._versao
+        if versao is None or versao.origem != "banco":
+            versao = VersaoViagens(
+                [ColunasViagens.vazia()], categorias_vazias(), primeiro_dia, np.datetime64("NaT", "D"), "banco"
+            )
+
+        particao = versao.particoes[0]
+        dia_inicio = primeiro_dia
+        if particao.ultimo_dia is not None:
+            dia_inicio = max(primeiro_dia, particao.ultimo_dia - np.timedelta64(ROLLUP_DIAS_REPROCESSAR, "D"))
+
+        with self.dbEngine.connect() as conn:
+            df = le_viagens(conn, dia_inicio, dia_fim)
+
+        # Mantém os dias antigos ainda dentro da janela e acrescenta os dias relidos
+        particao_nova, categorias = ColunasViagens.de_df(df, versao.categorias)
+        particao_antiga = particao.seleciona_linhas((particao.dias >= primeiro_dia) & (particao.dias < dia_inicio))
+
+        particao = ColunasViagens.concatena([particao_antiga, particao_nova])
+        ultimo_dia = particao.ultimo_dia if particao.ultimo_dia is not None else np.datetime64("NaT", "D")
+
+        return VersaoViagens([particao], categorias, primeiro_dia, ultimo_dia, "banco")
+
+    def __atualiza_do_snapshot(self):
+        """
+        Mapeia a versão atual do snapshot (somente se for diferente da versão em memória).
+        Retorna None (as consultas vão para o banco) se não houver snapshot ou se ele estiver desatualizado.
+        """
+        nome_versao = snapshot_viagens.versao_atual()
+        if nome_versao is None:
+            return None
+
+        # Snapshot mais antigo que as viagens no banco (ex: exportação parada): não é usado
+        manifesto = snapshot_viagens.le_manifesto(nome_versao)
+        ultimo_dia_viagens = cache_resultados.get_watermark(self.dbEngine)
+        if manifesto.get("ultimo_dia") and ultimo_dia_viagens is not None:
+            if pd.to_datetime(manifesto["ultimo_dia"]) < pd.to_datetime(ultimo_dia_viagens).normalize():
+                print(
+                    f"Snapshot das viagens {nome_versao} desatualizado (até {manifesto['ultimo_dia']}, banco até "
+                    f"{ultimo_dia_viagens}): consultas respondidas pelo banco"
+                )
+                return None
+
+        if self._versao is not None and self._versao.origem == nome_versao:
+            return self._versao
+
+        arrays_particoes, categorias = snapshot_viagens.le_versao(nome_versao)
+        particoes = [ColunasViagens.de_arrays(arrays_particoes[mes]) for mes in sorted(arrays_particoes)]
+        particoes = [particao for particao in particoes if len(particao.dias) > 0]
+        primeiro_dia = particoes[0].dias[0] if particoes else np.datetime64("NaT", "D")
+
+        # Último dia exportado (manifesto) ou, nos snapshots antigos, o último dia da última partição
+        if manifesto.get("ultimo_dia"):
+            ultimo_dia = np.datetime64(manifesto["ultimo_dia"], "D")
+        else:
+            ultimo_dia = particoes[-1].dias[-1] if particoes else np.datetime64("NaT", "D")
+
+        return VersaoViagens(particoes, categorias, primeiro_dia, ultimo_dia, nome_versao)
+
+    def atualizar(self):
+        """Atualiza a versão em memória a partir da fonte configurada"""
+        if VIAGENS_MEMORIA_FONTE == "snapshot":
+            versao = self.__atualiza_do_snapshot()
+        else:
+            versao = self.__atualiza_do_banco()
+
+        if versao is not None and versao is not self._versao:
+            print(
+                f"Viagens em memória ({VIAGENS_MEMORIA_FONTE}): {versao.total_viagens} viagens desde "
+                f"{versao.primeiro_dia} até {versao.ultimo_dia} ({versao.nbytes() / 1024**2:.1f} MB)"
+            )
+
+        self._versao = versao
+        self._carregado_em = time.time()
+
+    def __atualiza_em_segundo_plano(self):
+        with self._lock_atualizacao:
+            if self._atualizando:
+                return
+            self._atualizando = True
+
+        def atualiza():
+            try:
+                self.atualizar()
+            except Exception as e:
+                print(f"Erro ao atualizar as viagens em memória: {e}")
+            finally:
+                with self._lock_atualizacao:
+                    self._atualizando = False
+
+        threading.Thread(target=atualiza, name="viagens-memoria", daemon=True).start()
+
+    def get_versao(self, filtro):
+        """
+        Retorna a versão atual se o filtro puder ser respondido em memória (ou None).
+        O primeiro acesso e as versões antigas disparam a atualização em segundo plano.
+        """
+        if not VIAGENS_MEMORIA_HABILITADO:
+            return None
+
+        if self._carregado_em is None or time.time() - self._carregado_em > VIAGENS_MEMORIA_ATUALIZACAO_SEGUNDOS:
+            self.__atualiza_em_segundo_plano()
+
+        versao = self._versao
+        if versao is None or filtro.data_inicio is None or filtro.data_fim is None:
+            return None
+
+        # O período precisa estar dentro das viagens em memória
+        if np.isnat(versao.primeiro_dia) or np.datetime64(filtro.data_inicio, "D") < versao.primeiro_dia:
+            return None
+
+        # E a versão precisa chegar até o fim do período (ou até o último dia existente nas viagens)
+        if np.isnat(versao.ultimo_dia) or versao.ultimo_dia < self.__dia_fim_necessario(filtro):
+            return None
+
+        return versao
+
+    def __dia_fim_necessario(self, filtro):
+        """Retorna min(data_fim, último dia das viagens no banco), a mesma regra de RollupService.pode_responder"""
+        data_fim = np.datetime64(filtro.data_fim, "D")
+
+        # Mesmo watermark usado como chave do cache dos resultados
+        ultimo_dia_viagens = cache_resultados.get_watermark(self.dbEngine)
+        if ultimo_dia_viagens is None:
+            return data_fim
+
+        return min(data_fim, np.datetime64(pd.to_datetime(ultimo_dia_viagens).date(), "D"))
+
+    def seleciona(self, filtro, colunas_saida, usa_num_min_viagens=True):
+        """
+        Retorna as viagens do filtro (somente as colunas pedidas; textos como Categorical), ou None caso o filtro não
+        possa ser respondido em memória
+        """
+        versao = self.get_versao(filtro)
+        if versao is None:
+            return None
+
+        arrays = versao.extrai(filtro, colunas_saida, usa_num_min_viagens)
+
+        dados = {}
+        for coluna in colunas_saida:
+            if coluna in versao.categorias:
+                dados[coluna] = pd.Categorical.from_codes(arrays[coluna], categories=pd.Index(versao.categorias[coluna]))
+            else:
+                dados[coluna] = arrays[coluna]
+
+        return pd.DataFrame(dados, columns=list(colunas_saida))
+
+    def agrega(self, filtro, chaves, usa_num_min_viagens=True):
+        """
+        Agrega as viagens do filtro por chaves (colunas de texto; lista vazia = total geral), com as mesmas medidas
+        das consultas das páginas. Retorna None caso o filtro não possa ser respondido em memória.
+        """
+        versao = self.get_versao(filtro)
+        if versao is None:
+            return None
+
+        colunas = list(
+            dict.fromkeys(
+                [
+                    *chaves,
+                    "km_por_litro",
+                    "tamanho_linha_km",
+                    "velocidade_kmh",
+                    "analise_diff_mediana_90_dias",
+                    "analise_status_90_dias",
+                    "total_comb_l",
+                    "litros_excedentes",
+                    "vec_num_id",
+                    "vec_model",
+                ]
+            )
+        )
+        arrays = versao.extrai(filtro, colunas, usa_num_min_viagens)
+
+        def codigos_ou_nulo(coluna):
+            # Códigos com nulos como NaN (não contam como distintos)
+            return np.where(arrays[coluna] >= 0, arrays[coluna], np.nan)
+
+        status = arrays["analise_status_90_dias"]
+        eh_baixa = np.isin(status, versao.codigos_dos_valores("analise_status_90_dias", STATUS_BAIXA_PERFORMANCE))
+        eh_baixa_2_std = np.isin(
+            status, versao.codigos_dos_valores("analise_status_90_dias", [STATUS_BAIXA_PERFORMANCE_2_STD])
+        )
+        eh_erro = np.isin(status, versao.codigos_dos_valores("analise_status_90_dias", [STATUS_ERRO_TELEMETRIA]))
+        litros_excedentes = arrays["litros_excedentes"]
+
+        df = pd.DataFrame(
+            {
+                **{f"_codigo_{chave}": arrays[chave] for chave in chaves},
+                "km_por_litro": arrays["km_por_litro"],
+                "tamanho_linha_km": arrays["tamanho_linha_km"],
+                "velocidade_kmh": arrays["velocidade_kmh"],
+                "abaixo_mediana": arrays["analise_diff_mediana_90_dias"] < 0,
+                "baixa_perfomance": eh_baixa,
+                "erro_telemetria": eh_erro,
+                "total_comb_l": arrays["total_comb_l"],
+                "litros_excedentes": litros_excedentes,
+                "litros_excedentes_baixa_perfomance": np.where(eh_baixa_2_std, litros_excedentes, np.nan),
+                "veiculo": codigos_ou_nulo("vec_num_id"),
+                "modelo": codigos_ou_nulo("vec_model"),
+            }
+        )
+
+        colunas_grupo = [f"_codigo_{chave}" for chave in chaves]
+        if not colunas_grupo:
+            df["_todos"] = 0
+            colunas_grupo = ["_todos"]
+
+        def soma_sql(serie):
+            # Como o SUM do SQL: nulo (NaN) quando o grupo não tem nenhum valor
+            return serie.sum(min_count=1)
+
+        df_agg = df.groupby(colunas_grupo, sort=False).agg(
+            total_viagens=("km_por_litro", "size"),
+            media_km_por_litro=("km_por_litro", "mean"),
+            media_tam_linha=("tamanho_linha_km", "mean"),
+            velocidade_media_kmh=("velocidade_kmh", "mean"),
+            total_abaixo_mediana=("abaixo_mediana", "sum"),
+            total_baixa_perfomance=("baixa_perfomance", "sum"),
+            total_erro_telemetria=("erro_telemetria", "sum"),
+            total_consumo_litros=("total_comb_l", soma_sql),
+            litros_excedentes=("litros_excedentes", soma_sql),
+            litros_excedentes_baixa_perfomance=("litros_excedentes_baixa_perfomance", soma_sql),
+            total_num_veiculos=("veiculo", "nunique"),
+            total_num_modelos=("modelo", "nunique"),
+        )
+        df_agg = df_agg.reset_index()
+
+        # Assim como no SQL, o total geral sempre tem uma linha (mesmo sem viagens)
+        if not chaves and df_agg.empty:
+            df_agg = pd.DataFrame([{coluna: 0 if coluna == "total_viagens" else np.nan for coluna in df_agg.columns}])
+
+        # Decodifica as chaves (código -1 = nulo)
+        for posicao, chave in enumerate(chaves):
+            codigos_chave = df_agg.pop(f"_codigo_{chave}").to_numpy()
+            valores = np.full(len(codigos_chave), None, dtype=object)
+            validos = codigos_chave >= 0
+            valores[validos] = versao.categorias[chave][codigos_chave[validos]]
+            df_agg.insert(posicao, chave, valores)
+
+        return df_agg.drop(columns=["_todos"], errors="ignore")
+
+
+def exporta_snapshot(dbEngine):
+    """
+    Exporta as viagens para um novo snapshot (um arquivo por mês), reaproveitando os meses anteriores aos últimos
+    ROLLUP_DIAS_REPROCESSAR dias do snapshot atual. Com o motor DuckDB, também exporta as linhas completas das viagens
+    e os motoristas em Parquet (ver duckdb_service.py). Retorna o nome da nova versão.
+    """
+    manifesto_atual, categorias = None, categorias_vazias()
+    nome_atual = snapshot_viagens.versao_atual()
+    if nome_atual is not None:
+        manifesto_atual = snapshot_viagens.le_manifesto(nome_atual)
+        categorias = {**categorias, **snapshot_viagens.le_categorias(nome_atual)}
+
+        # Snapshot atual sem os Parquet: exporta todos os meses novamente
+        if VIAGENS_MOTOR_DUCKDB and not manifesto_atual.get("parquet"):
+            manifesto_atual = None
+
+    with dbEngine.connect() as conn:
+        primeiro_dia, ultimo_dia = conn.execute(
+            text('SELECT CAST(MIN("dia") AS date), CAST(MAX("dia") AS date) FROM rmtc_viagens_analise_mix')
+        ).one()
+
+    if primeiro_dia is None:
+        return None
+
+    # Meses que podem ser reaproveitados (anteriores ao período a reprocessar)
+    meses_reaproveitados = []
+    mes_reprocessar = pd.Period(primeiro_dia, freq="M")
+    if manifesto_atual is not None:
+        dia_reprocessar = pd.to_datetime(manifesto_atual["ultimo_dia"]) - pd.Timedelta(days=ROLLUP_DIAS_REPROCESSAR)
+        mes_reprocessar = max(mes_reprocessar, pd.Period(dia_reprocessar, freq="M"))
+        meses_reaproveitados = [
+            mes for mes in manifesto_atual["particoes"] if pd.Period(mes, freq="M") < mes_reprocessar
+        ]
+
+    # Parquet (motor DuckDB): escritos em um diretório temporário e movidos para a versão
+    arquivos_parquet = None
+    if VIAGENS_MOTOR_DUCKDB:
+        arquivos_parquet = {}
+        os.makedirs(snapshot_viagens.SNAPSHOT_VIAGENS_DIR, exist_ok=True)
+        diretorio_parquet = tempfile.mkdtemp(dir=snapshot_viagens.SNAPSHOT_VIAGENS_DIR, prefix="parquet_")
+
+    try:
+        # Lê os demais meses, um de cada vez
+        particoes_novas = {}
+        with dbEngine.connect() as conn:
+            for mes in pd.period_range(mes_reprocessar, pd.Period(ultimo_dia, freq="M"), freq="M"):
+                dia_inicio, dia_fim = mes.start_time.date(), (mes + 1).start_time.date()
+                df = le_viagens(conn, dia_inicio, dia_fim)
+                particao, categorias = ColunasViagens.de_df(df, categorias)
+                particoes_novas[str(mes)] = particao.para_arrays()
+
+                if arquivos_parquet is not None:
+                    caminho = os.path.join(diretorio_parquet, f"viagens_{mes}.parquet")
+                    if exporta_parquet_viagens(conn, dia_inicio, dia_fim, caminho):
+                        arquivos_parquet[f"{snapshot_viagens.TABELA_VIAGENS}/viagens_{mes}.parquet"] = caminho
+
+            if arquivos_parquet is not None:
+                caminho = os.path.join(diretorio_parquet, f"{snapshot_viagens.TABELA_MOTORISTAS}.parquet")
+                exporta_parquet_motoristas(conn, caminho)
+                tabela = snapshot_viagens.TABELA_MOTORISTAS
+                arquivos_parquet[f"{tabela}/{tabela}.parquet"] = caminho
+
+        manifesto = {"primeiro_dia": str(primeiro_dia), "ultimo_dia": str(ultimo_dia)}
+        return snapshot_viagens.escreve_versao(
+            particoes_novas, meses_reaproveitados, categorias, manifesto, arquivos_parquet
+        )
+    finally:
+        if arquivos_parquet is not None:
+            shutil.rmtree(diretorio_parquet, ignore_errors=True)
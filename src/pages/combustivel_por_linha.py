@@ -8,7 +8,6 @@
 ##############################################################################
 # Bibliotecas básicas
 import pandas as pd
-import json
 from datetime import date, datetime
 
 # Importar bibliotecas para manipulação de URL
@@ -18,6 +17,7 @@ from urllib.parse import urlparse, parse_qs
 # Importar bibliotecas do dash básicas e plotly
 import dash
 from dash import Dash, html, dcc, callback, Input, Output, State, callback_context
+from dash import clientside_callback, ClientsideFunction, ALL
 import plotly.express as px
 import plotly.graph_objects as go
 
@@ -40,13 +40,10 @@ import locale_utils
 from db import PostgresSingleton
 
 # Imports gerais
-from modules.entities_utils import (
-    get_linhas_possui_info_combustivel,
-    get_modelos_veiculos_com_combustivel,
-    get_tipos_eventos_telemetria_mix_com_data,
-    get_tipos_eventos_telemetria_mix_com_gps,
-    gerar_excel,
-)
+from modules.entities_service import EntidadesService
+from modules.cache_utils import resultado_em_cache
+from modules.exportacao.exportacao_service import registra_exportacao, url_exportacao, EXPORTACAO_TAMANHO_LOTE
+from modules.filtro_utils import valores_filtros, FILTROS_DEBOUNCE_MS
 
 # Imports específicos
 from modules.combustivel_por_veiculo.veiculo_service import VeiculoService
@@ -71,25 +68,8 @@ pgEngine = pgDB.get_engine()
 linha_service = LinhaService(pgEngine)
 veiculo_service = VeiculoService(pgEngine)
 
-# Linhas que possuem informações de combustível
-df_todas_linhas = get_linhas_possui_info_combustivel(pgEngine)
-lista_todas_linhas = df_todas_linhas.to_dict(orient="records")
-
-# Modelos de veículos
-df_modelos_veiculos = get_modelos_veiculos_com_combustivel(pgEngine)
-lista_todos_modelos_veiculos = df_modelos_veiculos.to_dict(orient="records")
-lista_todos_modelos_veiculos.insert(0, {"LABEL": "TODOS"})
-
-# Lista de eventos com data e gps
-df_eventos_com_data = get_tipos_eventos_telemetria_mix_com_data(pgEngine)
-df_eventos_com_data = df_eventos_com_data.sort_values(by="label")
-
-df_eventos_com_gps = get_tipos_eventos_telemetria_mix_com_gps(pgEngine)
-df_eventos_com_gps = df_eventos_com_gps.sort_values(by="label")
-lista_eventos_com_gps = df_eventos_com_gps["EventTypeId"].unique()
-
-# Pega o preço do diesel via API
-preco_diesel = get_preco_diesel()
+# Dimensões (linhas, modelos, tipos de eventos, ...) carregadas sob demanda
+entidades_service = EntidadesService.get_instance(pgEngine)
 
 
 ##############################################################################
@@ -186,104 +166,62 @@ def input_valido(datas, lista_modelos, linha, lista_sentido, lista_dias_semana,
     return True
 
 
-def pag_linha_gera_labels_inputs_visao_linha(campo):
-    # Cria o callback
-    @callback(
-        [
-            Output(component_id=f"{campo}-labels", component_property="children"),
-        ],
-        [
-            Input("pag-linha-input-intervalo-datas-combustivel-linha", "value"),
-            Input("pag-linha-input-select-modelos-combustivel-linha", "value"),
-            Input("pag-linha-input-select-linhas-combustivel", "value"),
-            Input("pag-linha-input-select-sentido-da-linha-combustivel", "value"),
-            Input("pag-linha-input-select-dia-linha-combustivel", "value"),
-            Input("pag-linha-input-linha-combustivel-remover-outliers-menor-que", "value"),
-            Input("pag-linha-input-linha-combustivel-remover-outliers-maior-que", "value"),
-        ],
-    )
-    def atualiza_labels_inputs_visal_linha(
-        datas, lista_modelos, linha, lista_sentido, lista_dias_semana, limite_km_l_menor, limite_km_l_maior
-    ):
-        labels_antes = [
-            # DashIconify(icon="material-symbols:filter-arrow-right", width=20),
-            dmc.Badge("Filtro", color="gray", variant="outline"),
-        ]
+# Labels dos filtros (montados no navegador, ver assets/filtros.js), um callback para todos os componentes
+clientside_callback(
+    ClientsideFunction(namespace="filtros", function_name="labels_visao_linha"),
+    Output({"type": "pag-linha-labels-filtros", "campo": ALL}, "children"),
+    Input("pag-linha-store-filtros", "data"),
+)
 
-        datas_label = []
-        if not (datas is None or not datas) and datas[0] is not None and datas[1] is not None:
-            # Formata as datas
-            data_inicio_str = pd.to_datetime(datas[0]).strftime("%d/%m/%Y")
-            data_fim_str = pd.to_datetime(datas[1]).strftime("%d/%m/%Y")
-
-            datas_label = [dmc.Badge(f"{data_inicio_str} a {data_fim_str}", variant="outline")]
-
-        lista_modelos_labels = []
-        lista_linha_labels = []
-        lista_sentido_labels = []
-        lista_dias_semana_labels = []
-        km_l_labels = []
-
-        if lista_modelos is None or not lista_modelos or "TODOS" in lista_modelos:
-            lista_modelos_labels.append(dmc.Badge("Todos os modelos", variant="outline"))
-        else:
-            for modelo in lista_modelos:
-                lista_modelos_labels.append(dmc.Badge(modelo, variant="dot"))
-
-        if linha is not None:
-            lista_linha_labels.append(dmc.Badge(f"Linha {linha}", variant="dot"))
-
-        if lista_sentido is not None:
-            for opcao in lista_sentido:
-                lista_sentido_labels.append(dmc.Badge(f"Sentido {opcao}", variant="dot"))
-
-        if lista_dias_semana is not None:
-            for opcao in lista_dias_semana:
-                lista_dias_semana_labels.append(dmc.Badge(f"Dias {opcao}", variant="dot"))
-
-        km_l_labels.append(dmc.Badge(f"{limite_km_l_menor} ≤ km/L ≤ {limite_km_l_maior} ", variant="dot"))
-
-        return [
-            dmc.Group(
-                labels_antes
-                + datas_label
-                + lista_modelos_labels
-                + lista_linha_labels
-                + lista_sentido_labels
-                + lista_dias_semana_labels
-                + km_l_labels
-            )
-        ]
 
+def pag_linha_gera_labels_inputs_visao_linha(campo):
     # Cria o componente
-    return dmc.Group(id=f"{campo}-labels", children=[], className="labels-filtro")
-
-
-# Corrige o input para garantir que o termo para todas ("TODAS") não seja selecionado junto com outras opções
-def corrige_input(lista, termo_all="TODAS"):
-    # Caso 1: Nenhuma opcao é selecionada, reseta para "TODAS"
-    if not lista:
-        return [termo_all]
-
-    # Caso 2: Se "TODAS" foi selecionado após outras opções, reseta para "TODAS"
-    if len(lista) > 1 and termo_all in lista[1:]:
-        return [termo_all]
+    return dmc.Group(id={"type": "pag-linha-labels-filtros", "campo": campo}, children=[], className="labels-filtro")
 
-    # Caso 3: Se alguma opção foi selecionada após "TODAS", remove "TODAS"
-    if termo_all in lista and len(lista) > 1:
-        return [value for value in lista if value != termo_all]
 
-    # Por fim, se não caiu em nenhum caso, retorna o valor original
-    return lista
-
-
-@callback(
+# Corrige o input para garantir que o termo para todos ("TODOS") não seja selecionado junto com outras opções
+# (no navegador, ver assets/filtros.js)
+clientside_callback(
+    ClientsideFunction(namespace="filtros", function_name="corrige_selecao_todos"),
     Output("pag-linha-input-select-modelos-combustivel-linha", "value", allow_duplicate=True),
     Input("pag-linha-input-select-modelos-combustivel-linha", "value"),
     prevent_initial_call=True,
 )
-def corrige_input_modelos(lista_modelos):
-    return corrige_input(lista_modelos, "TODOS")
+
+# Estado (normalizado) dos filtros, do qual dependem os callbacks de dados.
+# Só é atualizado quando o estado muda, então a correção do dropdown acima não dispara as consultas novamente.
+CAMPOS_FILTROS = [
+    "datas",
+    "lista_modelos",
+    "linha",
+    "lista_sentido",
+    "lista_dias_semana",
+    "limite_km_l_menor",
+    "limite_km_l_maior",
+]
+
+clientside_callback(
+    """
+    function(datas, lista_modelos, linha, lista_sentido, lista_dias_semana, limite_km_l_menor, limite_km_l_maior,
+             estado_atual) {
+        return window.filtros.atualizaEstado(
+            {datas, lista_modelos, linha, lista_sentido, lista_dias_semana, limite_km_l_menor, limite_km_l_maior},
+            {lista_modelos: "TODOS"},
+            estado_atual,
+            ["limite_km_l_menor", "limite_km_l_maior"]
+        );
+    }
+    """,
+    Output("pag-linha-store-filtros", "data"),
+    Input("pag-linha-input-intervalo-datas-combustivel-linha", "value"),
+    Input("pag-linha-input-select-modelos-combustivel-linha", "value"),
+    Input("pag-linha-input-select-linhas-combustivel", "value"),
+    Input("pag-linha-input-select-sentido-da-linha-combustivel", "value"),
+    Input("pag-linha-input-select-dia-linha-combustivel", "value"),
+    Input("pag-linha-input-linha-combustivel-remover-outliers-menor-que", "value"),
+    Input("pag-linha-input-linha-combustivel-remover-outliers-maior-que", "value"),
+    State("pag-linha-store-filtros", "data"),
+)
 
 
 ##############################################################################
@@ -301,18 +239,24 @@ def corrige_input_modelos(lista_modelos):
         Output("pag-linha-indicador-total-gasto-comb-excedentes", "children"),
     ],
     [
-        Input("pag-linha-input-intervalo-datas-combustivel-linha", "value"),
-        Input("pag-linha-input-select-modelos-combustivel-linha", "value"),
-        Input("pag-linha-input-select-linhas-combustivel", "value"),
-        Input("pag-linha-input-select-sentido-da-linha-combustivel", "value"),
-        Input("pag-linha-input-select-dia-linha-combustivel", "value"),
-        Input("pag-linha-input-linha-combustivel-remover-outliers-menor-que", "value"),
-        Input("pag-linha-input-linha-combustivel-remover-outliers-maior-que", "value"),
+        Input("pag-linha-store-filtros", "data"),
     ],
 )
-def cb_pag_linha_atualiza_indicadores_combustivel_por_linha(
-    datas, lista_modelos, linha, lista_sentido, lista_dias_semana, limite_km_l_menor, limite_km_l_maior
-):
+def cb_pag_linha_atualiza_indicadores_combustivel_por_linha(filtros):
+    # Filtros da página (estado normalizado)
+    (
+        datas,
+        lista_modelos,
+        linha,
+        lista_sentido,
+        lista_dias_semana,
+        limite_km_l_menor,
+        limite_km_l_maior,
+    ) = valores_filtros(filtros, CAMPOS_FILTROS)
+
+    # Preço do diesel (atualizado em segundo plano)
+    preco_diesel = get_preco_diesel()
+
     # Valida
     if not input_valido(
         datas, lista_modelos, linha, lista_sentido, lista_dias_semana, limite_km_l_menor, limite_km_l_maior
@@ -354,18 +298,21 @@ def cb_pag_linha_atualiza_indicadores_combustivel_por_linha(
 @callback(
     Output("graph-combustivel-linha-por-hora", "figure"),
     [
-        Input("pag-linha-input-intervalo-datas-combustivel-linha", "value"),
-        Input("pag-linha-input-select-modelos-combustivel-linha", "value"),
-        Input("pag-linha-input-select-linhas-combustivel", "value"),
-        Input("pag-linha-input-select-sentido-da-linha-combustivel", "value"),
-        Input("pag-linha-input-select-dia-linha-combustivel", "value"),
-        Input("pag-linha-input-linha-combustivel-remover-outliers-menor-que", "value"),
-        Input("pag-linha-input-linha-combustivel-remover-outliers-maior-que", "value"),
+        Input("pag-linha-store-filtros", "data"),
     ],
 )
-def cb_pag_linha_plota_grafico_combustivel_linha_por_hora(
-    datas, lista_modelos, linha, lista_sentido, lista_dias_semana, limite_km_l_menor, limite_km_l_maior
-):
+def cb_pag_linha_plota_grafico_combustivel_linha_por_hora(filtros):
+    # Filtros da página (estado normalizado)
+    (
+        datas,
+        lista_modelos,
+        linha,
+        lista_sentido,
+        lista_dias_semana,
+        limite_km_l_menor,
+        limite_km_l_maior,
+    ) = valores_filtros(filtros, CAMPOS_FILTROS)
+
     # Valida
     if not input_valido(
         datas, lista_modelos, linha, lista_sentido, lista_dias_semana, limite_km_l_menor, limite_km_l_maior
@@ -394,18 +341,24 @@ def cb_pag_linha_plota_grafico_combustivel_linha_por_hora(
 @callback(
     Output("pag-linha-tabela-detalhamento-viagens-combustivel", "rowData"),
     [
-        Input("pag-linha-input-intervalo-datas-combustivel-linha", "value"),
-        Input("pag-linha-input-select-modelos-combustivel-linha", "value"),
-        Input("pag-linha-input-select-linhas-combustivel", "value"),
-        Input("pag-linha-input-select-sentido-da-linha-combustivel", "value"),
-        Input("pag-linha-input-select-dia-linha-combustivel", "value"),
-        Input("pag-linha-input-linha-combustivel-remover-outliers-menor-que", "value"),
-        Input("pag-linha-input-linha-combustivel-remover-outliers-maior-que", "value"),
+        Input("pag-linha-store-filtros", "data"),
     ],
 )
-def cb_pag_veiculo_tabela_lista_viagens(
-    datas, lista_modelos, linha, lista_sentido, lista_dias_semana, limite_km_l_menor, limite_km_l_maior
-):
+def cb_pag_veiculo_tabela_lista_viagens(filtros):
+    # Filtros da página (estado normalizado)
+    (
+        datas,
+        lista_modelos,
+        linha,
+        lista_sentido,
+        lista_dias_semana,
+        limite_km_l_menor,
+        limite_km_l_maior,
+    ) = valores_filtros(filtros, CAMPOS_FILTROS)
+
+    # Preço do diesel (atualizado em segundo plano)
+    preco_diesel = get_preco_diesel()
+
     # Valida
     if not input_valido(
         datas, lista_modelos, linha, lista_sentido, lista_dias_semana, limite_km_l_menor, limite_km_l_maior
@@ -430,56 +383,97 @@ def cb_pag_veiculo_tabela_lista_viagens(
     return df.to_dict(orient="records")
 
 
-# Callback para fazer o download quando o botão exportar para excel for clicado
+# Exportação das viagens (enviadas em streaming pela rota do servidor, ver modules/exportacao)
+def exporta_tabela_viagens(
+    datas, lista_modelos, linha, lista_sentido, lista_dias_semana, limite_km_l_menor, limite_km_l_maior
+):
+    # Preço do diesel (atualizado em segundo plano)
+    preco_diesel = get_preco_diesel()
+
+    # Reaproveita as viagens da tabela da página (mesmo filtro, já no cache); somente se não estiverem mais no cache
+    # (ex: expiraram), as viagens são lidas do banco em lotes. O DataFrame do cache não é copiado inteiro: somente
+    # cada lote é copiado antes de ser formatado
+    df_tabela = resultado_em_cache(
+        linha_service.get_viagens_realizada_na_linha,
+        datas,
+        lista_modelos,
+        linha,
+        lista_sentido,
+        lista_dias_semana,
+        limite_km_l_menor,
+        limite_km_l_maior,
+        copia=False,
+    )
+    if df_tabela is not None:
+        lotes = (
+            df_tabela.iloc[inicio : inicio + EXPORTACAO_TAMANHO_LOTE].copy()
+            for inicio in range(0, len(df_tabela), EXPORTACAO_TAMANHO_LOTE)
+        )
+    else:
+        lotes = linha_service.itera_viagens_realizada_na_linha(
+            datas,
+            lista_modelos,
+            linha,
+            lista_sentido,
+            lista_dias_semana,
+            limite_km_l_menor,
+            limite_km_l_maior,
+            tamanho_lote=EXPORTACAO_TAMANHO_LOTE,
+        )
+
+    for df in lotes:
+        # Preço
+        df["custo_excedente"] = df["litros_excedentes"] * preco_diesel
+
+        # Remove dados de timezone
+        for col in df.select_dtypes(include=["datetimetz"]).columns:
+            df[col] = df[col].dt.tz_localize(None)
+
+        yield df
+
+
+registra_exportacao("linha_viagens", exporta_tabela_viagens, "tabela_viagens_linha")
+
+
+# Callback para atualizar os links (assinados) de exportação das viagens (não consulta o banco)
 @callback(
-    Output("pag-linha-download-excel-tabela-viagens", "data"),
     [
-        Input("pag-linha-btn-exportar-tabela-viagens", "n_clicks"),
-        Input("pag-linha-input-intervalo-datas-combustivel-linha", "value"),
-        Input("pag-linha-input-select-modelos-combustivel-linha", "value"),
-        Input("pag-linha-input-select-linhas-combustivel", "value"),
-        Input("pag-linha-input-select-sentido-da-linha-combustivel", "value"),
-        Input("pag-linha-input-select-dia-linha-combustivel", "value"),
-        Input("pag-linha-input-linha-combustivel-remover-outliers-menor-que", "value"),
-        Input("pag-linha-input-linha-combustivel-remover-outliers-maior-que", "value"),
+        Output("pag-linha-btn-exportar-tabela-viagens", "href"),
+        Output("pag-linha-link-exportar-csv-tabela-viagens", "href"),
+        Output("pag-linha-link-exportar-parquet-tabela-viagens", "href"),
+    ],
+    [
+        Input("pag-linha-store-filtros", "data"),
     ],
-    prevent_initial_call=True,
 )
-def cb_download_excel_tabela_consumo_veiculos_visal_geral(
-    n_clicks, datas, lista_modelos, linha, lista_sentido, lista_dias_semana, limite_km_l_menor, limite_km_l_maior
-):
-    if not n_clicks or n_clicks <= 0:  # Garantre que ao iniciar ou carregar a page, o arquivo não seja baixado
-        return dash.no_update
+def cb_links_exportar_tabela_viagens(filtros):
+    # Filtros da página (estado normalizado)
+    (
+        datas,
+        lista_modelos,
+        linha,
+        lista_sentido,
+        lista_dias_semana,
+        limite_km_l_menor,
+        limite_km_l_maior,
+    ) = valores_filtros(filtros, CAMPOS_FILTROS)
 
     # Valida input
     if not input_valido(
         datas, lista_modelos, linha, lista_sentido, lista_dias_semana, limite_km_l_menor, limite_km_l_maior
     ):
-        return dash.no_update
-
-    # Obtém os dados
-    df = linha_service.get_viagens_realizada_na_linha(
-        datas, lista_modelos, linha, lista_sentido, lista_dias_semana, limite_km_l_menor, limite_km_l_maior
-    )
-
-    # Verifica se o dataframe está vazio
-    if df.empty:
-        return dash.no_update
-
-    # Preço
-    df["custo_excedente"] = df["litros_excedentes"] * preco_diesel
+        return [None, None, None]
 
-    # Remove dados de timezone
-    for col in df.select_dtypes(include=["datetimetz"]).columns:
-        df[col] = df[col].dt.tz_localize(None)
-
-    # Gera o excel
-    excel_data = gerar_excel(df)
-
-    # Dia de hoje formatado
-    dia_hoje_str = date.today().strftime("%d-%m-%Y")
-
-    return dcc.send_bytes(excel_data, f"tabela_viagens_linha_{dia_hoje_str}.xlsx")
+    filtros = {
+        "datas": datas,
+        "lista_modelos": lista_modelos,
+        "linha": linha,
+        "lista_sentido": lista_sentido,
+        "lista_dias_semana": lista_dias_semana,
+        "limite_km_l_menor": limite_km_l_menor,
+        "limite_km_l_maior": limite_km_l_maior,
+    }
+    return [url_exportacao("linha_viagens", formato, **filtros) for formato in ["xlsx", "csv", "parquet"]]
 
 
 ##############################################################################
@@ -516,10 +510,14 @@ def cb_pag_linha_botao_detalhar_viagem(tabela_linha, tabela_linha_virtual):
     # Lista com as overlays que colocaremos no mapa
     lista_overlays = []
 
-    # Obtem o shape da linha
-    df_shape_linha = veiculo_service.get_shape_linha(inicio_viagem, viagem_linha, viagem_sentido)
-    linha_geojson_str = df_shape_linha["geojsondata"].values[0]
-    linha_geojson = json.loads(linha_geojson_str)
+    # Obtem os dados da viagem (shape, eventos e posições) em uma única consulta
+    lista_eventos_com_gps = entidades_service.get_tipos_eventos_com_gps()["value"].unique()
+    bundle_viagem = veiculo_service.get_bundle_viagem(
+        inicio_viagem, fim_viagem, vec_asset_id, viagem_linha, viagem_sentido, lista_eventos_com_gps
+    )
+
+    # Shape da linha
+    linha_geojson = bundle_viagem["geojson_linha"]
 
     # Gera a camada
     lista_overlays.append(
@@ -572,10 +570,10 @@ def cb_pag_linha_botao_detalhar_viagem(tabela_linha, tabela_linha_virtual):
     )
 
     # Obtem os eventos que ocorreram na viagem
-    df_eventos_viagem = veiculo_service.get_agg_eventos_ocorreram_viagem(inicio_viagem, fim_viagem, vec_asset_id)
+    df_eventos_viagem = bundle_viagem["df_eventos"]
 
     # Adiciona as posições GPS
-    df_posicoes_gps = veiculo_service.get_posicao_gps_veiculo(inicio_viagem, fim_viagem, vec_asset_id)
+    df_posicoes_gps = bundle_viagem["df_posicoes_gps"]
     cor_icone = tema.PALETA_CORES_DISCRETA[2]
     layer_lista_marcadores = gera_layer_posicao(df_posicoes_gps, cor_icone)
 
@@ -593,15 +591,12 @@ def cb_pag_linha_botao_detalhar_viagem(tabela_linha, tabela_linha_virtual):
     for i, evt in df_eventos_viagem.iterrows():
         evt_label = evt["event_label"]
         evt_value = evt["event_value"]
-        evt_type_id = evt["event_type_id"]
 
         cor_idx = (i + 3) % len(tema.PALETA_CORES_DISCRETA)
         cor_icone = tema.PALETA_CORES_DISCRETA[cor_idx]
 
-        if evt_type_id in lista_eventos_com_gps:
-            df_eventos_viagem_com_gps = veiculo_service.get_detalhamento_evento_mix_veiculo(
-                inicio_viagem, fim_viagem, vec_asset_id, evt_value
-            )
+        if evt_value in bundle_viagem["eventos_gps"]:
+            df_eventos_viagem_com_gps = bundle_viagem["eventos_gps"][evt_value]
 
             layer_lista_marcadores = gera_layer_eventos_mix(df_eventos_viagem_com_gps, evt_label, cor_icone)
 
@@ -624,8 +619,14 @@ def cb_pag_linha_botao_detalhar_viagem(tabela_linha, tabela_linha_virtual):
 
 
 def layout():
+    # Linhas que possuem informações de combustível e modelos de veículos
+    lista_todas_linhas = entidades_service.get_linhas().to_dict(orient="records")
+    lista_todos_modelos_veiculos = [{"LABEL": "TODOS"}] + entidades_service.get_modelos().to_dict(orient="records")
+
     return dbc.Container(
         [
+            # Estado dos filtros
+            dcc.Store(id="pag-linha-store-filtros"),
             dbc.Row(
                 [
                     dbc.Col(
@@ -826,6 +827,7 @@ def layout():
                                                                     value=1,
                                                                     step=0.1,
                                                                     min=0,
+                                                                    debounce=FILTROS_DEBOUNCE_MS,
                                                                 ),
                                                                 dbc.InputGroupText("km/L"),
                                                             ]
@@ -854,6 +856,7 @@ def layout():
                                                                     value=10,
                                                                     step=0.1,
                                                                     min=0,
+                                                                    debounce=FILTROS_DEBOUNCE_MS,
                                                                 ),
                                                                 dbc.InputGroupText("km/L"),
                                                             ]
@@ -1123,11 +1126,22 @@ def layout():
                                 dbc.Col(
                                     html.Div(
                                         [
-                                            html.Button(
+                                            # Links para a rota de exportação (atualizados pelo callback)
+                                            html.A(
+                                                "CSV",
+                                                id="pag-linha-link-exportar-csv-tabela-viagens",
+                                                className="me-3",
+                                            ),
+                                            html.A(
+                                                "Parquet",
+                                                id="pag-linha-link-exportar-parquet-tabela-viagens",
+                                                className="me-3",
+                                            ),
+                                            html.A(
                                                 "Exportar para Excel",
                                                 id="pag-linha-btn-exportar-tabela-viagens",
-                                                n_clicks=0,
                                                 style={
+                                                    "display": "inline-block",
                                                     "background-color": "#007bff",  # Azul
                                                     "color": "white",
                                                     "border": "none",
@@ -1136,9 +1150,9 @@ def layout():
                                                     "cursor": "pointer",
                                                     "font-size": "16px",
                                                     "font-weight": "bold",
+                                                    "text-decoration": "none",
                                                 },
                                             ),
-                                            dcc.Download(id="pag-linha-download-excel-tabela-viagens"),
                                         ],
                                         style={"text-align": "right"},
                                     ),
@@ -1192,6 +1206,7 @@ def layout():
                 id="pag-linha-mapa-eventos-detalhe-viagem",
                 center=(-16.665136, -49.286041),
                 zoom=11,
+                preferCanvas=True,  # Desenha os pontos no canvas (mais rápido que SVG)
                 style={
                     "height": "60vh",
                     "border": "2px solid gray",
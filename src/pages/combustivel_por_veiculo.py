@@ -9,7 +9,6 @@
 # Bibliotecas básicas
 from datetime import date, datetime
 import pandas as pd
-import json
 
 # Importar bibliotecas para manipulação de URL
 import ast
@@ -17,7 +16,8 @@ from urllib.parse import urlparse, parse_qs
 
 # Importar bibliotecas do dash básicas e plotly
 import dash
-from dash import Dash, html, dcc, callback, Input, Output
+from dash import Dash, html, dcc, callback, Input, Output, State
+from dash import clientside_callback, ClientsideFunction, ALL
 import plotly.graph_objects as go
 
 # Importar bibliotecas do bootstrap e ag-grid
@@ -39,22 +39,21 @@ import locale_utils
 from db import PostgresSingleton
 
 # Imports gerais
-from modules.entities_utils import (
-    get_linhas_possui_info_combustivel,
-    get_modelos_veiculos_com_combustivel,
-    get_veiculos_com_combustivel,
-    get_tipos_eventos_telemetria_mix_com_data,
-    get_tipos_eventos_telemetria_mix_com_gps,
-)
+from modules.entities_service import EntidadesService
+from modules.filtro_utils import corrige_selecao, FILTROS_DEBOUNCE_MS
 
 # Imports específicos
 from modules.combustivel_por_veiculo.veiculo_service import VeiculoService
+from modules.rollup.distribuicao_service import DistribuicaoService
 import modules.combustivel_por_veiculo.graficos as veiculo_graficos
 import modules.combustivel_por_veiculo.tabela as veiculo_tabela
 
 # Preço do diesel
 from modules.preco_combustivel_api import get_preco_diesel
 
+# Store no servidor
+from modules.store_servidor_utils import store_servidor
+
 # Mapa
 from modules.mapa_utils import getMapaFundo, gera_layer_posicao, gera_layer_eventos_mix
 
@@ -68,29 +67,10 @@ pgEngine = pgDB.get_engine()
 
 # Cria o serviço
 veiculo_service = VeiculoService(pgEngine)
+distribuicao_service = DistribuicaoService(pgEngine)
 
-# Linhas que possuem informações de combustível
-df_todas_linhas = get_linhas_possui_info_combustivel(pgEngine)
-lista_todas_linhas = df_todas_linhas.to_dict(orient="records")
-lista_todas_linhas.insert(0, {"LABEL": "TODAS"})
-
-# Veículos
-df_veiculos = get_veiculos_com_combustivel(pgEngine)
-lista_todos_veiculos = df_veiculos.to_dict(orient="records")
-
-# Modelos e Veiculos
-df_modelos = get_modelos_veiculos_com_combustivel(pgEngine)
-
-# Pega o preço do diesel via API
-preco_diesel = get_preco_diesel()
-
-# Lista de eventos com data e gps
-df_eventos_com_data = get_tipos_eventos_telemetria_mix_com_data(pgEngine)
-df_eventos_com_data = df_eventos_com_data.sort_values(by="label")
-
-df_eventos_com_gps = get_tipos_eventos_telemetria_mix_com_gps(pgEngine)
-df_eventos_com_gps = df_eventos_com_gps.sort_values(by="label")
-lista_eventos_com_gps = df_eventos_com_gps["EventTypeId"].unique()
+# Dimensões (linhas, veículos, modelos, tipos de eventos, ...) carregadas sob demanda
+entidades_service = EntidadesService.get_instance(pgEngine)
 
 ##############################################################################
 # CALLBACKS ##################################################################
@@ -164,7 +144,7 @@ def input_valido(datas, vec_num_id, lista_linha, km_l_min, km_l_max):
     if datas is None or not datas or None in datas or len(datas) != 2:
         return False
 
-    if vec_num_id is None or str(vec_num_id) not in df_veiculos["LABEL"].unique():
+    if vec_num_id is None or str(vec_num_id) not in entidades_service.get_veiculos()["LABEL"].unique():
         return False
 
     if lista_linha is None or not lista_linha or None in lista_linha:
@@ -176,79 +156,26 @@ def input_valido(datas, vec_num_id, lista_linha, km_l_min, km_l_max):
     return True
 
 
-def gera_labels_inputs_pag_veiculo(campo):
-    # Cria o callback
-    @callback(
-        Output(component_id=f"{campo}-labels", component_property="children"),
-        Input("pag-veiculo-store-input-dados-veiculo", "data"),
-    )
-    def pag_veiculo_atualiza_labels_inputs_veiculo(data):
-        labels_antes = [
-            # DashIconify(icon="material-symbols:filter-arrow-right", width=20),
-            dmc.Badge("Filtro", color="gray", variant="outline"),
-        ]
-
-        # Obtem os dados
-        datas = data["datas"]
-        vec_num_id = data["id_veiculo"]
-        vec_model = data["vec_model"]
-        lista_linha = data["lista_linhas"]
-        km_l_min = data["km_l_min"]
-        km_l_max = data["km_l_max"]
-
-        datas_label = []
-        if not (datas is None or not datas) and datas[0] is not None and datas[1] is not None:
-            # Formata as datas
-            data_inicio_str = pd.to_datetime(datas[0]).strftime("%d/%m/%Y")
-            data_fim_str = pd.to_datetime(datas[1]).strftime("%d/%m/%Y")
-
-            datas_label = [dmc.Badge(f"{data_inicio_str} a {data_fim_str}", variant="outline")]
-
-        dados_veiculos_labels = []
-        lista_linha_labels = []
-        km_l_labels = []
-
-        dados_veiculos_labels.append(dmc.Badge(str(vec_num_id), variant="outline"))
-        dados_veiculos_labels.append(dmc.Badge(str(vec_model), variant="outline"))
-
-        if lista_linha is None or not lista_linha or "TODAS" in lista_linha:
-            lista_linha_labels.append(dmc.Badge("Todas as linhas", variant="outline"))
-        else:
-            for linha in lista_linha:
-                lista_linha_labels.append(dmc.Badge(linha, variant="dot"))
-
-        km_l_labels.append(dmc.Badge(f"{km_l_min} ≤ km/L ≤ {km_l_max} ", variant="outline"))
+# Labels dos filtros (montados no navegador, ver assets/filtros.js), um callback para todos os componentes
+clientside_callback(
+    ClientsideFunction(namespace="filtros", function_name="labels_veiculo"),
+    Output({"type": "pag-veiculo-labels-filtros", "campo": ALL}, "children"),
+    Input("pag-veiculo-store-input-dados-veiculo", "data"),
+)
 
-        return [dmc.Group(labels_antes + datas_label + dados_veiculos_labels + lista_linha_labels + km_l_labels)]
 
+def gera_labels_inputs_pag_veiculo(campo):
     # Cria o componente
-    return dmc.Group(id=f"{campo}-labels", children=[], className="labels-filtro")
+    return dmc.Group(id={"type": "pag-veiculo-labels-filtros", "campo": campo}, children=[], className="labels-filtro")
 
 # Corrige o input para garantir que o termo para todas ("TODAS") não seja selecionado junto com outras opções
-def corrige_input(lista, termo_all="TODAS"):
-    # Caso 1: Nenhuma opcao é selecionada, reseta para "TODAS"
-    if not lista:
-        return [termo_all]
-
-    # Caso 2: Se "TODAS" foi selecionado após outras opções, reseta para "TODAS"
-    if len(lista) > 1 and termo_all in lista[1:]:
-        return [termo_all]
-
-    # Caso 3: Se alguma opção foi selecionada após "TODAS", remove "TODAS"
-    if termo_all in lista and len(lista) > 1:
-        return [value for value in lista if value != termo_all]
-
-    # Por fim, se não caiu em nenhum caso, retorna o valor original
-    return lista
-
-
-@callback(
+# (no navegador, ver assets/filtros.js)
+clientside_callback(
+    ClientsideFunction(namespace="filtros", function_name="corrige_selecao_todas"),
     Output("pag-veiculo-input-select-linhas-veiculo", "value", allow_duplicate=True),
     Input("pag-veiculo-input-select-linhas-veiculo", "value"),
     prevent_initial_call=True,
 )
-def corrige_input_linhas(lista_linhas):
-    return corrige_input(lista_linhas)
 
 
 ##############################################################################
@@ -265,6 +192,7 @@ def corrige_input_linhas(lista_linhas):
         Input("pag-veiculo-input-excluir-km-l-menor-que-visao-veiculo", "value"),
         Input("pag-veiculo-input-excluir-km-l-maior-que-visao-veiculo", "value"),
     ],
+    State("pag-veiculo-store-input-dados-veiculo", "data"),
 )
 def cb_sincroniza_input_veiculo_store(
     id_veiculo,
@@ -272,7 +200,15 @@ def cb_sincroniza_input_veiculo_store(
     lista_linhas=["TODAS"],
     km_l_min=1,
     km_l_max=10,
+    input_dict_atual=None,
 ):
+    # Limite de km/L vazio (sendo editado), mantém o último estado
+    if input_dict_atual is not None and (km_l_min is None or km_l_max is None):
+        return dash.no_update
+
+    # Normaliza a seleção de linhas (a correção do dropdown no navegador dispara este callback novamente)
+    lista_linhas = corrige_selecao(lista_linhas)
+
     # Input padrão
     input_dict = {
         "valido": False,
@@ -292,10 +228,15 @@ def cb_sincroniza_input_veiculo_store(
         input_dict["valido"] = False
 
     # Modelos
+    df_modelos = entidades_service.get_veiculos_modelos()
     if not df_modelos[df_modelos["vec_num_id"] == id_veiculo].empty:
         input_dict["vec_model"] = df_modelos[df_modelos["vec_num_id"] == id_veiculo]["LABEL"].values[0]
         input_dict["vec_asset_id"] = str(df_modelos[df_modelos["vec_num_id"] == id_veiculo]["vec_asset_id"].values[0])
 
+    # Estado não mudou, não dispara os callbacks que dependem do store
+    if input_dict == input_dict_atual:
+        return dash.no_update
+
     return input_dict
 
 
@@ -305,7 +246,7 @@ def cb_sincroniza_input_veiculo_store(
 )
 def cb_sincroniza_input_historico_timeline(data):
     # Input padrão
-    state_dict = {"valido": False, "df": []}
+    state_dict = {"valido": False, "handle": None, "filtro": None}
 
     if not data or not data["valido"]:
         return state_dict
@@ -319,12 +260,32 @@ def cb_sincroniza_input_historico_timeline(data):
 
     df = veiculo_service.get_historico_viagens(datas, vec_num_id, lista_linha, km_l_min, km_l_max)
 
+    # O histórico fica no servidor; o navegador guarda apenas o handle e o filtro (para recalcular caso o handle expire)
     state_dict["valido"] = True
-    state_dict["df"] = df.to_dict(orient="records")
+    state_dict["handle"] = store_servidor.salvar(df)
+    state_dict["filtro"] = {
+        "datas": datas,
+        "id_veiculo": vec_num_id,
+        "lista_linhas": lista_linha,
+        "km_l_min": km_l_min,
+        "km_l_max": km_l_max,
+    }
 
     return state_dict
 
 
+def obtem_historico_viagens_store(data):
+    """Função para obter o histórico de viagens a partir do handle salvo no store (ou recalcular pelo filtro)"""
+    df = store_servidor.obter(data["handle"])
+    if df is None:
+        filtro = data["filtro"]
+        df = veiculo_service.get_historico_viagens(
+            filtro["datas"], filtro["id_veiculo"], filtro["lista_linhas"], filtro["km_l_min"], filtro["km_l_max"]
+        )
+
+    return df
+
+
 def formata_float_para_real(valor):
     return f"R$ {valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
 
@@ -339,6 +300,9 @@ def formata_float_para_real(valor):
     Input("pag-veiculo-store-input-dados-veiculo", "data"),
 )
 def cb_pag_veiculo_tabela_lista_viagens(data):
+    # Preço do diesel (atualizado em segundo plano)
+    preco_diesel = get_preco_diesel()
+
     # Valida se os dados do estado estão OK, caso contrário retorna os dados padrão
     if not data or not data["valido"]:
         return []
@@ -404,6 +368,9 @@ def cb_pag_veiculo_indicador_consumo_km_l_visao_veiculo(data):
     Input("pag-veiculo-store-input-dados-veiculo", "data"),
 )
 def cb_pag_veiculo_indicador_total_consumo_excedente_visao_veiculo(data):
+    # Preço do diesel (atualizado em segundo plano)
+    preco_diesel = get_preco_diesel()
+
     if not data or not data["valido"]:
         return "", "", ""
 
@@ -495,20 +462,11 @@ def cb_plota_grafico_timeline_consumo_veiculo(
     if not data or not data["valido"]:
         return go.Figure()
 
-    # Obtem os dados
-    df = pd.DataFrame(data["df"])
+    # Obtem os dados (já com os tipos corretos, pois ficam no servidor)
+    df = obtem_historico_viagens_store(data)
     if df.empty:
         return go.Figure()
 
-    # Formata datas no df, pois a serialização converte para string
-    df["encontrou_timestamp_inicio"] = pd.to_datetime(df["encontrou_timestamp_inicio"])
-    df["encontrou_timestamp_fim"] = pd.to_datetime(df["encontrou_timestamp_fim"])
-    df["timestamp_br_inicio"] = pd.to_datetime(df["encontrou_timestamp_inicio"]) - pd.Timedelta(hours=3)
-    df["timestamp_br_fim"] = pd.to_datetime(df["encontrou_timestamp_fim"]) - pd.Timedelta(hours=3)
-    df["encontrou_tempo_viagem_segundos"] = df["encontrou_tempo_viagem_segundos"].astype(int)
-    df["encontrou_tempo_viagem_minutos"] = df["encontrou_tempo_viagem_segundos"] / 60
-    df["dia_dt"] = pd.to_datetime(df["dia"]).dt.date
-
     # Obtem o ponto selecionado (se houver)
     df_ponto_selecionado = None
     if ponto_selecionado is not None:
@@ -554,7 +512,24 @@ def cb_plota_histograma_viagem_selecionada(data, metadata_browser, ponto_selecio
     viagem_eh_feriado = ponto_custom_data[11]
     viagem_data_inicio = ponto_custom_data[13]
 
-    # Executa a consulta
+    # Distribuição de referência pré-calculada (não consulta as viagens)
+    distribuicao = distribuicao_service.get_distribuicao_referencia(
+        km_l_min,
+        km_l_max,
+        viagem_data_inicio,
+        viagem_vec_model,
+        viagem_linha,
+        viagem_sentido,
+        viagem_time_slot,
+        viagem_dia,
+        viagem_eh_feriado,
+    )
+    if distribuicao is not None:
+        return veiculo_graficos.gerar_grafico_box_distribuicao_referencia(
+            distribuicao["estatisticas"], viagem_vec_model, viagem_consumo_kml, metadata_browser
+        )
+
+    # Caso a distribuição não esteja disponível, executa a consulta
     df = veiculo_service.get_histograma_viagens_veiculo(
         km_l_min,
         km_l_max,
@@ -659,10 +634,14 @@ def cb_pag_veiculo_mapa_eventos_mix_viagem(data, ponto_selecionado):
     # Lista com as overlays que colocaremos no mapa
     lista_overlays = []
 
-    # Obtem o shape da linha
-    df_shape_linha = veiculo_service.get_shape_linha(inicio_viagem, viagem_linha, viagem_sentido)
-    linha_geojson_str = df_shape_linha["geojsondata"].values[0]
-    linha_geojson = json.loads(linha_geojson_str)
+    # Obtem os dados da viagem (shape, eventos e posições) em uma única consulta
+    lista_eventos_com_gps = entidades_service.get_tipos_eventos_com_gps()["value"].unique()
+    bundle_viagem = veiculo_service.get_bundle_viagem(
+        inicio_viagem, fim_viagem, vec_asset_id, viagem_linha, viagem_sentido, lista_eventos_com_gps
+    )
+
+    # Shape da linha
+    linha_geojson = bundle_viagem["geojson_linha"]
 
     # Gera a camada
     lista_overlays.append(
@@ -715,10 +694,10 @@ def cb_pag_veiculo_mapa_eventos_mix_viagem(data, ponto_selecionado):
     )
 
     # Obtem os eventos que ocorreram na viagem
-    df_eventos_viagem = veiculo_service.get_agg_eventos_ocorreram_viagem(inicio_viagem, fim_viagem, vec_asset_id)
+    df_eventos_viagem = bundle_viagem["df_eventos"]
 
     # Adiciona as posições GPS
-    df_posicoes_gps = veiculo_service.get_posicao_gps_veiculo(inicio_viagem, fim_viagem, vec_asset_id)
+    df_posicoes_gps = bundle_viagem["df_posicoes_gps"]
     cor_icone = tema.PALETA_CORES_DISCRETA[2]
     layer_lista_marcadores = gera_layer_posicao(df_posicoes_gps, cor_icone)
 
@@ -736,15 +715,12 @@ def cb_pag_veiculo_mapa_eventos_mix_viagem(data, ponto_selecionado):
     for i, evt in df_eventos_viagem.iterrows():
         evt_label = evt["event_label"]
         evt_value = evt["event_value"]
-        evt_type_id = evt["event_type_id"]
 
         cor_idx = (i + 3) % len(tema.PALETA_CORES_DISCRETA)
         cor_icone = tema.PALETA_CORES_DISCRETA[cor_idx]
 
-        if evt_type_id in lista_eventos_com_gps:
-            df_eventos_viagem_com_gps = veiculo_service.get_detalhamento_evento_mix_veiculo(
-                inicio_viagem, fim_viagem, vec_asset_id, evt_value
-            )
+        if evt_value in bundle_viagem["eventos_gps"]:
+            df_eventos_viagem_com_gps = bundle_viagem["eventos_gps"][evt_value]
 
             layer_lista_marcadores = gera_layer_eventos_mix(df_eventos_viagem_com_gps, evt_label, cor_icone)
 
@@ -766,6 +742,13 @@ def cb_pag_veiculo_mapa_eventos_mix_viagem(data, ponto_selecionado):
 # Layout #####################################################################
 ##############################################################################
 def layout():
+    # Preço do diesel (atualizado em segundo plano)
+    preco_diesel = get_preco_diesel()
+
+    # Veículos e linhas que possuem informações de combustível
+    lista_todos_veiculos = entidades_service.get_veiculos().to_dict(orient="records")
+    lista_todas_linhas = [{"LABEL": "TODAS"}] + entidades_service.get_linhas().to_dict(orient="records")
+
     return dbc.Container(
     [
         # Estado
@@ -901,6 +884,7 @@ def layout():
                                                                 value=1,
                                                                 step=0.1,
                                                                 min=0,
+                                                                debounce=FILTROS_DEBOUNCE_MS,
                                                             ),
                                                             dbc.InputGroupText("km/L"),
                                                         ]
@@ -930,6 +914,7 @@ def layout():
                                                                 value=10,
                                                                 step=0.1,
                                                                 min=0,
+                                                                debounce=FILTROS_DEBOUNCE_MS,
                                                             ),
                                                             dbc.InputGroupText("km/L"),
                                                         ]
@@ -1101,6 +1086,8 @@ def layout():
                                                     dmc.Radio("Sem anotações", value="anotacoes_sem"),
                                                     dmc.Radio("Motoristas", value="anotacoes_motoristas"),
                                                     dmc.Radio("Linhas", value="anotacoes_linhas"),
+                                                    dmc.Radio("Modelos", value="anotacoes_modelos"),
+                                                    dmc.Radio("Status", value="anotacoes_status"),
                                                 ],
                                                 my=10,
                                             ),
@@ -1182,6 +1169,7 @@ def layout():
             id="pag-veiculo-mapa-eventos-detalhe-viagem",
             center=(-16.665136, -49.286041),
             zoom=11,
+            preferCanvas=True,  # Desenha os pontos no canvas (mais rápido que SVG)
             style={
                 "height": "60vh",
                 "border": "2px solid gray",
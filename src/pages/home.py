@@ -13,6 +13,7 @@ import pandas as pd
 # Importar bibliotecas do dash básicas e plotly
 import dash
 from dash import Dash, html, dcc, callback, Input, Output, State, callback_context
+from dash import clientside_callback, ClientsideFunction, ALL
 import plotly.graph_objects as go
 
 # Importar bibliotecas do bootstrap e ag-grid
@@ -30,7 +31,9 @@ import locale_utils
 from db import PostgresSingleton
 
 # Imports gerais
-from modules.entities_utils import get_linhas_possui_info_combustivel, get_modelos_veiculos_com_combustivel, gerar_excel
+from modules.entities_service import EntidadesService
+from modules.exportacao.exportacao_service import registra_exportacao, url_exportacao
+from modules.filtro_utils import valores_filtros, FILTROS_DEBOUNCE_MS
 
 # Imports específicos
 from modules.home.home_service import HomeService
@@ -50,19 +53,8 @@ pgEngine = pgDB.get_engine()
 # Cria o serviço
 home_service = HomeService(pgEngine)
 
-# Linhas que possuem informações de combustível
-df_todas_linhas = get_linhas_possui_info_combustivel(pgEngine)
-lista_todas_linhas = df_todas_linhas.to_dict(orient="records")
-lista_todas_linhas.insert(0, {"LABEL": "TODAS"})
-
-# Modelos de veículos
-df_modelos_veiculos = get_modelos_veiculos_com_combustivel(pgEngine)
-df_modelos_veiculos_latest = df_modelos_veiculos.drop_duplicates(subset="LABEL", keep="first")
-lista_todos_modelos_veiculos = df_modelos_veiculos_latest.to_dict(orient="records")
-lista_todos_modelos_veiculos.insert(0, {"LABEL": "TODOS"})
-
-# Pega o preço do diesel via API
-preco_diesel = get_preco_diesel()
+# Dimensões (linhas, modelos, ...) carregadas sob demanda
+entidades_service = EntidadesService.get_instance(pgEngine)
 
 
 ##############################################################################
@@ -91,92 +83,58 @@ def input_valido(datas, lista_modelos, lista_linha, km_l_min, km_l_max):
     return True
 
 
-def gera_labels_inputs_visao_geral(campo):
-    # Cria o callback
-    @callback(
-        [
-            Output(component_id=f"{campo}-labels", component_property="children"),
-        ],
-        [
-            Input("pag-home-intervalo-datas-visao-geral", "value"),
-            Input("pag-home-select-modelos-visao-geral", "value"),
-            Input("pag-home-select-linhas-monitoramento", "value"),
-            Input("pag-home-excluir-km-l-menor-que-visao-geral", "value"),
-            Input("pag-home-excluir-km-l-maior-que-visao-geral", "value"),
-        ],
-    )
-    def atualiza_labels_inputs_visal_geral(datas, lista_modelos, lista_linha, km_l_min, km_l_max):
-        labels_antes = [
-            # DashIconify(icon="material-symbols:filter-arrow-right", width=20),
-            dmc.Badge("Filtro", color="gray", variant="outline"),
-        ]
-
-        datas_label = []
-        if not (datas is None or not datas) and datas[0] is not None and datas[1] is not None:
-            # Formata as datas
-            data_inicio_str = pd.to_datetime(datas[0]).strftime("%d/%m/%Y")
-            data_fim_str = pd.to_datetime(datas[1]).strftime("%d/%m/%Y")
-
-            datas_label = [dmc.Badge(f"{data_inicio_str} a {data_fim_str}", variant="outline")]
-
-        lista_modelos_labels = []
-        lista_linha_labels = []
-        km_l_labels = []
-
-        if lista_modelos is None or not lista_modelos or "TODOS" in lista_modelos:
-            lista_modelos_labels.append(dmc.Badge("Todos os modelos", variant="outline"))
-        else:
-            for modelo in lista_modelos:
-                lista_modelos_labels.append(dmc.Badge(modelo, variant="dot"))
-
-        if lista_linha is None or not lista_linha or "TODAS" in lista_linha:
-            lista_linha_labels.append(dmc.Badge("Todas as linhas", variant="outline"))
-        else:
-            for linha in lista_linha:
-                lista_linha_labels.append(dmc.Badge(linha, variant="dot"))
-
-        km_l_labels.append(dmc.Badge(f"{km_l_min} ≤ km/L ≤ {km_l_max} ", variant="outline"))
+# Labels dos filtros (montados no navegador, ver assets/filtros.js), um callback para todos os componentes
+clientside_callback(
+    ClientsideFunction(namespace="filtros", function_name="labels_visao_geral"),
+    Output({"type": "pag-home-labels-filtros", "campo": ALL}, "children"),
+    Input("pag-home-store-filtros", "data"),
+)
 
-        return [dmc.Group(labels_antes + datas_label + lista_modelos_labels + lista_linha_labels + km_l_labels)]
 
+def gera_labels_inputs_visao_geral(campo):
     # Cria o componente
-    return dmc.Group(id=f"{campo}-labels", children=[], className="labels-filtro")
+    return dmc.Group(id={"type": "pag-home-labels-filtros", "campo": campo}, children=[], className="labels-filtro")
 
 
 # Corrige o input para garantir que o termo para todas ("TODAS") não seja selecionado junto com outras opções
-def corrige_input(lista, termo_all="TODAS"):
-    # Caso 1: Nenhuma opcao é selecionada, reseta para "TODAS"
-    if not lista:
-        return [termo_all]
-
-    # Caso 2: Se "TODAS" foi selecionado após outras opções, reseta para "TODAS"
-    if len(lista) > 1 and termo_all in lista[1:]:
-        return [termo_all]
-
-    # Caso 3: Se alguma opção foi selecionada após "TODAS", remove "TODAS"
-    if termo_all in lista and len(lista) > 1:
-        return [value for value in lista if value != termo_all]
-
-    # Por fim, se não caiu em nenhum caso, retorna o valor original
-    return lista
-
-
-@callback(
+# (no navegador, ver assets/filtros.js)
+clientside_callback(
+    ClientsideFunction(namespace="filtros", function_name="corrige_selecao_todos"),
     Output("pag-home-select-modelos-visao-geral", "value", allow_duplicate=True),
     Input("pag-home-select-modelos-visao-geral", "value"),
     prevent_initial_call=True,
 )
-def corrige_input_modelos(lista_modelos):
-    return corrige_input(lista_modelos, "TODOS")
-
 
-@callback(
+clientside_callback(
+    ClientsideFunction(namespace="filtros", function_name="corrige_selecao_todas"),
     Output("pag-home-select-linhas-monitoramento", "value", allow_duplicate=True),
     Input("pag-home-select-linhas-monitoramento", "value"),
     prevent_initial_call=True,
 )
-def corrige_input_linhas(lista_linhas):
-    return corrige_input(lista_linhas)
+
+# Estado (normalizado) dos filtros, do qual dependem os callbacks de dados.
+# Só é atualizado quando o estado muda, então a correção do dropdown acima não dispara as consultas novamente.
+CAMPOS_FILTROS = ["datas", "lista_modelos", "lista_linha", "km_l_min", "km_l_max"]
+
+clientside_callback(
+    """
+    function(datas, lista_modelos, lista_linha, km_l_min, km_l_max, estado_atual) {
+        return window.filtros.atualizaEstado(
+            {datas, lista_modelos, lista_linha, km_l_min, km_l_max},
+            {lista_modelos: "TODOS", lista_linha: "TODAS"},
+            estado_atual,
+            ["km_l_min", "km_l_max"]
+        );
+    }
+    """,
+    Output("pag-home-store-filtros", "data"),
+    Input("pag-home-intervalo-datas-visao-geral", "value"),
+    Input("pag-home-select-modelos-visao-geral", "value"),
+    Input("pag-home-select-linhas-monitoramento", "value"),
+    Input("pag-home-excluir-km-l-menor-que-visao-geral", "value"),
+    Input("pag-home-excluir-km-l-maior-que-visao-geral", "value"),
+    State("pag-home-store-filtros", "data"),
+)
 
 
 ##############################################################################
@@ -187,19 +145,22 @@ def corrige_input_linhas(lista_linhas):
 @callback(
     Output("tabela-consumo-veiculo-visao-geral", "rowData"),
     [
-        Input("pag-home-intervalo-datas-visao-geral", "value"),
-        Input("pag-home-select-modelos-visao-geral", "value"),
-        Input("pag-home-select-linhas-monitoramento", "value"),
-        Input("pag-home-excluir-km-l-menor-que-visao-geral", "value"),
-        Input("pag-home-excluir-km-l-maior-que-visao-geral", "value"),
+        Input("pag-home-store-filtros", "data"),
     ],
 )
-def cb_tabela_consumo_veiculos_visal_geral(datas, lista_modelos, lista_linha, km_l_min, km_l_max):
+def cb_tabela_consumo_veiculos_visal_geral(filtros):
+    # Filtros da página (estado normalizado)
+    datas, lista_modelos, lista_linha, km_l_min, km_l_max = valores_filtros(filtros, CAMPOS_FILTROS)
+
+    # Preço do diesel (atualizado em segundo plano)
+    preco_diesel = get_preco_diesel()
+
     # Valida input
     if not input_valido(datas, lista_modelos, lista_linha, km_l_min, km_l_max):
         return []
 
-    df = home_service.get_tabela_consumo_veiculos(datas, lista_modelos, lista_linha, km_l_min, km_l_max)
+    resumo = home_service.get_resumo_visao_geral(datas, lista_modelos, lista_linha, km_l_min, km_l_max)
+    df = resumo.tabela_consumo_veiculos()
 
     # Ação de visualização
     df["acao"] = "🔍 Detalhar"
@@ -213,19 +174,22 @@ def cb_tabela_consumo_veiculos_visal_geral(datas, lista_modelos, lista_linha, km
 @callback(
     Output("tabela-consumo-linhas-visao-geral", "rowData"),
     [
-        Input("pag-home-intervalo-datas-visao-geral", "value"),
-        Input("pag-home-select-modelos-visao-geral", "value"),
-        Input("pag-home-select-linhas-monitoramento", "value"),
-        Input("pag-home-excluir-km-l-menor-que-visao-geral", "value"),
-        Input("pag-home-excluir-km-l-maior-que-visao-geral", "value"),
+        Input("pag-home-store-filtros", "data"),
     ],
 )
-def cb_tabela_consumo_linhas_visal_geral(datas, lista_modelos, lista_linha, km_l_min, km_l_max):
+def cb_tabela_consumo_linhas_visal_geral(filtros):
+    # Filtros da página (estado normalizado)
+    datas, lista_modelos, lista_linha, km_l_min, km_l_max = valores_filtros(filtros, CAMPOS_FILTROS)
+
+    # Preço do diesel (atualizado em segundo plano)
+    preco_diesel = get_preco_diesel()
+
     # Valida input
     if not input_valido(datas, lista_modelos, lista_linha, km_l_min, km_l_max):
         return []
 
-    df = home_service.get_tabela_consumo_linhas(datas, lista_modelos, lista_linha, km_l_min, km_l_max)
+    resumo = home_service.get_resumo_visao_geral(datas, lista_modelos, lista_linha, km_l_min, km_l_max)
+    df = resumo.tabela_consumo_linhas()
 
     # Ação de visualização
     df["acao"] = "🔍 Detalhar"
@@ -236,75 +200,62 @@ def cb_tabela_consumo_linhas_visal_geral(datas, lista_modelos, lista_linha, km_l
     return df.to_dict(orient="records")
 
 
-# Callback para fazer o download quando o botão exportar para excel for clicado
-@callback(
-    Output("download-excel-tabela-combustivel-visao-geral", "data"),
-    [
-        Input("btn-exportar-excel-tabela-combustivel-visao-geral", "n_clicks"),
-        Input("pag-home-intervalo-datas-visao-geral", "value"),
-        Input("pag-home-select-modelos-visao-geral", "value"),
-        Input("pag-home-select-linhas-monitoramento", "value"),
-        Input("pag-home-excluir-km-l-menor-que-visao-geral", "value"),
-        Input("pag-home-excluir-km-l-maior-que-visao-geral", "value"),
-    ],
-    prevent_initial_call=True,
-)
-def cb_download_excel_tabela_consumo_veiculos_visal_geral(
-    n_clicks, datas, lista_modelos, lista_linha, km_l_min, km_l_max
-):
-    if not n_clicks or n_clicks <= 0:  # Garantre que ao iniciar ou carregar a page, o arquivo não seja baixado
-        return dash.no_update
+# Exportações das tabelas (enviadas em streaming pela rota do servidor, ver modules/exportacao)
+def exporta_tabela_consumo_veiculos(datas, lista_modelos, lista_linha, km_l_min, km_l_max):
+    # Obtem os dados
+    resumo = home_service.get_resumo_visao_geral(datas, lista_modelos, lista_linha, km_l_min, km_l_max)
+    df = resumo.tabela_consumo_veiculos()
 
-    # Valida input
-    if not input_valido(datas, lista_modelos, lista_linha, km_l_min, km_l_max):
-        return dash.no_update
+    # Gera a coluna de custo
+    df["custo_excedente"] = df["litros_excedentes"] * get_preco_diesel()
 
+    yield df
+
+
+def exporta_tabela_consumo_linhas(datas, lista_modelos, lista_linha, km_l_min, km_l_max):
     # Obtem os dados
-    df = home_service.get_tabela_consumo_veiculos(datas, lista_modelos, lista_linha, km_l_min, km_l_max)
+    resumo = home_service.get_resumo_visao_geral(datas, lista_modelos, lista_linha, km_l_min, km_l_max)
+    df = resumo.tabela_consumo_linhas()
 
     # Gera a coluna de custo
-    df["custo_excedente"] = df["litros_excedentes"] * preco_diesel
+    df["custo_excedente"] = df["litros_excedentes"] * get_preco_diesel()
 
-    # Gera o excel
-    excel_data = gerar_excel(df)
+    yield df
 
-    # Dia de hoje formatado
-    dia_hoje_str = date.today().strftime("%d-%m-%Y")
 
-    return dcc.send_bytes(excel_data, f"tabela_consumo_combustivel_{dia_hoje_str}.xlsx")
+registra_exportacao("home_consumo_veiculos", exporta_tabela_consumo_veiculos, "tabela_consumo_combustivel")
+registra_exportacao("home_consumo_linhas", exporta_tabela_consumo_linhas, "tabela_consumo_linhas")
 
 
+# Callback para atualizar os links (assinados) dos botões de exportar para excel (não consulta o banco)
 @callback(
-    Output("download-excel-tabela-linhas-visao-geral", "data"),
     [
-        Input("btn-exportar-excel-tabela-linhas-visao-geral", "n_clicks"),
-        Input("pag-home-intervalo-datas-visao-geral", "value"),
-        Input("pag-home-select-modelos-visao-geral", "value"),
-        Input("pag-home-select-linhas-monitoramento", "value"),
-        Input("pag-home-excluir-km-l-menor-que-visao-geral", "value"),
-        Input("pag-home-excluir-km-l-maior-que-visao-geral", "value"),
+        Output("btn-exportar-excel-tabela-combustivel-visao-geral", "href"),
+        Output("btn-exportar-excel-tabela-linhas-visao-geral", "href"),
+    ],
+    [
+        Input("pag-home-store-filtros", "data"),
     ],
-    prevent_initial_call=True,
 )
-def cb_download_excel_tabela_consumo_linhas_visal_geral(
-    n_clicks, datas, lista_modelos, lista_linha, km_l_min, km_l_max
-):
-    if not n_clicks or n_clicks <= 0:  # Garantre que ao iniciar ou carregar a page, o arquivo não seja baixado
-        return dash.no_update
-
-    # Obtem os dados
-    df = home_service.get_tabela_consumo_linhas(datas, lista_modelos, lista_linha, km_l_min, km_l_max)
-
-    # Gera a coluna de custo
-    df["custo_excedente"] = df["litros_excedentes"] * preco_diesel
-
-    # Gera o excel
-    excel_data = gerar_excel(df)
-
-    # Dia de hoje formatado
-    dia_hoje_str = date.today().strftime("%d-%m-%Y")
+def cb_links_exportar_tabelas_visao_geral(filtros):
+    # Filtros da página (estado normalizado)
+    datas, lista_modelos, lista_linha, km_l_min, km_l_max = valores_filtros(filtros, CAMPOS_FILTROS)
 
-    return dcc.send_bytes(excel_data, f"tabela_consumo_linhas_{dia_hoje_str}.xlsx")
+    # Valida input
+    if not input_valido(datas, lista_modelos, lista_linha, km_l_min, km_l_max):
+        return [None, None]
+
+    filtros = {
+        "datas": datas,
+        "lista_modelos": lista_modelos,
+        "lista_linha": lista_linha,
+        "km_l_min": km_l_min,
+        "km_l_max": km_l_max,
+    }
+    return [
+        url_exportacao("home_consumo_veiculos", "xlsx", **filtros),
+        url_exportacao("home_consumo_linhas", "xlsx", **filtros),
+    ]
 
 
 # Callback para redirecionar o usuário para outra página ao clicar no botão detalhar
@@ -312,16 +263,13 @@ def cb_download_excel_tabela_consumo_linhas_visal_geral(
     Output("url", "href", allow_duplicate=True),
     Input("tabela-consumo-veiculo-visao-geral", "cellRendererData"),
     Input("tabela-consumo-veiculo-visao-geral", "virtualRowData"),
-    Input("pag-home-intervalo-datas-visao-geral", "value"),
-    Input("pag-home-select-modelos-visao-geral", "value"),
-    Input("pag-home-select-linhas-monitoramento", "value"),
-    Input("pag-home-excluir-km-l-menor-que-visao-geral", "value"),
-    Input("pag-home-excluir-km-l-maior-que-visao-geral", "value"),
+    State("pag-home-store-filtros", "data"),
     prevent_initial_call=True,
 )
-def cb_botao_detalhar_tabela_consumo_veiculos_visal_geral(
-    tabela_linha, tabela_linha_virtual, datas, lista_modelos, lista_linha, km_l_min, km_l_max
-):
+def cb_botao_detalhar_tabela_consumo_veiculos_visal_geral(tabela_linha, tabela_linha_virtual, filtros):
+    # Filtros da página (estado normalizado)
+    datas, lista_modelos, lista_linha, km_l_min, km_l_max = valores_filtros(filtros, CAMPOS_FILTROS)
+
     ctx = callback_context  # Obtém o contexto do callback
     if not ctx.triggered:
         return dash.no_update  # Evita execução desnecessária
@@ -351,16 +299,13 @@ def cb_botao_detalhar_tabela_consumo_veiculos_visal_geral(
     Output("url", "href", allow_duplicate=True),
     Input("tabela-consumo-linhas-visao-geral", "cellRendererData"),
     Input("tabela-consumo-linhas-visao-geral", "virtualRowData"),
-    Input("pag-home-intervalo-datas-visao-geral", "value"),
-    Input("pag-home-select-modelos-visao-geral", "value"),
-    Input("pag-home-select-linhas-monitoramento", "value"),
-    Input("pag-home-excluir-km-l-menor-que-visao-geral", "value"),
-    Input("pag-home-excluir-km-l-maior-que-visao-geral", "value"),
+    State("pag-home-store-filtros", "data"),
     prevent_initial_call=True,
 )
-def cb_botao_detalhar_tabela_consumo_linha_visal_geral(
-    tabela_linha, tabela_linha_virtual, datas, lista_modelos, lista_linha, km_l_min, km_l_max
-):
+def cb_botao_detalhar_tabela_consumo_linha_visal_geral(tabela_linha, tabela_linha_virtual, filtros):
+    # Filtros da página (estado normalizado)
+    datas, lista_modelos, lista_linha, km_l_min, km_l_max = valores_filtros(filtros, CAMPOS_FILTROS)
+
     ctx = callback_context  # Obtém o contexto do callback
     if not ctx.triggered:
         return dash.no_update  # Evita execução desnecessária
@@ -395,26 +340,22 @@ def cb_botao_detalhar_tabela_consumo_linha_visal_geral(
 @callback(
     Output("indicador-consumo-km-l-visao-geral", "children"),
     [
-        Input("pag-home-intervalo-datas-visao-geral", "value"),
-        Input("pag-home-select-modelos-visao-geral", "value"),
-        Input("pag-home-select-linhas-monitoramento", "value"),
-        Input("pag-home-excluir-km-l-menor-que-visao-geral", "value"),
-        Input("pag-home-excluir-km-l-maior-que-visao-geral", "value"),
+        Input("pag-home-store-filtros", "data"),
     ],
 )
-def cb_indicador_consumo_km_l_visao_geral(datas, lista_modelos, lista_linha, km_l_min, km_l_max):
+def cb_indicador_consumo_km_l_visao_geral(filtros):
+    # Filtros da página (estado normalizado)
+    datas, lista_modelos, lista_linha, km_l_min, km_l_max = valores_filtros(filtros, CAMPOS_FILTROS)
+
     # Valida input
     if not input_valido(datas, lista_modelos, lista_linha, km_l_min, km_l_max):
         return ""
 
     # Obtem os dados
-    df_indicador = home_service.get_indicador_consumo_medio_km_l(datas, lista_modelos, lista_linha, km_l_min, km_l_max)
-
-    if df_indicador.empty:
-        return ""
+    resumo = home_service.get_resumo_visao_geral(datas, lista_modelos, lista_linha, km_l_min, km_l_max)
 
     # Obtem o valor do indicador
-    valor = df_indicador.iloc[0]["media_km_por_l"]
+    valor = resumo.media_km_por_l
 
     if pd.isna(valor) or valor is None:
         return ""
@@ -430,28 +371,25 @@ def cb_indicador_consumo_km_l_visao_geral(datas, lista_modelos, lista_linha, km_
         Output("card-footer-preco-diesel", "children"),
     ],
     [
-        Input("pag-home-intervalo-datas-visao-geral", "value"),
-        Input("pag-home-select-modelos-visao-geral", "value"),
-        Input("pag-home-select-linhas-monitoramento", "value"),
-        Input("pag-home-excluir-km-l-menor-que-visao-geral", "value"),
-        Input("pag-home-excluir-km-l-maior-que-visao-geral", "value"),
+        Input("pag-home-store-filtros", "data"),
     ],
 )
-def cb_indicador_total_consumo_excedente_visao_geral(datas, lista_modelos, lista_linha, km_l_min, km_l_max):
+def cb_indicador_total_consumo_excedente_visao_geral(filtros):
+    # Filtros da página (estado normalizado)
+    datas, lista_modelos, lista_linha, km_l_min, km_l_max = valores_filtros(filtros, CAMPOS_FILTROS)
+
+    # Preço do diesel (atualizado em segundo plano)
+    preco_diesel = get_preco_diesel()
+
     # Valida input
     if not input_valido(datas, lista_modelos, lista_linha, km_l_min, km_l_max):
         return "", "", ""
 
     # Obtem os dados
-    df_indicador = home_service.get_indicador_consumo_litros_excedente(
-        datas, lista_modelos, lista_linha, km_l_min, km_l_max
-    )
-
-    if df_indicador.empty:
-        return "", "", ""
+    resumo = home_service.get_resumo_visao_geral(datas, lista_modelos, lista_linha, km_l_min, km_l_max)
 
     # Obtém o valor do indicador
-    valor = df_indicador.iloc[0]["litros_excedentes"]
+    valor = resumo.litros_excedentes_baixa_perfomance
 
     if pd.isna(valor) or valor is None:
         return "", "", ""
@@ -474,21 +412,21 @@ def cb_indicador_total_consumo_excedente_visao_geral(datas, lista_modelos, lista
 @callback(
     Output("graph-pizza-sintese-viagens-geral", "figure"),
     [
-        Input("pag-home-intervalo-datas-visao-geral", "value"),
-        Input("pag-home-select-modelos-visao-geral", "value"),
-        Input("pag-home-select-linhas-monitoramento", "value"),
-        Input("pag-home-excluir-km-l-menor-que-visao-geral", "value"),
-        Input("pag-home-excluir-km-l-maior-que-visao-geral", "value"),
+        Input("pag-home-store-filtros", "data"),
         Input("store-window-size", "data"),
     ],
 )
-def plota_grafico_pizza_sintese_geral(datas, lista_modelos, lista_linha, km_l_min, km_l_max, metadata_browser):
+def plota_grafico_pizza_sintese_geral(filtros, metadata_browser):
+    # Filtros da página (estado normalizado)
+    datas, lista_modelos, lista_linha, km_l_min, km_l_max = valores_filtros(filtros, CAMPOS_FILTROS)
+
     # Valida input
     if not input_valido(datas, lista_modelos, lista_linha, km_l_min, km_l_max):
         return go.Figure()
 
     # Obtem os dados
-    df = home_service.get_sinteze_status_viagens(datas, lista_modelos, lista_linha, km_l_min, km_l_max)
+    resumo = home_service.get_resumo_visao_geral(datas, lista_modelos, lista_linha, km_l_min, km_l_max)
+    df = resumo.sinteze_status_viagens()
 
     # Prepara os dados para o gráfico
     labels = [
@@ -514,21 +452,21 @@ def plota_grafico_pizza_sintese_geral(datas, lista_modelos, lista_linha, km_l_mi
 @callback(
     Output("graph-barra-consumo-modelo-visao-geral", "figure"),
     [
-        Input("pag-home-intervalo-datas-visao-geral", "value"),
-        Input("pag-home-select-modelos-visao-geral", "value"),
-        Input("pag-home-select-linhas-monitoramento", "value"),
-        Input("pag-home-excluir-km-l-menor-que-visao-geral", "value"),
-        Input("pag-home-excluir-km-l-maior-que-visao-geral", "value"),
+        Input("pag-home-store-filtros", "data"),
         Input("store-window-size", "data"),
     ],
 )
-def plota_grafico_barra_consumo_modelo(datas, lista_modelos, lista_linha, km_l_min, km_l_max, metadata_browser):
+def plota_grafico_barra_consumo_modelo(filtros, metadata_browser):
+    # Filtros da página (estado normalizado)
+    datas, lista_modelos, lista_linha, km_l_min, km_l_max = valores_filtros(filtros, CAMPOS_FILTROS)
+
     # Valida input
     if not input_valido(datas, lista_modelos, lista_linha, km_l_min, km_l_max):
         return go.Figure()
 
     # Obtem os dados
-    df = home_service.get_sinteze_consumo_modelos(datas, lista_modelos, lista_linha, km_l_min, km_l_max)
+    resumo = home_service.get_resumo_visao_geral(datas, lista_modelos, lista_linha, km_l_min, km_l_max)
+    df = resumo.sinteze_consumo_modelos()
 
     # Gera o gráfico
     fig = home_graficos.gerar_grafico_barra_consumo_modelos_geral(df, metadata_browser)
@@ -539,8 +477,14 @@ def plota_grafico_barra_consumo_modelo(datas, lista_modelos, lista_linha, km_l_m
 # Layout #####################################################################
 ##############################################################################
 def layout():
+    # Linhas que possuem informações de combustível e modelos de veículos
+    lista_todas_linhas = [{"LABEL": "TODAS"}] + entidades_service.get_linhas().to_dict(orient="records")
+    lista_todos_modelos_veiculos = [{"LABEL": "TODOS"}] + entidades_service.get_modelos().to_dict(orient="records")
+
     return dbc.Container(
         [
+            # Estado dos filtros
+            dcc.Store(id="pag-home-store-filtros"),
             dbc.Row(
                 [
                     dbc.Col(
@@ -674,6 +618,7 @@ def layout():
                                                                     value=1,
                                                                     step=0.1,
                                                                     min=0,
+                                                                    debounce=FILTROS_DEBOUNCE_MS,
                                                                 ),
                                                                 dbc.InputGroupText("km/L"),
                                                             ]
@@ -703,6 +648,7 @@ def layout():
                                                                     value=10,
                                                                     step=0.1,
                                                                     min=0,
+                                                                    debounce=FILTROS_DEBOUNCE_MS,
                                                                 ),
                                                                 dbc.InputGroupText("km/L"),
                                                             ]
@@ -887,11 +833,12 @@ def layout():
                                 dbc.Col(
                                     html.Div(
                                         [
-                                            html.Button(
+                                            # Link para a rota de exportação (atualizado pelo callback)
+                                            html.A(
                                                 "Exportar para Excel",
                                                 id="btn-exportar-excel-tabela-combustivel-visao-geral",
-                                                n_clicks=0,
                                                 style={
+                                                    "display": "inline-block",
                                                     "background-color": "#007bff",  # Azul
                                                     "color": "white",
                                                     "border": "none",
@@ -900,10 +847,10 @@ def layout():
                                                     "cursor": "pointer",
                                                     "font-size": "16px",
                                                     "font-weight": "bold",
+                                                    "text-decoration": "none",
                                                 },
                                                 className="btnExcel",
                                             ),
-                                            dcc.Download(id="download-excel-tabela-combustivel-visao-geral"),
                                         ],
                                         style={"text-align": "right"},
                                     ),
@@ -946,11 +893,12 @@ def layout():
                                 dbc.Col(
                                     html.Div(
                                         [
-                                            html.Button(
+                                            # Link para a rota de exportação (atualizado pelo callback)
+                                            html.A(
                                                 "Exportar para Excel",
                                                 id="btn-exportar-excel-tabela-linhas-visao-geral",
-                                                n_clicks=0,
                                                 style={
+                                                    "display": "inline-block",
                                                     "background-color": "#007bff",  # Azul
                                                     "color": "white",
                                                     "border": "none",
@@ -959,10 +907,10 @@ def layout():
                                                     "cursor": "pointer",
                                                     "font-size": "16px",
                                                     "font-weight": "bold",
+                                                    "text-decoration": "none",
                                                 },
                                                 className="btnExcel",
                                             ),
-                                            dcc.Download(id="download-excel-tabela-linhas-visao-geral"),
                                         ],
                                         style={"text-align": "right"},
                                     ),
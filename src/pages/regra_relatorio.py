@@ -65,9 +65,6 @@ df_regras_monitoramento_comb = get_regras_monitoramento_combustivel(pgEngine)
 lista_regras_monitoramento_comb = df_regras_monitoramento_comb.to_dict(orient="records")
 
 
-# Pega o preço do diesel via API
-preco_diesel = get_preco_diesel()
-
 ##############################################################################
 # CALLBACKS ##################################################################
 ##############################################################################
@@ -320,6 +317,9 @@ def cb_rel_regra_atualiza_dados_card_descricao(store_relatorio_regra):
     Input("store-relatorio-relatorio-regra", "data"),
 )
 def cb_rel_regra_atualiza_dados_card_resultado_regra_relatorio(store_relatorio_regra):
+    # Preço do diesel (atualizado em segundo plano)
+    preco_diesel = get_preco_diesel()
+
     # Valida se os dados do estado estão OK, caso contrário retorna os dados padrão
     if not store_relatorio_regra or not store_relatorio_regra["valido"]:
         return [
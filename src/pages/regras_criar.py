@@ -13,6 +13,7 @@ import re
 
 # Importar bibliotecas do dash básicas e plotly
 from dash import html, dcc, callback, Input, Output, State
+from dash import clientside_callback, ClientsideFunction
 import dash
 
 # Importar bibliotecas do bootstrap e ag-grid
@@ -37,7 +38,7 @@ from modules.regras.regras_service import RegrasService
 import modules.regras.tabela as regras_tabela
 
 # Imports gerais
-from modules.entities_utils import get_modelos_veiculos_com_combustivel
+from modules.entities_service import EntidadesService
 
 # Preço do diesel
 from modules.preco_combustivel_api import get_preco_diesel
@@ -53,14 +54,8 @@ pgEngine = pgDB.get_engine()
 # Cria o serviço
 regra_service = RegrasService(pgEngine)
 
-# Modelos de veículos
-df_modelos_veiculos = get_modelos_veiculos_com_combustivel(pgEngine)
-df_modelos_veiculos_latest = df_modelos_veiculos.drop_duplicates(subset="LABEL", keep="first")
-lista_todos_modelos_veiculos = df_modelos_veiculos_latest.to_dict(orient="records")
-lista_todos_modelos_veiculos.insert(0, {"LABEL": "TODOS"})
-
-# Pega o preço do diesel via API
-preco_diesel = get_preco_diesel()
+# Dimensões (modelos de veículos) carregadas sob demanda
+entidades_service = EntidadesService.get_instance(pgEngine)
 
 
 ##############################################################################
@@ -97,44 +92,13 @@ def verifica_erro_email(email_destino):
     return False
 
 
-@callback(
-    Output("pag-criar-regra-input-email-1", "error"),
-    Input("pag-criar-regra-input-email-1", "value"),
-)
-def verifica_erro_email_1(email_destino):
-    return verifica_erro_email(email_destino)
-
-
-@callback(
-    Output("pag-criar-regra-input-email-2", "error"),
-    Input("pag-criar-regra-input-email-2", "value"),
-)
-def verifica_erro_email_2(email_destino):
-    return verifica_erro_email(email_destino)
-
-
-@callback(
-    Output("pag-criar-regra-input-email-3", "error"),
-    Input("pag-criar-regra-input-email-3", "value"),
-)
-def verifica_erro_email_3(email_destino):
-    return verifica_erro_email(email_destino)
-
-
-@callback(
-    Output("pag-criar-regra-input-email-4", "error"),
-    Input("pag-criar-regra-input-email-4", "value"),
-)
-def verifica_erro_email_4(email_destino):
-    return verifica_erro_email(email_destino)
-
-
-@callback(
-    Output("pag-criar-regra-input-email-5", "error"),
-    Input("pag-criar-regra-input-email-5", "value"),
-)
-def verifica_erro_email_5(email_destino):
-    return verifica_erro_email(email_destino)
+# Validação no navegador (ver assets/validacao.js); verifica_erro_email é usada ao salvar a regra
+for i in range(1, 6):
+    clientside_callback(
+        ClientsideFunction(namespace="validacao", function_name="verifica_erro_email"),
+        Output(f"pag-criar-regra-input-email-{i}", "error"),
+        Input(f"pag-criar-regra-input-email-{i}", "value"),
+    )
 
 
 # Função para validar o input de telefone
@@ -160,44 +124,13 @@ def verifica_erro_wpp(wpp_telefone):
     return False
 
 
-@callback(
-    Output("pag-criar-regra-input-wpp-1", "error"),
-    Input("pag-criar-regra-input-wpp-1", "value"),
-)
-def verifica_erro_wpp_1(wpp_telefone):
-    return verifica_erro_wpp(wpp_telefone)
-
-
-@callback(
-    Output("pag-criar-regra-input-wpp-2", "error"),
-    Input("pag-criar-regra-input-wpp-2", "value"),
-)
-def verifica_erro_wpp_2(wpp_telefone):
-    return verifica_erro_wpp(wpp_telefone)
-
-
-@callback(
-    Output("pag-criar-regra-input-wpp-3", "error"),
-    Input("pag-criar-regra-input-wpp-3", "value"),
-)
-def verifica_erro_wpp_3(wpp_telefone):
-    return verifica_erro_wpp(wpp_telefone)
-
-
-@callback(
-    Output("pag-criar-regra-input-wpp-4", "error"),
-    Input("pag-criar-regra-input-wpp-4", "value"),
-)
-def verifica_erro_wpp_4(wpp_telefone):
-    return verifica_erro_wpp(wpp_telefone)
-
-
-@callback(
-    Output("pag-criar-regra-input-wpp-5", "error"),
-    Input("pag-criar-regra-input-wpp-5", "value"),
-)
-def verifica_erro_wpp_5(wpp_telefone):
-    return verifica_erro_wpp(wpp_telefone)
+# Validação no navegador (ver assets/validacao.js); verifica_erro_wpp é usada ao salvar a regra
+for i in range(1, 6):
+    clientside_callback(
+        ClientsideFunction(namespace="validacao", function_name="verifica_erro_wpp"),
+        Output(f"pag-criar-regra-input-wpp-{i}", "error"),
+        Input(f"pag-criar-regra-input-wpp-{i}", "value"),
+    )
 
 
 @callback(
@@ -258,6 +191,9 @@ def cb_criar_regra_preview_regra(
     limite_baixa_perfomance,
     limite_erro_telemetria,
 ):
+    # Preço do diesel (atualizado em segundo plano)
+    preco_diesel = get_preco_diesel()
+
     # Valida input
     if not input_valido(dias_monitoramento, qtd_min_motoristas, qtd_min_viagens, lista_modelos):
         return [], 0, 0, 0, 0
@@ -677,7 +613,14 @@ def gera_labels_inputs_pag_criar_regra(campo):
 ##############################################################################
 # Layout #####################################################################
 ##############################################################################
-layout = dbc.Container(
+def layout(**kwargs):
+    # Preço do diesel (atualizado em segundo plano)
+    preco_diesel = get_preco_diesel()
+
+    # Modelos de veículos
+    lista_todos_modelos_veiculos = [{"LABEL": "TODOS"}] + entidades_service.get_modelos().to_dict(orient="records")
+
+    return dbc.Container(
     [
         dmc.Modal(
             # title="Erro ao carregar os dados",
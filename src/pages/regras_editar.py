@@ -14,6 +14,7 @@ from urllib.parse import urlparse, parse_qs
 
 # Importar bibliotecas do dash básicas e plotly
 from dash import html, dcc, callback, Input, Output, State
+from dash import clientside_callback, ClientsideFunction
 import dash
 
 # Importar bibliotecas do bootstrap e ag-grid
@@ -32,7 +33,7 @@ import locale_utils
 from db import PostgresSingleton
 
 # Imports gerais
-from modules.entities_utils import get_modelos_veiculos_com_combustivel
+from modules.entities_service import EntidadesService
 
 # Imports específicos
 from modules.regras.regras_service import RegrasService
@@ -51,14 +52,9 @@ pgEngine = pgDB.get_engine()
 # Cria o serviço
 regra_service = RegrasService(pgEngine)
 
-# Modelos de veículos
-df_modelos_veiculos = get_modelos_veiculos_com_combustivel(pgEngine)
-df_modelos_veiculos_latest = df_modelos_veiculos.drop_duplicates(subset="LABEL", keep="first")
-lista_todos_modelos_veiculos = df_modelos_veiculos_latest.to_dict(orient="records")
-lista_todos_modelos_veiculos.insert(0, {"LABEL": "TODOS"})
+# Dimensões (modelos de veículos) carregadas sob demanda
+entidades_service = EntidadesService.get_instance(pgEngine)
 
-# Pega o preço do diesel via API
-preco_diesel = get_preco_diesel()
 
 ##############################################################################
 # CALLBACKS ##################################################################
@@ -196,44 +192,13 @@ def verifica_erro_email(email_destino):
     return False
 
 
-@callback(
-    Output("pag-editar-regra-input-email-1-regra-edit-combustivel", "error"),
-    Input("pag-editar-regra-input-email-1-regra-edit-combustivel", "value"),
-)
-def editar_verifica_erro_email_1(email_destino):
-    return verifica_erro_email(email_destino)
-
-
-@callback(
-    Output("pag-editar-regra-input-email-2-regra-edit-combustivel", "error"),
-    Input("pag-editar-regra-input-email-2-regra-edit-combustivel", "value"),
-)
-def editar_verifica_erro_email_2(email_destino):
-    return verifica_erro_email(email_destino)
-
-
-@callback(
-    Output("pag-editar-regra-input-email-3-regra-edit-combustivel", "error"),
-    Input("pag-editar-regra-input-email-3-regra-edit-combustivel", "value"),
-)
-def editar_verifica_erro_email_3(email_destino):
-    return verifica_erro_email(email_destino)
-
-
-@callback(
-    Output("pag-editar-regra-input-email-4-regra-edit-combustivel", "error"),
-    Input("pag-editar-regra-input-email-4-regra-edit-combustivel", "value"),
-)
-def editar_verifica_erro_email_4(email_destino):
-    return verifica_erro_email(email_destino)
-
-
-@callback(
-    Output("pag-editar-regra-input-email-5-regra-edit-combustivel", "error"),
-    Input("pag-editar-regra-input-email-5-regra-edit-combustivel", "value"),
-)
-def editar_verifica_erro_email_5(email_destino):
-    return verifica_erro_email(email_destino)
+# Validação no navegador (ver assets/validacao.js); verifica_erro_email é usada ao salvar a regra
+for i in range(1, 6):
+    clientside_callback(
+        ClientsideFunction(namespace="validacao", function_name="verifica_erro_email"),
+        Output(f"pag-editar-regra-input-email-{i}-regra-edit-combustivel", "error"),
+        Input(f"pag-editar-regra-input-email-{i}-regra-edit-combustivel", "value"),
+    )
 
 
 # Função para validar o input de telefone
@@ -259,44 +224,13 @@ def verifica_erro_wpp(wpp_telefone):
     return False
 
 
-@callback(
-    Output("pag-editar-regra-input-wpp-1-regra-edit-combustivel", "error"),
-    Input("pag-editar-regra-input-wpp-1-regra-edit-combustivel", "value"),
-)
-def editar_verifica_erro_wpp_1(wpp_telefone):
-    return verifica_erro_wpp(wpp_telefone)
-
-
-@callback(
-    Output("pag-editar-regra-input-wpp-2-regra-edit-combustivel", "error"),
-    Input("pag-editar-regra-input-wpp-2-regra-edit-combustivel", "value"),
-)
-def editar_verifica_erro_wpp_2(wpp_telefone):
-    return verifica_erro_wpp(wpp_telefone)
-
-
-@callback(
-    Output("pag-editar-regra-input-wpp-3-regra-edit-combustivel", "error"),
-    Input("pag-editar-regra-input-wpp-3-regra-edit-combustivel", "value"),
-)
-def editar_verifica_erro_wpp_3(wpp_telefone):
-    return verifica_erro_wpp(wpp_telefone)
-
-
-@callback(
-    Output("pag-editar-regra-input-wpp-4-regra-edit-combustivel", "error"),
-    Input("pag-editar-regra-input-wpp-4-regra-edit-combustivel", "value"),
-)
-def editar_verifica_erro_wpp_4(wpp_telefone):
-    return verifica_erro_wpp(wpp_telefone)
-
-
-@callback(
-    Output("pag-editar-regra-input-wpp-5-regra-edit-combustivel", "error"),
-    Input("pag-editar-regra-input-wpp-5-regra-edit-combustivel", "value"),
-)
-def editar_verifica_erro_wpp_5(wpp_telefone):
-    return verifica_erro_wpp(wpp_telefone)
+# Validação no navegador (ver assets/validacao.js); verifica_erro_wpp é usada ao salvar a regra
+for i in range(1, 6):
+    clientside_callback(
+        ClientsideFunction(namespace="validacao", function_name="verifica_erro_wpp"),
+        Output(f"pag-editar-regra-input-wpp-{i}-regra-edit-combustivel", "error"),
+        Input(f"pag-editar-regra-input-wpp-{i}-regra-edit-combustivel", "value"),
+    )
 
 
 @callback(
@@ -422,6 +356,9 @@ def cb_editar_regra_preview_regra(
     limite_baixa_perfomance,
     limite_erro_telemetria,
 ):
+    # Preço do diesel (atualizado em segundo plano)
+    preco_diesel = get_preco_diesel()
+
     # Valida input
     if not input_valido(dias_monitoramento, qtd_min_motoristas, qtd_min_viagens, lista_modelos):
         return [], 0, 0, 0, 0
@@ -748,7 +685,14 @@ def cb_botao_close_modal_erro_carregar_dados_editar_regra(n_clicks):
 ##############################################################################
 # Layout #####################################################################
 ##############################################################################
-layout = dbc.Container(
+def layout(**kwargs):
+    # Preço do diesel (atualizado em segundo plano)
+    preco_diesel = get_preco_diesel()
+
+    # Modelos de veículos
+    lista_todos_modelos_veiculos = [{"LABEL": "TODOS"}] + entidades_service.get_modelos().to_dict(orient="records")
+
+    return dbc.Container(
     [
         # Estado
         dcc.Store(id="store-pag-editar-regra-input-id-pag-editar-regra"),